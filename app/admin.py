@@ -5,9 +5,10 @@ from app.services.spotify_manager import SpotifyConnectionManager
 
 TOKENS_FILE = "tokens.json"
 
-def authorize():
+def authorize(room=None):
+    """A room code authorizes that venue's own Spotify account instead of the server's."""
     conn = SpotifyConnectionManager.get_instance()
-    url = conn.get_authorization_url()
+    url = conn.get_authorization_url(state=room.upper() if room else None)
     print(f"Go to this URL to authorize your app:\n{url}")
     print("After authorization, Spotify will redirect to /callback and tokens will be saved.")
 
@@ -36,14 +37,15 @@ def main():
     parser = argparse.ArgumentParser(description="Spotify Admin CLI")
     subparsers = parser.add_subparsers(dest="command")
 
-    subparsers.add_parser("authorize", help="Start Spotify authorization flow")
+    authorize_parser = subparsers.add_parser("authorize", help="Start Spotify authorization flow")
+    authorize_parser.add_argument("--room", help="Authorize the Spotify account of this host-opened room")
     subparsers.add_parser("refresh", help="Refresh access token using refresh token")
     subparsers.add_parser("status", help="Show current token info")
 
     args = parser.parse_args()
 
     if args.command == "authorize":
-        authorize()
+        authorize(args.room)
     elif args.command == "refresh":
         refresh()
     elif args.command == "status":
@@ -1,4 +1,4 @@
-import os
+import os, tempfile
 
 # Environment: dev, beta, prod
 ENV = os.getenv("APP_ENV", "dev")
@@ -12,29 +12,159 @@ else:  # prod
     # Update host to prod endpoint when available
     LOG_LEVEL = "WARNING"
 
-api = {
-    "token": "https://accounts.spotify.com/api/token",
-    "authorize": "https://accounts.spotify.com/authorize",
-    "currently_playing": "https://api.spotify.com/v1/me/player/currently-playing",
-    "track_search": "https://api.spotify.com/v1/search",
-    "track_lookup": "https://api.spotify.com/v1/tracks/",
-    "add_to_queue": "https://api.spotify.com/v1/me/player/queue",
-    "next_song": "https://api.spotify.com/v1/me/player/next",
-}
+# Base URLs can point at a local stand-in (see app/tools/fake_spotify.py)
+SPOTIFY_ACCOUNTS_URL = os.getenv("SPOTIFY_ACCOUNTS_URL", "https://accounts.spotify.com")
+SPOTIFY_API_URL = os.getenv("SPOTIFY_API_URL", "https://api.spotify.com")
+
+def build_api(accounts_url: str, api_url: str) -> dict:
+    return {
+        "token": f"{accounts_url}/api/token",
+        "authorize": f"{accounts_url}/authorize",
+        "currently_playing": f"{api_url}/v1/me/player/currently-playing",
+        "track_search": f"{api_url}/v1/search",
+        "track_lookup": f"{api_url}/v1/tracks",
+        "add_to_queue": f"{api_url}/v1/me/player/queue",
+        "player_queue": f"{api_url}/v1/me/player/queue",
+        "next_song": f"{api_url}/v1/me/player/next",
+    }
+
+api = build_api(SPOTIFY_ACCOUNTS_URL, SPOTIFY_API_URL)
+
+def override_spotify_urls(base_url: str):
+    """Point every api endpoint at one base URL in place, e.g. a fake Spotify server."""
+    api.update(build_api(base_url, base_url))
 
 request_info = {
     "content_type": "application/x-www-form-urlencoded",
 }
 
+# (connect, read) timeouts in seconds per api endpoint; others use the defaults below
+api_timeouts = {
+    "token": (3.05, 10),
+    "currently_playing": (3.05, 3),
+    "track_search": (3.05, 5),
+    "track_lookup": (3.05, 5),
+    "add_to_queue": (3.05, 5),
+    "player_queue": (3.05, 5),
+    "next_song": (3.05, 5),
+}
+
 ports = {
-    "WEBSOCKET_SERVER_PORT": 7890,
+    "WEBSOCKET_SERVER_PORT": int(os.getenv("WEBSOCKET_SERVER_PORT", "7890")),
     "SPOTIFY_CLIENT_PORT": 8081
 }
+# /callback, /healthz and /metrics are served on the event loop at SPOTIFY_CLIENT_PORT;
+# FLASK_CALLBACK=1 serves /callback from the Flask app in its own thread instead (needs Flask)
+FLASK_CALLBACK = os.getenv("FLASK_CALLBACK", "0") == "1"
+
+# Max Spotify requests in flight at once (size of the async client's worker pool)
+SPOTIFY_MAX_CONCURRENCY = 10
+# Keep-alive connection pool shared by all Spotify calls
+SPOTIFY_POOL_SIZE = int(os.getenv("SPOTIFY_POOL_SIZE", str(SPOTIFY_MAX_CONCURRENCY)))
+SPOTIFY_CONNECT_TIMEOUT = 3.05
+SPOTIFY_READ_TIMEOUT = 10
+# Request scheduler: token bucket (requests/s, burst) and retries after a 429
+SPOTIFY_RATE_LIMIT = 5.0
+SPOTIFY_RATE_BURST = 10
+SPOTIFY_MAX_RETRIES = 2
+
+# Search result cache (entries, approx. bytes, seconds)
+SEARCH_CACHE_MAX_ENTRIES = 512
+SEARCH_CACHE_MAX_BYTES = 2_000_000
+SEARCH_CACHE_TTL = 300
+
+# Track metadata cache size (tracks)
+TRACK_METADATA_MAX_ENTRIES = 2000
+
+# Seconds a polled now-playing snapshot may be served before refetching
+NOW_PLAYING_MAX_AGE = 60
+
+# Currently-playing poll cadence (seconds): coarse mid-track, tight near track
+# boundaries, exponential backoff while idle or paused, +/- jitter fraction
+POLL_COARSE_INTERVAL = 15
+POLL_BOUNDARY_LEAD = 1.0
+POLL_TIGHT_INTERVAL = 0.5
+POLL_IDLE_MIN = 2
+POLL_IDLE_MAX = 15
+POLL_JITTER = 0.1
+
+# Per-client outbound queue length (messages); a client that overflows it is disconnected
+OUTBOX_MAX_MESSAGES = 64
+
+# Seconds between coalesced queue_length/cost broadcasts
+STATE_BROADCAST_TICK = 0.05
+# Rooms: hard cap on open rooms, seconds a host-opened room may sit empty before it is evicted
+# (the default room never is), sweep interval
+ROOM_MAX_ROOMS = 100
+ROOM_IDLE_TTL = 30 * 60
+ROOM_EVICT_INTERVAL = 60
+ROOM_CODE_LENGTH = 4
+# Seconds an open room without an authorized Spotify account waits before polling again
+ROOM_AUTHORIZE_RETRY = 5
+# Rooms other than the default one are venues with their own Spotify account (tokens-<CODE>.json),
+# opened by a host: a hello with hostKey equal to ROOM_HOST_KEY opens its roomCode. Unset, only the default room exists.
+ROOM_HOST_KEY = os.getenv("ROOM_HOST_KEY")
+
+# Seconds between checks of the local queue against Spotify's player queue (only while tracks are queued);
+# Spotify lists at most this many upcoming tracks
+QUEUE_RECONCILE_INTERVAL = 30
+QUEUE_RECONCILE_WINDOW = 20
+
+# Write-ahead journal of balances, queues and votes; an empty JOURNAL_DIR disables it.
+# Changes are fsynced in batches every JOURNAL_COMMIT_INTERVAL seconds and compacted
+# into a snapshot every JOURNAL_SNAPSHOT_EVERY records.
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "journal")
+JOURNAL_COMMIT_INTERVAL = 0.02
+JOURNAL_SNAPSHOT_EVERY = 10_000
+
+# Hot restart: HOT_RESTART=1 takes over the listening socket and state of the server running
+# on HOT_RESTART_SOCKET, and then offers its own for the next one (see app/core/hot_restart.py).
+# The socket is per websocket port, so servers on different ports never hand off to each other
+HOT_RESTART = os.getenv("HOT_RESTART", "0") == "1"
+HOT_RESTART_SOCKET = os.getenv(
+    "HOT_RESTART_SOCKET",
+    os.path.join(tempfile.gettempdir(), f"crowdtraq-handoff-{ports['WEBSOCKET_SERVER_PORT']}.sock"),
+)
+HOT_RESTART_TIMEOUT = 10
+
+# Shutdown: every component together gets SHUTDOWN_TIMEOUT seconds; websocket clients get
+# SHUTDOWN_DRAIN_TIMEOUT of that to answer the close frame before their connections are dropped
+SHUTDOWN_TIMEOUT = float(os.getenv("SHUTDOWN_TIMEOUT", "5"))
+SHUTDOWN_DRAIN_TIMEOUT = float(os.getenv("SHUTDOWN_DRAIN_TIMEOUT", "2"))
+# Each component still gets this long to stop after an earlier one used up the deadline
+SHUTDOWN_MIN_STOP = 0.5
+
+# Reconnecting clients further behind than this many state versions get a full snapshot
+STATE_DELTA_MAX_GAP = 100
+
+# Websocket worker processes sharing the websocket port (SO_REUSEPORT); 1 serves everything in-process.
+# With more, this process runs the coordinator that owns room state and talks to Spotify.
+WEBSOCKET_WORKERS = int(os.getenv("WEBSOCKET_WORKERS", "1"))
+COORDINATOR_SOCKET = os.getenv("COORDINATOR_SOCKET", os.path.join(tempfile.gettempdir(), "crowdtraq-coordinator.sock"))
+# Seconds a worker waits for the coordinator to admit a new connection
+WORKER_JOIN_TIMEOUT = 5
+
+# Leader/follower cluster: every node serves websockets, the one that binds CLUSTER_PORT is the
+# leader and alone talks to Spotify. Takes the place of WEBSOCKET_WORKERS when enabled.
+CLUSTER_ENABLED = os.getenv("CLUSTER", "0") == "1"
+CLUSTER_HOST = os.getenv("CLUSTER_HOST", "127.0.0.1")
+CLUSTER_PORT = int(os.getenv("CLUSTER_PORT", "7990"))
 
 TOKENS_FILE = "tokens.json"
+
+def room_tokens_file(code: str) -> str:
+    """Tokens of the Spotify account a host-opened room drives, e.g. tokens-ABCD.json."""
+    root, ext = os.path.splitext(TOKENS_FILE)
+    return f"{root}-{code}{ext}"
+
+# Refresh the user token this many seconds before it expires; retry delay after a failed refresh
+TOKEN_REFRESH_LEAD = 300
+TOKEN_REFRESH_RETRY = 30
 STARTING_TOKENS = 5
 COST_MODIFIER = 2
 POPULAR_TRACK_REWARD = 2
+# Share of a room's clients that must like (reward the owner) or dislike (skip) a track
+FEEDBACK_SUPERMAJORITY = 0.66
 
 QUEUE_INSUFFICIENT_TOKENS = "QUEUE_INSUFFICIENT_TOKENS"
 INVALID_TRACK_ID = "INVALID_TRACK_ID"
@@ -43,6 +173,7 @@ UNKNOWN_ACTION = "UNKNOWN_ACTION"
 UNKNOWN_USER = "UNKNOWN_USER"
 GENERAL_ERROR = "GENERAL_ERROR"
 NO_TRACK_PLAYING = "NO_TRACK_PLAYING"
+INVALID_ROOM_CODE = "INVALID_ROOM_CODE"
 
 SPOTIFY_CLIENT_ID = os.getenv("spotify_client_id")
 SPOTIFY_CLIENT_SECRET = os.getenv("spotify_client_secret") 
\ No newline at end of file
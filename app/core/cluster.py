@@ -0,0 +1,126 @@
+import asyncio, inspect, random, socket, logging
+from websockets.asyncio.server import serve
+from app.config import settings
+from app.core.worker import WorkerNode, SERVICE_RESTART_CLOSE_CODE
+from app.services.coordinator import ClusterMembers, Coordinator
+from app.services.room_manager import RoomManager
+
+logger = logging.getLogger("app.core.cluster")
+
+class ClusterNode:
+    """
+    One node of a leader/follower cluster. Every node serves websocket clients
+    and relays them to the leader; the leader is whichever node binds the
+    cluster port, and only it runs the Coordinator, so polling, skips and
+    queue adds happen once however many nodes there are. When the leader goes
+    away the followers race to bind the port again.
+
+    `on_leader(coordinator)` (sync or async) runs when this node takes over
+    (start polling, token refresh, ...) and may return a callable, sync or
+    async, to undo it on shutdown.
+    """
+    def __init__(
+        self,
+        ws_host: str = settings.HOST,
+        ws_port: int = settings.ports["WEBSOCKET_SERVER_PORT"],
+        cluster_host: str = settings.CLUSTER_HOST,
+        cluster_port: int = settings.CLUSTER_PORT,
+        room_manager_factory=None,
+        on_leader=None,
+        name: str = "node",
+    ):
+        self.ws_host = ws_host
+        self.ws_port = ws_port
+        self.cluster_host = cluster_host
+        self.cluster_port = cluster_port
+        self._room_manager_factory = room_manager_factory or (lambda: RoomManager(default_code="MAIN", members_factory=ClusterMembers))
+        self._on_leader = on_leader
+        self._step_down = None
+        self.name = name
+        self.coordinator: Coordinator | None = None
+        self.worker: WorkerNode | None = None
+        self._server = None
+        self.ready = asyncio.Event()
+        self.elections = 0
+
+    @property
+    def is_leader(self) -> bool:
+        return self.coordinator is not None
+
+    @property
+    def port(self) -> int:
+        """The bound websocket port (useful when started on port 0)."""
+        return self._server.sockets[0].getsockname()[1]
+
+    async def elect(self) -> bool:
+        """Become leader if the cluster port is free."""
+        self.elections += 1
+        try:
+            coordinator = await Coordinator(self._room_manager_factory()).start(host=self.cluster_host, port=self.cluster_port)
+        except OSError:
+            return False
+        self.coordinator = coordinator
+        logger.info(f"{self.name} is the leader on port {self.cluster_port}")
+        if self._on_leader:
+            step_down = self._on_leader(coordinator)
+            self._step_down = await step_down if inspect.isawaitable(step_down) else step_down
+        return True
+
+    async def client_connector(self, websocket):
+        worker = self.worker
+        if worker is None:
+            await websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason="Electing a leader")
+            return
+        await worker.client_connector(websocket)
+
+    async def run(self, stop: asyncio.Event):
+        reuse_port = hasattr(socket, "SO_REUSEPORT")
+        self._server = await serve(self.client_connector, self.ws_host, self.ws_port, reuse_port=reuse_port)
+        logger.info(f"{self.name} serving websockets on port {self.port}")
+        try:
+            while not stop.is_set():
+                if not self.is_leader:
+                    await self.elect()
+                try:
+                    self.worker = await WorkerNode(host=self.cluster_host, port=self.cluster_port, name=self.name).connect(attempts=1)
+                except OSError:
+                    # the leader is gone and someone else is mid-election; retry shortly
+                    await asyncio.sleep(random.uniform(0.05, 0.25))
+                    continue
+                if not self.is_leader:
+                    logger.info(f"{self.name} following the leader on port {self.cluster_port}")
+                self.ready.set()
+                lost = asyncio.ensure_future(self.worker.closed.wait())
+                stopped = asyncio.ensure_future(stop.wait())
+                await asyncio.wait({lost, stopped}, return_when=asyncio.FIRST_COMPLETED)
+                lost.cancel()
+                stopped.cancel()
+                self.ready.clear()
+                await self.worker.close()
+                self.worker = None
+        finally:
+            await self.close()
+
+    async def close(self):
+        if self.worker is not None:
+            await self.worker.close()
+            self.worker = None
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self.coordinator is not None:
+            if self._step_down:
+                result = self._step_down()
+                if inspect.isawaitable(result):
+                    await result
+                self._step_down = None
+            await self.coordinator.close()
+            self.coordinator = None
+
+    def stats(self) -> dict:
+        return {
+            "leader": self.is_leader,
+            "elections": self.elections,
+            "worker": self.worker.stats() if self.worker else None,
+            "coordinator": self.coordinator.stats() if self.coordinator else None,
+        }
@@ -0,0 +1,165 @@
+"""
+Hot restart: a new server process takes over the listening socket and the live
+room state of a running one.
+
+    HOT_RESTART=1 python -m app.main
+
+Both processes run with HOT_RESTART=1; without it a server neither takes over
+nor offers a handoff. The running process listens on HOT_RESTART_SOCKET. The
+successor connects and asks to take over; the old process passes it the listening socket (SCM_RIGHTS),
+stops accepting, closes its clients with 1012 so they reconnect, and sends its
+state. Once the successor is serving it answers READY and the old process exits.
+Connections that arrive in between wait in the socket's backlog rather than
+being refused.
+"""
+import asyncio, json, os, socket, struct, zlib, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.hot_restart")
+
+TAKEOVER = b"TAKEOVER\n"
+READY = b"READY\n"
+FDS = b"FDS"
+_LENGTH = struct.Struct("!Q")
+
+def encode_state(state: dict) -> bytes:
+    return zlib.compress(json.dumps(state, separators=(",", ":")).encode())
+
+def decode_state(payload: bytes) -> dict:
+    return json.loads(zlib.decompress(payload))
+
+async def _read_line(sock: socket.socket, limit: int = 64) -> bytes:
+    loop = asyncio.get_running_loop()
+    data = b""
+    while not data.endswith(b"\n") and len(data) < limit:
+        chunk = await loop.sock_recv(sock, limit - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+class HandoffServer:
+    """
+    Old-process side. Waits for a successor and hands it `server`'s listening
+    socket and the state returned by `prepare_state()`, which should stop
+    further changes (close clients, flush the journal). `done` is set once a
+    handoff finished or failed; after a failure `spare` holds a copy of the
+    listening socket to serve on again.
+    """
+    def __init__(self, path: str, server, prepare_state, timeout: float = settings.HOT_RESTART_TIMEOUT):
+        self.path = path
+        self.server = server
+        self._prepare_state = prepare_state
+        self.timeout = timeout
+        self.done = asyncio.Event()
+        self.handed_off = False
+        self.spare: socket.socket | None = None
+        self._sock: socket.socket | None = None
+        self._inode = None
+        self._task: asyncio.Task | None = None
+
+    def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._sock.bind(self.path)
+        self._inode = os.stat(self.path).st_ino
+        self._sock.listen(1)
+        self._sock.setblocking(False)
+        self._task = asyncio.create_task(self._accept())
+        return self
+
+    async def _accept(self):
+        loop = asyncio.get_running_loop()
+        while not self.done.is_set():
+            conn, _ = await loop.sock_accept(self._sock)
+            try:
+                await self._hand_off(conn)
+            except Exception as e:
+                logger.exception(f"Hot restart handoff failed: {e}")
+                if self.spare is not None:
+                    self.done.set()
+            finally:
+                conn.close()
+
+    async def _hand_off(self, conn: socket.socket):
+        loop = asyncio.get_running_loop()
+        conn.setblocking(False)
+        if await asyncio.wait_for(_read_line(conn), self.timeout) != TAKEOVER:
+            return
+        started = loop.time()
+        listening = [s for s in self.server.sockets]
+        socket.send_fds(conn, [FDS], [s.fileno() for s in listening])
+        # keep a copy to serve on again if the successor never gets ready
+        self.spare = socket.socket(fileno=os.dup(listening[0].fileno()))
+        self.server.close(close_connections=False)
+
+        payload = encode_state(await self._prepare_state())
+        await loop.sock_sendall(conn, _LENGTH.pack(len(payload)) + payload)
+        if await asyncio.wait_for(_read_line(conn), self.timeout) != READY:
+            raise ConnectionError("Successor closed the handoff before it was ready")
+        self.handed_off = True
+        self.spare.close()
+        self.spare = None
+        logger.info(f"Handed off {len(payload)} bytes of state in {(loop.time() - started) * 1000:.0f} ms")
+        self.done.set()
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+        if self._sock is not None:
+            self._sock.close()
+            self._sock = None
+            # by now the path may belong to the successor's listener
+            try:
+                if os.stat(self.path).st_ino == self._inode:
+                    os.unlink(self.path)
+            except FileNotFoundError:
+                pass
+
+class Takeover:
+    """Successor side: the inherited listening socket and state, and the READY reply."""
+    def __init__(self, conn: socket.socket, sock: socket.socket, state: dict):
+        self._conn = conn
+        self.sock = sock
+        self.state = state
+
+    def ready(self):
+        try:
+            self._conn.sendall(READY)
+        finally:
+            self._conn.close()
+
+def take_over(path: str, timeout: float = settings.HOT_RESTART_TIMEOUT) -> Takeover | None:
+    """Blocking: take over from the process listening on `path`; None if there is none."""
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    conn.settimeout(timeout)
+    try:
+        conn.connect(path)
+    except OSError:
+        conn.close()
+        return None
+    conn.sendall(TAKEOVER)
+    # read exactly the marker, so none of the state that follows is consumed with it
+    _, fds, _, _ = socket.recv_fds(conn, len(FDS), 4)
+    if not fds:
+        conn.close()
+        raise ConnectionError("Hot restart: no listening socket received")
+    sock = socket.socket(fileno=fds[0])
+    for extra in fds[1:]:
+        os.close(extra)
+
+    header = b""
+    while len(header) < _LENGTH.size:
+        chunk = conn.recv(_LENGTH.size - len(header))
+        if not chunk:
+            raise ConnectionError("Hot restart: state not received")
+        header += chunk
+    (length,) = _LENGTH.unpack(header)
+    payload = bytearray()
+    while len(payload) < length:
+        chunk = conn.recv(min(length - len(payload), 1 << 20))
+        if not chunk:
+            raise ConnectionError("Hot restart: state truncated")
+        payload += chunk
+    return Takeover(conn, sock, decode_state(bytes(payload)))
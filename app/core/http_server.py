@@ -0,0 +1,125 @@
+import asyncio, json, logging, urllib.parse
+from http import HTTPStatus
+
+logger = logging.getLogger("app.core.http_server")
+
+MAX_HEADER_LINES = 100
+MAX_BODY_BYTES = 1_000_000
+
+class HttpRequest:
+    def __init__(self, method: str, target: str, headers: dict[str, str], body: bytes = b""):
+        self.method = method
+        parsed = urllib.parse.urlsplit(target)
+        self.path = parsed.path
+        self.query = dict(urllib.parse.parse_qsl(parsed.query))
+        self.headers = headers  # lower-cased names
+        self.body = body
+
+    def form(self) -> dict:
+        """Parse an application/x-www-form-urlencoded body."""
+        return dict(urllib.parse.parse_qsl(self.body.decode()))
+
+class HttpResponse:
+    def __init__(self, status: int = 200, body=b"", headers: dict | None = None):
+        self.status = status
+        self.headers = dict(headers or {})
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode()
+            self.headers.setdefault("Content-Type", "application/json")
+        elif isinstance(body, str):
+            body = body.encode()
+            self.headers.setdefault("Content-Type", "text/plain; charset=utf-8")
+        self.body = body
+
+    def encode(self, keep_alive: bool) -> bytes:
+        reason = HTTPStatus(self.status).phrase
+        headers = {
+            **self.headers,
+            "Content-Length": str(len(self.body)),
+            "Connection": "keep-alive" if keep_alive else "close",
+        }
+        head = f"HTTP/1.1 {self.status} {reason}\r\n"
+        head += "".join(f"{name}: {value}\r\n" for name, value in headers.items())
+        return head.encode("latin-1") + b"\r\n" + self.body
+
+async def _read_request(reader: asyncio.StreamReader) -> HttpRequest | None:
+    request_line = await reader.readline()
+    if not request_line.strip():
+        return None
+    method, target, _ = request_line.decode("latin-1").split(" ", 2)
+    headers = {}
+    for _ in range(MAX_HEADER_LINES):
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    length = int(headers.get("content-length", 0))
+    if length > MAX_BODY_BYTES:
+        raise ValueError("Request body too large")
+    body = await reader.readexactly(length) if length else b""
+    return HttpRequest(method, target, headers, body)
+
+class HttpServer:
+    """
+    Minimal HTTP/1.1 server with keep-alive on the running event loop.
+    `handler` is an async callable taking an HttpRequest and returning an HttpResponse;
+    `on_connect`, if given, is called for every accepted TCP connection.
+    """
+    def __init__(self, handler, on_connect=None):
+        self._handler = handler
+        self._on_connect = on_connect
+        self._server: asyncio.Server | None = None
+        self._writers: set[asyncio.StreamWriter] = set()
+
+    @property
+    def sockets(self):
+        return self._server.sockets if self._server else ()
+
+    async def start(self, host: str | None, port: int | None, **kwargs) -> "HttpServer":
+        self._server = await asyncio.start_server(self._on_connection, host, port, **kwargs)
+        return self
+
+    async def close(self):
+        """Stop listening and drop idle keep-alive connections."""
+        if self._server is None:
+            return
+        self._server.close()
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+        self._server = None
+
+    async def _on_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        if self._on_connect is not None:
+            self._on_connect()
+        self._writers.add(writer)
+        try:
+            while True:
+                try:
+                    request = await _read_request(reader)
+                except (ValueError, asyncio.IncompleteReadError) as e:
+                    logger.debug(f"Malformed HTTP request: {e}")
+                    writer.write(HttpResponse(400, "Bad Request").encode(keep_alive=False))
+                    break
+                if request is None:
+                    break
+                try:
+                    response = await self._handler(request)
+                except Exception:
+                    logger.exception(f"Error handling {request.method} {request.path}")
+                    response = HttpResponse(500, "Internal Server Error")
+                keep_alive = request.headers.get("connection", "").lower() != "close"
+                writer.write(response.encode(keep_alive))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+async def start_http_server(handler, host: str | None, port: int | None, on_connect=None, **kwargs) -> HttpServer:
+    """Start an HttpServer on the running loop; see HttpServer."""
+    return await HttpServer(handler, on_connect).start(host, port, **kwargs)
@@ -1,21 +1,32 @@
+import asyncio
 from string import ascii_uppercase
 from random import choice
 from app.services.spotify_manager import SpotifyConnectionManager
-from flask import Flask
-from werkzeug.serving import make_server
+from app.core.http_server import start_http_server
 from threading import Thread
-from app.routes.routes import register_routes
+from app.config import settings
 from app.config.settings import HOST, ports
 import logging
 
 logger = logging.getLogger("app.core.init_app")
 
-app = Flask(__name__)
-register_routes(app)
+_flask_app = None
+
+def get_flask_app():
+    """The Flask app serving /callback; Flask is only imported when FLASK_CALLBACK opts in."""
+    global _flask_app
+    if _flask_app is None:
+        from flask import Flask
+        from app.routes.routes import register_routes
+        _flask_app = Flask(__name__)
+        register_routes(_flask_app)
+    return _flask_app
 
 class SpotifyConnectionThread(Thread):
     def __init__(self):
         Thread.__init__(self)
+        from werkzeug.serving import make_server
+        app = get_flask_app()
         self.server = make_server(HOST, ports["SPOTIFY_CLIENT_PORT"], app)
         self.context = app.app_context()
         self.context.push()
@@ -35,28 +46,40 @@ def generate_room_code(length):
         room_code = room_code + choice(ascii_uppercase)
     return room_code
 
-def start_spotify_integration():
+async def start_callback_server(handler):
     """
-    Start Flask server (always) and Spotify client thread (only if tokens exist).
-    Returns a tuple (flask_thread, spotify_client_thread).
+    Serve `handler` (/callback, /healthz, /metrics) on the running loop, or the
+    Flask app from its own thread with FLASK_CALLBACK. Returns an async stop().
     """
-    # Start Flask server for /callback
-    flask_thread = SpotifyConnectionThread()
-    flask_thread.start()
+    if settings.FLASK_CALLBACK:
+        flask_thread = SpotifyConnectionThread()
+        flask_thread.start()
+
+        async def stop():
+            # werkzeug's shutdown blocks until serve_forever next polls (every 0.1s)
+            await asyncio.to_thread(flask_thread.shutdown)
+            await asyncio.to_thread(flask_thread.join)
+        return stop
+
+    server = await start_http_server(handler, HOST, ports["SPOTIFY_CLIENT_PORT"])
+    return server.close
+
+async def start_spotify_integration(handler):
+    """
+    Start the callback server (always) and load the Spotify client's tokens (if they exist).
+    Returns a tuple (stop_callback_server, spotify_connection); spotify_connection is None without tokens.
+    """
+    stop_callback_server = await start_callback_server(handler)
 
     conn = SpotifyConnectionManager.get_instance()
     if not conn.load_tokens():
         logger.info("No tokens.json found. Run admin.py authorize to complete Spotify setup.")
-        return flask_thread, None
-
-    # Start Spotify client thread if tokens are loaded
-    spotify_client_thread = SpotifyConnectionThread()
-    spotify_client_thread.start()
+        return stop_callback_server, None
 
-    return flask_thread, spotify_client_thread
+    return stop_callback_server, conn
 
 def establish_spotify_connection():
     spotify_connection = SpotifyConnectionManager.get_instance()
     auth_url = spotify_connection.get_authorization_url()
     logger.debug("Authorization URL generated: %s", auth_url)
-    return auth_url
\ No newline at end of file
+    return auth_url
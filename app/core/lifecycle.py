@@ -0,0 +1,82 @@
+import asyncio, time, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.lifecycle")
+
+GOING_AWAY_CLOSE_CODE = 1001
+
+async def _call(fn):
+    result = fn()
+    # only coroutines are awaited; a start may return a Task to keep running
+    if asyncio.iscoroutine(result):
+        result = await result
+    return result
+
+class Lifecycle:
+    """
+    Starts components in dependency order and stops them in reverse, so each
+    one stops before whatever it depends on. All stops share one deadline; a
+    component that overruns is cancelled. Every stop still gets at least
+    `min_stop` seconds even once the deadline has passed, so the components
+    after a slow one (e.g. the journal's final flush) still run.
+    `start` and `stop` may be plain or coroutine functions.
+    """
+    def __init__(self, min_stop: float = settings.SHUTDOWN_MIN_STOP, clock=time.monotonic):
+        self.min_stop = min_stop
+        self._clock = clock
+        self._running: list[tuple[str, object]] = []
+        self.start_ms: dict[str, float] = {}
+        self.stop_ms: dict[str, float] = {}
+
+    async def start(self, name: str, start, stop):
+        """Start `name` now and register `stop` for shutdown; returns what `start` returned."""
+        started = self._clock()
+        result = await _call(start)
+        self._running.append((name, stop))
+        self.start_ms[name] = (self._clock() - started) * 1000
+        logger.debug(f"Started {name} in {self.start_ms[name]:.0f} ms")
+        return result
+
+    async def stop(self, timeout: float = settings.SHUTDOWN_TIMEOUT) -> dict[str, float]:
+        """Stop everything started so far, newest first, within `timeout` seconds."""
+        began = self._clock()
+        deadline = began + timeout
+        while self._running:
+            name, stop = self._running.pop()
+            started = self._clock()
+            try:
+                await asyncio.wait_for(_call(stop), max(deadline - started, self.min_stop))
+            except asyncio.TimeoutError:
+                logger.warning(f"{name} did not stop before the shutdown deadline")
+            except Exception as e:
+                logger.exception(f"Error stopping {name}: {e}")
+            self.stop_ms[name] = (self._clock() - started) * 1000
+            logger.info(f"Stopped {name} in {self.stop_ms[name]:.0f} ms")
+        logger.info(f"Shutdown took {(self._clock() - began) * 1000:.0f} ms")
+        return self.stop_ms
+
+    def stats(self) -> dict:
+        return {
+            "running": [name for name, _ in self._running],
+            "start_ms": {name: round(ms, 1) for name, ms in self.start_ms.items()},
+            "stop_ms": {name: round(ms, 1) for name, ms in self.stop_ms.items()},
+        }
+
+async def drain(server, timeout: float = settings.SHUTDOWN_DRAIN_TIMEOUT):
+    """
+    Stop accepting and close every websocket connection with 1001 (going away).
+    Clients get `timeout` seconds to complete the closing handshake; after that
+    the remaining connections are dropped and their handlers cancelled.
+    """
+    server.close()
+    try:
+        await asyncio.wait_for(server.wait_closed(), timeout)
+        return
+    except asyncio.TimeoutError:
+        pass
+    stuck = list(server.handlers.items())
+    logger.warning(f"Dropping {len(stuck)} websocket connections that did not close in time")
+    for connection, handler in stuck:
+        connection.transport.abort()
+        handler.cancel()
+    await server.wait_closed()
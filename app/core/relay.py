@@ -0,0 +1,71 @@
+import asyncio, json, logging
+
+logger = logging.getLogger("app.core.relay")
+
+# Newline-delimited JSON between the coordinator and its websocket workers
+MAX_LINE_BYTES = 4_000_000
+# A peer that lets this much pile up unread is stuck; its link is dropped
+MAX_BUFFERED_BYTES = 16_000_000
+
+def encode(message: dict) -> bytes:
+    return json.dumps(message, separators=(",", ":")).encode() + b"\n"
+
+class RelayLink:
+    """
+    One end of a coordinator <-> worker stream. `send` only buffers, so a
+    broadcast to many links never waits on a single one; once more than
+    `high_water` bytes are waiting, the peer is considered stuck and the link
+    is aborted (the other end sees a disconnect and cleans up as usual).
+    """
+    def __init__(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, name: str = "", high_water: int = MAX_BUFFERED_BYTES):
+        self._reader = reader
+        self._writer = writer
+        self.name = name
+        self.high_water = high_water
+        self.sent = 0
+        self.received = 0
+
+    @property
+    def closed(self) -> bool:
+        return self._writer.is_closing()
+
+    def send(self, message: dict):
+        if self.closed:
+            return
+        self._writer.write(encode(message))
+        self.sent += 1
+        buffered = self._writer.transport.get_write_buffer_size()
+        if buffered > self.high_water:
+            logger.warning(f"Relay link {self.name} has {buffered} bytes unread, dropping it")
+            # close() would wait to flush the backlog to a peer that is not reading
+            self._writer.transport.abort()
+
+    async def drain(self):
+        await self._writer.drain()
+
+    async def messages(self):
+        """Yield decoded messages until the other end disconnects."""
+        while True:
+            try:
+                line = await self._reader.readline()
+            except (ConnectionError, ValueError) as e:
+                logger.debug(f"Relay link {self.name} read failed: {e}")
+                return
+            if not line:
+                return
+            self.received += 1
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                logger.warning(f"Dropping malformed relay message from {self.name}")
+
+    def close(self):
+        self._writer.close()
+
+async def open_link(path: str | None = None, host: str | None = None, port: int | None = None, name: str = "") -> RelayLink:
+    """Connect to a coordinator on a Unix socket path or a TCP host/port."""
+    if path:
+        reader, writer = await asyncio.open_unix_connection(path, limit=MAX_LINE_BYTES)
+    else:
+        reader, writer = await asyncio.open_connection(host, port, limit=MAX_LINE_BYTES)
+    return RelayLink(reader, writer, name)
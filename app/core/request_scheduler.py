@@ -0,0 +1,148 @@
+import asyncio, functools, heapq, itertools, time, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.request_scheduler")
+
+# Lanes, highest priority first
+PRIORITY_USER = 0        # add_track, skip
+PRIORITY_SEARCH = 1      # guest searches
+PRIORITY_BACKGROUND = 2  # polling, lookups, reconciliation
+
+class RateLimitedError(Exception):
+    """Raised by a scheduled call when the upstream answered 429; `retry_after` is in seconds."""
+    def __init__(self, retry_after: float, message: str | None = None):
+        super().__init__(message or f"Rate limited, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+class RequestScheduler:
+    """
+    Central gate for upstream calls.
+    A token bucket paces requests to the configured rate, waiting calls are
+    released in priority order, and a 429 pauses the whole bucket for its
+    Retry-After before the call is retried.
+    """
+    def __init__(
+        self,
+        executor,
+        rate: float = settings.SPOTIFY_RATE_LIMIT,
+        burst: int = settings.SPOTIFY_RATE_BURST,
+        max_retries: int = settings.SPOTIFY_MAX_RETRIES,
+        clock=time.monotonic,
+    ):
+        self._executor = executor
+        self.rate = rate
+        self.burst = burst
+        self.max_retries = max_retries
+        self._clock = clock
+        self._tokens = float(burst)
+        self._updated = clock()
+        self._paused_until = 0.0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._wakeup = None
+        self._dispatcher = None
+        self._in_flight: set[asyncio.Future] = set()
+        self.dispatched = 0
+        self.rate_limited = 0
+        self.retries = 0
+
+    async def submit(self, priority: int, fn, *args, **kwargs):
+        """Run blocking `fn` on the executor once the bucket and higher-priority lanes allow it."""
+        loop = asyncio.get_running_loop()
+        call = functools.partial(fn, *args, **kwargs)
+        for attempt in range(self.max_retries + 1):
+            await self._acquire(priority)
+            future = loop.run_in_executor(self._executor, call)
+            self._in_flight.add(future)
+            try:
+                return await future
+            except RateLimitedError as e:
+                self.rate_limited += 1
+                self.pause(e.retry_after)
+                if attempt == self.max_retries:
+                    raise
+                self.retries += 1
+                logger.warning(f"Rate limited upstream, retrying in {e.retry_after}s (attempt {attempt + 1})")
+            finally:
+                self._in_flight.discard(future)
+
+    def pause(self, seconds: float):
+        """Hold every lane for `seconds` (e.g. a Retry-After) and drain the bucket."""
+        self._paused_until = max(self._paused_until, self._clock() + seconds)
+        self._tokens = 0.0
+        # refill from the end of the pause, or the bucket is full again the moment it ends
+        self._updated = self._paused_until
+
+    def _delay_until_token(self) -> float:
+        now = self._clock()
+        if now < self._paused_until:
+            return self._paused_until - now
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        if self._tokens >= 1:
+            return 0.0
+        return (1 - self._tokens) / self.rate
+
+    async def _acquire(self, priority: int):
+        self._ensure_dispatcher()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self._wakeup.set()
+        await future
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+            self._waiters = [w for w in self._waiters if w[2].get_loop() is loop]
+            heapq.heapify(self._waiters)
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch())
+
+    async def _dispatch(self):
+        while True:
+            # drop callers that gave up while waiting
+            while self._waiters and self._waiters[0][2].done():
+                heapq.heappop(self._waiters)
+            if not self._waiters:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+            delay = self._delay_until_token()
+            if delay > 0:
+                await asyncio.sleep(delay)
+                continue
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._tokens -= 1
+            self.dispatched += 1
+            future.set_result(None)
+
+    def close(self):
+        """Stop dispatching and cancel every call still waiting for a slot or for its response."""
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        for _, _, future in self._waiters:
+            if not future.done():
+                future.cancel()
+        self._waiters.clear()
+        # the worker thread finishes (bounded by the request timeout) but nobody waits for it
+        for future in self._in_flight:
+            future.cancel()
+        self._in_flight.clear()
+
+    def stats(self) -> dict:
+        pending = {PRIORITY_USER: 0, PRIORITY_SEARCH: 0, PRIORITY_BACKGROUND: 0}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                pending[priority] = pending.get(priority, 0) + 1
+        return {
+            "pending_user": pending[PRIORITY_USER],
+            "pending_search": pending[PRIORITY_SEARCH],
+            "pending_background": pending[PRIORITY_BACKGROUND],
+            "in_flight": len(self._in_flight),
+            "dispatched": self.dispatched,
+            "rate_limited": self.rate_limited,
+            "retries": self.retries,
+        }
@@ -1,16 +1,48 @@
 import base64
-import os, time, requests, json, urllib.parse, base64, logging
-from app.config.settings import api, request_info, HOST, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, ENV
+import os, time, requests, json, urllib.parse, base64, logging, asyncio, functools, tempfile, threading
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from app.core.request_scheduler import RequestScheduler, RateLimitedError, PRIORITY_USER, PRIORITY_SEARCH, PRIORITY_BACKGROUND
+from app.config.settings import (
+    api, api_timeouts, request_info, HOST, SPOTIFY_CLIENT_ID, SPOTIFY_CLIENT_SECRET, ENV,
+    SPOTIFY_MAX_CONCURRENCY, SPOTIFY_POOL_SIZE, SPOTIFY_CONNECT_TIMEOUT, SPOTIFY_READ_TIMEOUT,
+)
 
 logger = logging.getLogger("app.core.spotify_client")
 class SpotifyConnection:
-    def __init__(self):
+    def __init__(self, pool_size: int = SPOTIFY_POOL_SIZE, tokens_file: str = "tokens.json"):
+        # where this account's tokens are persisted (one file per Spotify account)
+        self.tokens_file = tokens_file
         self._spotify_general_token = None
         self._spotify_user_token = None
         self._spotify_refresh_token = None
         self._client_id = SPOTIFY_CLIENT_ID
         self._client_secret = SPOTIFY_CLIENT_SECRET
         self._token_expiration = 0
+        self._token_lock = threading.Lock()
+        self._session = self._build_session(pool_size)
+
+    @staticmethod
+    def _build_session(pool_size: int) -> requests.Session:
+        """Keep-alive session so polls, searches and queue adds reuse open TLS connections."""
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _request(self, method: str, endpoint: str, **kwargs) -> requests.Response:
+        """Issue a request to one of the `api` endpoints with its configured timeouts."""
+        timeout = api_timeouts.get(endpoint, (SPOTIFY_CONNECT_TIMEOUT, SPOTIFY_READ_TIMEOUT))
+        response = self._session.request(method, api[endpoint], timeout=timeout, **kwargs)
+        if response.status_code == 429:
+            retry_after = float(response.headers.get("Retry-After", 1))
+            logger.warning(f"Spotify rate limited {endpoint}, Retry-After {retry_after}s")
+            raise RateLimitedError(retry_after, f"Spotify rate limited {endpoint}, retry after {retry_after}s")
+        return response
+
+    def close(self):
+        self._session.close()
 
     @property
     def token_info(self):
@@ -26,11 +58,23 @@ class SpotifyConnection:
         self._spotify_refresh_token = token_info.get("refresh_token")
         self._token_expiration = token_info.get("expires_at", 0)
 
-    def save_tokens(self, path="tokens.json"):
-        with open(path, "w") as f:
-            json.dump(self.token_info, f)
+    def save_tokens(self, path=None):
+        """Write tokens to a temp file and rename it over `path`, so readers never see a partial file."""
+        path = path or self.tokens_file
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tokens-", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                json.dump(self.token_info, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
 
-    def load_tokens(self, path="tokens.json"):
+    def load_tokens(self, path=None):
+        path = path or self.tokens_file
         if (ENV != 'dev'):
             token_info = {
                 "access_token": os.getenv("SPOTIFY_ACCESS_TOKEN"),
@@ -43,7 +87,7 @@ class SpotifyConnection:
             with open(path) as f:
                 token_info = json.load(f)
         except(json.JSONDecodeError, OSError) as e:
-            logger.error("Error loading tokens from file:", e)
+            logger.error(f"Error loading tokens from file: {e}")
             return False
         self.load_token_info(token_info)
         return True
@@ -57,16 +101,19 @@ class SpotifyConnection:
         data = {
             "grant_type": "client_credentials"
         }
-        response = requests.post(api["token"], headers=headers, data=data)
+        response = self._request("POST", "token", headers=headers, data=data)
         self._spotify_general_token = response.json()
 
-    def get_authorization_url(self):
+    def get_authorization_url(self, state=None):
+        """`state` comes back on the callback; a room code there authorizes that room's account."""
         params = {
             "client_id": self._client_id,
             "response_type": "code",
             "redirect_uri": f"http://{HOST}:8081/callback",
             "scope": "user-modify-playback-state user-read-currently-playing user-read-playback-state",
         }
+        if state:
+            params["state"] = state
         authorize_url = f"{api["authorize"]}?{urllib.parse.urlencode(params)}"
         return authorize_url
     
@@ -81,13 +128,13 @@ class SpotifyConnection:
             "client_id": self._client_id,
             "client_secret": self._client_secret
         }
-        response = requests.post(api["token"], headers=headers, data=data)
+        response = self._request("POST", "token", headers=headers, data=data)
         token_info = response.json()
         self._spotify_user_token = token_info["access_token"]
         self._spotify_refresh_token = token_info["refresh_token"]
         expires_in = token_info["expires_in"] # 3600 seconds
         self._token_expiration = time.time() + expires_in - 60  # refresh 1 min early
-        logger.debug("Spotify user token expires at: ", self._token_expiration)
+        logger.debug(f"Spotify user token expires at: {self._token_expiration}")
         self.save_tokens()
 
     def refresh_access_token(self):
@@ -101,7 +148,7 @@ class SpotifyConnection:
             "client_secret": self._client_secret
         }
 
-        response = requests.post(api["token"], headers=headers, data=data)
+        response = self._request("POST", "token", headers=headers, data=data)
         token_info = response.json()
         self._spotify_user_token = token_info["access_token"]
         expires_in = token_info.get("expires_in", 3600)
@@ -115,17 +162,33 @@ class SpotifyConnection:
         else:
             logger.warning("No new refresh token provided; keeping the existing one or restart server.")
 
+    def _token_expiring(self, lead: float = 0) -> bool:
+        return self._spotify_user_token is None or self._token_expiration - lead <= time.time()
+
     def ensure_token_valid(self):
-        if self._spotify_user_token is None or self._token_expiration <= time.time():
-            logger.debug("token expired or not set, refreshing...")
+        if not self._token_expiring():
+            return
+        with self._token_lock:
+            # another caller may have refreshed while we waited for the lock
+            if self._token_expiring():
+                logger.debug("token expired or not set, refreshing...")
+                self.refresh_access_token()
+
+    def refresh_if_expiring(self, lead: float, path=None) -> bool:
+        """Refresh and persist the token if it expires within `lead` seconds. Returns True if refreshed."""
+        with self._token_lock:
+            if not self._token_expiring(lead):
+                return False
             self.refresh_access_token()
+            self.save_tokens(path)
+            return True
     
     def get_currently_playing(self):
         self.ensure_token_valid()
         headers = {
             "Authorization": f"Bearer {self._spotify_user_token}"
         }
-        response = requests.get(api["currently_playing"], headers=headers)
+        response = self._request("GET", "currently_playing", headers=headers)
 
         if response.status_code == 200:
             return response.json()
@@ -133,7 +196,7 @@ class SpotifyConnection:
             logger.debug("No track currently playing.")
             return None
         else:
-            logger.error("Error getting currently playing track:", response.status_code, response.text)
+            logger.error(f"Error getting currently playing track: {response.status_code} {response.text}")
             raise Exception(f"Error getting currently playing track: {response.status_code} - {response.text}")
         
     def search_songs(self, query, type="track", limit=5):
@@ -146,14 +209,43 @@ class SpotifyConnection:
             "type": type,
             "limit": limit
         }
-        response = requests.get(api["track_search"], headers=headers, params=params)
+        response = self._request("GET", "track_search", headers=headers, params=params)
         if response.status_code == 200:
-            logger.debug("Search songs response:", response.json())
+            logger.debug(f"Search songs response: {response.status_code}")
             return response.json()
         else:
-            logger.error("Error searching for songs:", response.status_code, response.text)
+            logger.error(f"Error searching for songs: {response.status_code} {response.text}")
             raise Exception(f"Error searching for songs: {response.status_code} - {response.text}")
         
+    def get_tracks(self, track_ids):
+        """Look up several tracks in one call; Spotify accepts up to 50 ids."""
+        self.ensure_token_valid()
+        headers = {
+            "Authorization": f"Bearer {self._spotify_user_token}"
+        }
+        params = {
+            "ids": ",".join(track_ids)
+        }
+        response = self._request("GET", "track_lookup", headers=headers, params=params)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.error(f"Error looking up tracks: {response.status_code} {response.text}")
+            raise Exception(f"Error looking up tracks: {response.status_code} - {response.text}")
+
+    def get_player_queue(self):
+        """The currently playing track and the upcoming ones, in one call."""
+        self.ensure_token_valid()
+        headers = {
+            "Authorization": f"Bearer {self._spotify_user_token}"
+        }
+        response = self._request("GET", "player_queue", headers=headers)
+        if response.status_code == 200:
+            return response.json()
+        else:
+            logger.error(f"Error getting player queue: {response.status_code} {response.text}")
+            raise Exception(f"Error getting player queue: {response.status_code} - {response.text}")
+
     def add_track_by_id(self, track_id):
         self.ensure_token_valid()
         headers = {
@@ -163,8 +255,8 @@ class SpotifyConnection:
         params = {
             "uri": f"spotify:track:{track_id}"
         }
-        response = requests.post(api["add_to_queue"], headers=headers, params=params)
-        logger.debug("Add track response:", response.status_code, response.text)
+        response = self._request("POST", "add_to_queue", headers=headers, params=params)
+        logger.debug(f"Add track response: {response.status_code} {response.text}")
         return response
     
     def skip_track(self):
@@ -173,6 +265,77 @@ class SpotifyConnection:
             "Authorization": f"Bearer {self._spotify_user_token}",
             "Content-Type": "application/json"
         }
-        response = requests.post(api["next_song"], headers=headers)
-        logger.debug("Skip track response:", response.status_code, response.text)
-        return response
\ No newline at end of file
+        response = self._request("POST", "next_song", headers=headers)
+        logger.debug(f"Skip track response: {response.status_code} {response.text}")
+        return response
+
+class AsyncSpotifyConnection:
+    """
+    Asyncio front-end for SpotifyConnection with the same method surface.
+    Each call runs on a bounded worker pool, so the event loop keeps serving
+    websockets while Spotify requests are in flight. API calls pass through
+    the RequestScheduler, which paces them and orders them by priority lane.
+    """
+    def __init__(self, connection: SpotifyConnection, max_workers: int = SPOTIFY_MAX_CONCURRENCY, scheduler: RequestScheduler | None = None):
+        self._connection = connection
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="spotify")
+        self.scheduler = scheduler or RequestScheduler(self._executor)
+        self._in_flight: set[asyncio.Future] = set()
+
+    @property
+    def connection(self) -> SpotifyConnection:
+        return self._connection
+
+    @property
+    def token_info(self):
+        return self._connection.token_info
+
+    async def _run(self, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self._executor, functools.partial(fn, *args, **kwargs))
+        self._in_flight.add(future)
+        try:
+            return await future
+        finally:
+            self._in_flight.discard(future)
+
+    async def _schedule(self, priority, fn, *args, **kwargs):
+        return await self.scheduler.submit(priority, fn, *args, **kwargs)
+
+    async def exchange_code_for_token(self, authorization_code):
+        return await self._run(self._connection.exchange_code_for_token, authorization_code)
+
+    async def refresh_access_token(self):
+        return await self._run(self._connection.refresh_access_token)
+
+    async def ensure_token_valid(self):
+        return await self._run(self._connection.ensure_token_valid)
+
+    async def refresh_if_expiring(self, lead: float, path=None):
+        return await self._run(self._connection.refresh_if_expiring, lead, path)
+
+    async def get_currently_playing(self, priority=PRIORITY_BACKGROUND):
+        return await self._schedule(priority, self._connection.get_currently_playing)
+
+    async def search_songs(self, query, type="track", limit=5):
+        return await self._schedule(PRIORITY_SEARCH, self._connection.search_songs, query, type=type, limit=limit)
+
+    async def get_tracks(self, track_ids, priority=PRIORITY_BACKGROUND):
+        return await self._schedule(priority, self._connection.get_tracks, track_ids)
+
+    async def get_player_queue(self, priority=PRIORITY_BACKGROUND):
+        return await self._schedule(priority, self._connection.get_player_queue)
+
+    async def add_track_by_id(self, track_id):
+        return await self._schedule(PRIORITY_USER, self._connection.add_track_by_id, track_id)
+
+    async def skip_track(self):
+        return await self._schedule(PRIORITY_USER, self._connection.skip_track)
+
+    def shutdown(self, wait: bool = False):
+        """Stop the scheduler and worker pool; queued and in-flight calls are cancelled for their callers."""
+        self.scheduler.close()
+        for future in self._in_flight:
+            future.cancel()
+        self._in_flight.clear()
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -0,0 +1,61 @@
+import asyncio, time, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.token_manager")
+
+class TokenManager:
+    """
+    Keeps the Spotify user token fresh in the background.
+    Refreshes ahead of expiry so user-facing calls never wait on OAuth;
+    concurrent refresh requests share a single attempt.
+    """
+    def __init__(
+        self,
+        spotify_connection,
+        lead: float = settings.TOKEN_REFRESH_LEAD,
+        retry_delay: float = settings.TOKEN_REFRESH_RETRY,
+        tokens_file: str = settings.TOKENS_FILE,
+        clock=time.time,
+    ):
+        self._spotify = spotify_connection
+        self.lead = lead
+        self.retry_delay = retry_delay
+        self.tokens_file = tokens_file
+        self._clock = clock
+        self._inflight = None
+        self.refreshes = 0
+        self.failures = 0
+
+    def seconds_until_refresh(self) -> float:
+        expires_at = self._spotify.token_info.get("expires_at") or 0
+        return max(expires_at - self.lead - self._clock(), 0)
+
+    async def refresh(self) -> bool:
+        """Refresh if within the lead window, joining a refresh already in progress."""
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(
+                self._spotify.refresh_if_expiring(self.lead, self.tokens_file)
+            )
+            self._inflight.add_done_callback(self._clear_inflight)
+        return await asyncio.shield(self._inflight)
+
+    def _clear_inflight(self, task: asyncio.Future):
+        if self._inflight is task:
+            self._inflight = None
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            self.failures += 1
+        elif task.result():
+            self.refreshes += 1
+
+    async def run(self):
+        """Background loop: sleep until the refresh window opens, then refresh."""
+        while True:
+            await asyncio.sleep(max(self.seconds_until_refresh(), 1))
+            try:
+                if await self.refresh():
+                    logger.debug(f"Spotify token refreshed ahead of expiry; next refresh in {self.seconds_until_refresh():.0f}s")
+            except Exception as e:
+                logger.error(f"Background token refresh failed: {e}")
+                await asyncio.sleep(self.retry_delay)
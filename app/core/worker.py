@@ -0,0 +1,206 @@
+import asyncio, itertools, json, multiprocessing, signal, time, logging
+from websockets.asyncio.server import serve
+from app.config import settings
+from app.core.lifecycle import drain
+from app.core.relay import open_link
+from app.services.identity_manager import IdentityManager
+
+logger = logging.getLogger("app.core.worker")
+
+# Close code sent to clients when their worker loses the coordinator (1012: service restart)
+SERVICE_RESTART_CLOSE_CODE = 1012
+
+class WorkerNode:
+    """
+    Websocket front end for a Coordinator. Terminates client sockets, forwards
+    their hellos and messages, and fans the coordinator's sends and broadcasts
+    out through a local IdentityManager per room, so each client still has a
+    bounded outbox and slow clients are still evicted.
+    """
+    def __init__(self, path: str | None = None, host: str | None = None, port: int | None = None, name: str = "worker"):
+        self._address = {"path": path, "host": host, "port": port}
+        self.name = name
+        self._link = None
+        self._reader_task: asyncio.Task | None = None
+        self._conn_ids = itertools.count(1)
+        self._pending: dict[int, tuple[object, asyncio.Future]] = {}
+        self._rooms: dict[str, IdentityManager] = {}
+        self.closed = asyncio.Event()
+
+    async def connect(self, attempts: int = 50, delay: float = 0.1):
+        """Connect to the coordinator, retrying while it starts up."""
+        for attempt in range(attempts):
+            try:
+                self._link = await open_link(**self._address, name=self.name)
+                break
+            except OSError:
+                if attempt == attempts - 1:
+                    raise
+                await asyncio.sleep(delay)
+        self.closed.clear()
+        self._reader_task = asyncio.create_task(self._read())
+        return self
+
+    async def close(self):
+        if self._link is not None:
+            self._link.close()
+        if self._reader_task is not None:
+            await asyncio.gather(self._reader_task, return_exceptions=True)
+
+    async def client_connector(self, websocket):
+        raw = await websocket.recv()
+        hello = json.loads(raw)
+        if self._link is None or self._link.closed:
+            await websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason="Coordinator unavailable")
+            return
+
+        conn = next(self._conn_ids)
+        joined = asyncio.get_running_loop().create_future()
+        self._pending[conn] = (websocket, joined)
+        self._link.send({"type": "hello", "conn": conn, "hello": hello})
+        try:
+            reply = await asyncio.wait_for(joined, settings.WORKER_JOIN_TIMEOUT)
+        except (asyncio.TimeoutError, ConnectionError) as e:
+            logger.warning(f"{self.name}: join failed: {e}")
+            await websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason="Coordinator unavailable")
+            return
+        finally:
+            self._pending.pop(conn, None)
+
+        if reply["type"] == "reject":
+            await websocket.send(json.dumps(reply["payload"]))
+            return
+
+        room, session_id = reply["room"], reply["session"]
+        try:
+            async for raw in websocket:
+                self._link.send({"type": "message", "conn": conn, "room": room, "session": session_id, "message": json.loads(raw)})
+        except Exception as e:
+            logger.error(f"{self.name}: error in client connection: {e}")
+        finally:
+            members = self._rooms.get(room)
+            if members is not None:
+                members.unregister(session_id, websocket)
+                if not members.all_session_ids():
+                    self._rooms.pop(room, None)
+            self._link.send({"type": "leave", "conn": conn, "room": room, "session": session_id})
+
+    async def _read(self):
+        async for message in self._link.messages():
+            match message.get("type"):
+                case "joined":
+                    websocket, joined = self._pending.get(message["conn"], (None, None))
+                    if websocket is None:
+                        continue
+                    # register before resolving, so the init payload that follows finds the socket
+                    self._rooms.setdefault(message["room"], IdentityManager()).register(websocket, message["session"])
+                    joined.set_result(message)
+                case "reject":
+                    _, joined = self._pending.get(message["conn"], (None, None))
+                    if joined is not None:
+                        joined.set_result(message)
+                case "send":
+                    members = self._rooms.get(message["room"])
+                    if members is not None:
+                        await members.send_to(message["session"], message["payload"])
+                case "broadcast":
+                    members = self._rooms.get(message["room"])
+                    if members is not None:
+                        await members.broadcast(message["payload"], kind=message.get("kind"))
+                case "drop":
+                    members = self._rooms.get(message["room"])
+                    websocket = members.get_websocket(message["session"]) if members is not None else None
+                    if websocket is not None:
+                        asyncio.ensure_future(websocket.close(code=1011, reason="Join failed"))
+
+        logger.warning(f"{self.name}: lost the coordinator, closing client connections")
+        for _, joined in self._pending.values():
+            if not joined.done():
+                joined.set_exception(ConnectionError("Coordinator disconnected"))
+        for members in self._rooms.values():
+            for websocket in members.all_websockets():
+                asyncio.ensure_future(websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason="Service restart"))
+        self._rooms.clear()
+        self.closed.set()
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "clients": sum(len(members.all_session_ids()) for members in self._rooms.values()),
+            "relay_sent": self._link.sent if self._link else 0,
+            "relay_received": self._link.received if self._link else 0,
+        }
+
+async def serve_worker(index: int, coordinator_path: str, host: str, port: int):
+    node = await WorkerNode(path=coordinator_path, name=f"worker-{index}").connect()
+    # every worker binds the same port; the kernel spreads new connections between them
+    server = await serve(node.client_connector, host, port, reuse_port=True)
+    logger.info(f"Worker {index} serving websockets on port {port}")
+    # the pool stops workers with SIGTERM; close clients properly instead of dying mid-frame
+    stopping = asyncio.Event()
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stopping.set)
+    waiters = {asyncio.ensure_future(node.closed.wait()), asyncio.ensure_future(stopping.wait())}
+    _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+    for waiter in pending:
+        waiter.cancel()
+    await drain(server)
+    await node.close()
+
+def run_worker(index: int, coordinator_path: str, host: str, port: int, log_level: int):
+    """Process entry point for one websocket worker."""
+    from app.config.logging_config import setup_logging
+    setup_logging(level=log_level, to_stdout=True, to_file=False)
+    try:
+        asyncio.run(serve_worker(index, coordinator_path, host, port))
+    except KeyboardInterrupt:
+        pass
+
+class WorkerPool:
+    """Starts websocket worker processes and restarts any that exit until stopped."""
+    def __init__(self, count: int, coordinator_path: str, host: str, port: int, log_level: int = logging.INFO):
+        self.count = count
+        self._args = (coordinator_path, host, port, log_level)
+        self._context = multiprocessing.get_context("spawn")
+        self._processes: dict[int, multiprocessing.Process] = {}
+        self.restarts = 0
+        self._stopping = False
+
+    def _spawn(self, index: int):
+        process = self._context.Process(target=run_worker, args=(index, *self._args), name=f"crowdtraq-worker-{index}", daemon=True)
+        process.start()
+        self._processes[index] = process
+
+    def start(self):
+        for index in range(self.count):
+            self._spawn(index)
+        return self
+
+    async def supervise(self, interval: float = 1.0):
+        while not self._stopping:
+            await asyncio.sleep(interval)
+            for index, process in list(self._processes.items()):
+                if not process.is_alive() and not self._stopping:
+                    logger.warning(f"Worker {index} exited with {process.exitcode}, restarting")
+                    self.restarts += 1
+                    self._spawn(index)
+
+    def stop(self, timeout: float = settings.SHUTDOWN_DRAIN_TIMEOUT + 1):
+        """SIGTERM every worker, then wait for all of them under one deadline; stragglers are killed."""
+        self._stopping = True
+        for process in self._processes.values():
+            process.terminate()
+        deadline = time.monotonic() + timeout
+        for process in self._processes.values():
+            process.join(max(deadline - time.monotonic(), 0))
+        for process in self._processes.values():
+            if process.is_alive():
+                logger.warning(f"{process.name} did not stop in time, killing it")
+                process.kill()
+                process.join()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.count,
+            "alive": sum(process.is_alive() for process in self._processes.values()),
+            "restarts": self.restarts,
+        }
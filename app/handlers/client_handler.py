@@ -1,5 +1,8 @@
 from app.services.spotify_manager import SpotifyConnectionManager
 from app.services.queue_manager import SongQueue, SongFeedback
+from app.services.search_cache import SearchCache
+from app.services.now_playing import NowPlayingSnapshot, format_currently_playing
+from app.services.track_metadata import TrackMetadataStore
 from app.config.settings import (
     QUEUE_INSUFFICIENT_TOKENS,
     INVALID_TRACK_ID,
@@ -13,12 +16,17 @@ import logging
 logger = logging.getLogger("app.core.client_handler")
 class ClientHandler:
 
-    def __init__(self, currency_manager):
+    def __init__(self, currency_manager, search_cache=None, now_playing=None, track_metadata=None, spotify_connection=None):
         self._songQueue = SongQueue()
         self.song_feedback = SongFeedback()
         self.currency_manager = currency_manager
-        self._spotify_connection = SpotifyConnectionManager.get_instance()
-        self._currently_playing = None
+        # A room's own Spotify account; without one the handler uses the shared connection
+        self._room_connection = spotify_connection
+        self._spotify_connection = spotify_connection or SpotifyConnectionManager.get_async_instance()
+        # Caches may be shared between handlers that use the same Spotify account
+        self.search_cache = search_cache or SearchCache()
+        self.now_playing = now_playing or NowPlayingSnapshot(lambda: self._spotify_connection.get_currently_playing())
+        self.track_metadata = track_metadata or TrackMetadataStore(lambda ids: self._spotify_connection.get_tracks(ids))
 
     def get_queue_length(self):
         """
@@ -26,11 +34,11 @@ class ClientHandler:
         """
         return self._songQueue.length()
 
-    def message_handler(self, message, client_id):
+    async def message_handler(self, message, client_id):
         """
         Handles incoming messages from the client and returns appropriate responses.
         """
-        self._spotify_connection = SpotifyConnectionManager.get_instance()
+        self._spotify_connection = self._room_connection or SpotifyConnectionManager.get_async_instance()
 
         if not isinstance(message, dict):
             return self._error(code=GENERAL_ERROR, message="Message must be a JSON object.")
@@ -43,7 +51,7 @@ class ClientHandler:
         match action:
             case "refresh":
                 logger.debug(f"Client {client_id} requested refresh of currently playing")
-                return self.clean_currently_playing()
+                return await self.clean_currently_playing()
 
             case "add_track":
                 track_id = data.get("track_id")
@@ -61,7 +69,7 @@ class ClientHandler:
                         details={"requiredTokens": self.currency_manager.calculate_cost(self._songQueue.length()), "availableTokens": new_balance}
                     )
 
-                response = self._spotify_connection.add_track_by_id(track_id)
+                response = await self._spotify_connection.add_track_by_id(track_id)
                 if hasattr(response, "status_code") and response.status_code == 200:
                     self._songQueue.add(track_id, client_id)
                     return {"success": True, "tokens": new_balance}
@@ -76,18 +84,21 @@ class ClientHandler:
             case "like_track":
                 logger.debug(f"Client {client_id} liked the current track")
                 self.song_feedback.like(client_id)
-                return self.check_currently_playing()
+                return await self.check_currently_playing()
                 
 
             case "dislike_track":
                 logger.debug(f"Client {client_id} disliked the current track")
                 self.song_feedback.dislike(client_id)
-                return self.check_currently_playing()
+                return await self.check_currently_playing()
 
             case "search":
                 logger.debug(f"Client {client_id} searching for songs with query: {data.get('query', '')}")
                 query = data.get("query", "")
-                return self.search_song(query)
+                return await self.search_song(query)
+
+            case "get_queue":
+                return await self.get_upcoming_queue(client_id, data.get("offset", 0), data.get("limit"))
             case "log_event":
                 event_message = data.get("message", "unknown")
                 event_details = data.get("context", {})
@@ -101,8 +112,8 @@ class ClientHandler:
                 logger.warning("Client {client_id} sent unknown action: {action}")
                 return {"success": False}
 
-    def check_currently_playing(self):
-        current = self._currently_playing or self._spotify_connection.get_currently_playing()
+    async def check_currently_playing(self):
+        current = await self.now_playing.get()
         if not current or not current.get("item"):
             return self._error(code=NO_TRACK_PLAYING, message="No track is currently playing.")
 
@@ -121,41 +132,35 @@ class ClientHandler:
             }
         }
 
-    def clean_currently_playing(self):
+    async def clean_currently_playing(self):
         """
         Extracts and formats relevant info from Spotify's currently playing API response.
+        Served from the shared now-playing snapshot, so it is usually a memory read.
         """
         if self._spotify_connection is None:
             raise Exception("Spotify connection is not established. Please ensure SpotifyConnection instance runs as expected.")
 
-        self._currently_playing = self._spotify_connection.get_currently_playing()
-        if self._currently_playing is None:
+        currently_playing = await self.now_playing.get()
+        if currently_playing is None:
             return self._error(code=NO_TRACK_PLAYING, message="No track is currently playing.")
-        
-        item = self._currently_playing.get("item", {})
-
-        return { "currently_playing":{
-            "track_name": item.get("name"),
-            "artists": [artist.get("name") for artist in item.get("artists", [])],
-            "album": item.get("album", {}).get("name"),
-            "album_art": item.get("album", {}).get("images", [{}])[0].get("url"),
-            "duration_ms": item.get("duration_ms"),
-            "progress_ms": self._currently_playing.get("progress_ms"),
-            "is_playing": self._currently_playing.get("is_playing"),
-            "track_id": item.get("id"),
-            "uri": item.get("uri"),
-        }}
-
-    def search_song(self, input):
+
+        return {"currently_playing": format_currently_playing(currently_playing)}
+
+    async def search_song(self, input):
         """
         Looks up a track by its ID and returns its details.
+        Repeated and concurrent identical queries are served from the search cache.
         """
-        track_info = self._spotify_connection.search_songs(input)
+        return await self.search_cache.get_or_fetch(input, self._fetch_search)
+
+    async def _fetch_search(self, query):
+        track_info = await self._spotify_connection.search_songs(query)
 
         if not track_info:
             return None
 
         items = track_info["tracks"].get("items", [])
+        self.track_metadata.seed(items)
         data = [
             {
                 "track_name": item.get("name"),
@@ -166,4 +171,21 @@ class ClientHandler:
             for item in items
         ]
 
-        return {"search_data": data}
\ No newline at end of file
+        return {"search_data": data}
+
+    async def get_upcoming_queue(self, client_id, offset=0, limit=None):
+        """
+        Returns the upcoming queue (or one page of it) with track details, marking the caller's own songs.
+        Unknown tracks are looked up in batches, so this costs at most one Spotify call per 50 of them.
+        """
+        offset = offset if isinstance(offset, int) and offset > 0 else 0
+        limit = limit if isinstance(limit, int) and limit >= 0 else None
+        entries = self._songQueue.as_list(offset, limit)
+        metadata = await self.track_metadata.get_many(entry["track_id"] for entry in entries)
+        return {"queue": [
+            {
+                **metadata.get(entry["track_id"], {"track_id": entry["track_id"]}),
+                "mine": entry["owner"] == client_id,
+            }
+            for entry in entries
+        ], "offset": offset, "total": self._songQueue.length()}
\ No newline at end of file
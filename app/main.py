@@ -1,166 +1,287 @@
 from websockets.asyncio.server import serve
-import asyncio, json, signal, time, os, logging
+import asyncio, json, signal, socket, time, os, logging
 
-from app.core.init_app import start_spotify_integration
+from app.core.init_app import start_spotify_integration, start_callback_server, generate_room_code
+from app.routes.http_routes import build_handler
+from app.core.token_manager import TokenManager
 from app.config import settings
 from app.config.logging_config import setup_logging
-from app.services.currency_manager import CurrencyManager
-from app.services.playback_manager import PlaybackManager
-from app.handlers.client_handler import ClientHandler
-from app.services.identity_manager import IdentityManager
+from app.services.room_manager import RoomManager
+from app.services.journal import Journal
+from app.services.coordinator import ClusterMembers, Coordinator
+from app.core.worker import WorkerPool, SERVICE_RESTART_CLOSE_CODE
+from app.core.cluster import ClusterNode
+from app.core.hot_restart import HandoffServer, take_over
+from app.core.lifecycle import Lifecycle, drain
+from app.services.spotify_manager import SpotifyConnectionManager
 
 LEVEL = getattr(logging, settings.LOG_LEVEL.upper(), logging.INFO)
 logger = setup_logging(level=LEVEL, to_stdout=True, to_file=True)
 
-# Room code functionality not MVP
-# room_code = generate_room_code(4)
 shutdown_event = asyncio.Event()
-connected_clients = {}
-
-currency_manager = CurrencyManager()
-client_handler = ClientHandler(currency_manager)
-identity_manager = IdentityManager()
-
-# Playback manager orchestrates queue + feedback + rewards
-playback_manager = PlaybackManager(
-    client_handler._spotify_connection,
-    client_handler._songQueue,
-    client_handler.song_feedback,
-    currency_manager
-)
+# Set during shutdown, once polling has stopped, to drain websocket clients
+stop_serving = asyncio.Event()
 
-async def poll_currently_playing():
-    while True:
-        try:
-            sleep_time = await playback_manager.poll_currently_playing(broadcast_queue_length)
-            await asyncio.sleep(sleep_time)
-        except Exception as e:
-            if not os.path.exists(settings.TOKENS_FILE):
-                logger.info("Spotify not authorized. Run admin.py authorize to create tokens.json.")
-                return
-            else: 
-                logger.exception("Error polling currently playing:", e)
-                await asyncio.sleep(5)
-
-async def broadcast_queue_length():
-    queue_length = client_handler.get_queue_length()
-    payload = json.dumps({"queue_length": queue_length})
-    targets = list(connected_clients.values())
-    logger.debug(f"Broadcasting queue length {queue_length} to {len(targets)} clients")
-
-    results = await asyncio.gather(*(safe_send(ws, payload) for ws in targets), return_exceptions=True)
-    for ws, result in zip(targets, results):
-        if isinstance(result, Exception):
-            bad_id = None
-            for cid, sock in connected_clients.items():
-                if sock is ws:
-                    bad_id = cid
-                    break
-            logger.debug(f"Pruning client {bad_id}: {result}")
-            if bad_id:
-                connected_clients.pop(bad_id, None)
-
-
-async def safe_send(ws, payload):
-    await ws.send(payload)
+# Each room owns its queue, feedback, balances, members and poller; clients without a roomCode join the default room
+# Workers share the port via SO_REUSEPORT; without it everything stays in this process
+CLUSTERED = settings.WEBSOCKET_WORKERS > 1 and hasattr(socket, "SO_REUSEPORT")
+
+# With several websocket workers the rooms live here, behind the coordinator, and members are remote
+room_manager = RoomManager(
+    default_code=generate_room_code(settings.ROOM_CODE_LENGTH),
+    members_factory=ClusterMembers if CLUSTERED else None,
+)
+journal: Journal | None = None
 
 async def client_connector(websocket):
     raw = await websocket.recv()
     hello = json.loads(raw)
-    session_id = identity_manager.register(websocket, hello.get("sessionId"))
+    room = room_manager.admit(hello)
+    if room is None:
+        await websocket.send(json.dumps({
+            "success": False,
+            "error": {"code": settings.INVALID_ROOM_CODE, "message": "Unknown or invalid room code.", "details": {}}
+        }))
+        return
+    await room.handle_client(websocket, hello)
 
-    currency_manager.register_client(session_id)
+async def start_worker_cluster(workers: int, started: asyncio.Event | None = None):
+    coordinator = await Coordinator(room_manager).start(path=settings.COORDINATOR_SOCKET)
+    pool = WorkerPool(workers, settings.COORDINATOR_SOCKET, settings.HOST, settings.ports["WEBSOCKET_SERVER_PORT"], LEVEL).start()
+    supervisor = asyncio.create_task(pool.supervise())
+    if started:
+        started.set()
+    logger.info(f"Session started on port {settings.ports['WEBSOCKET_SERVER_PORT']} with {workers} workers in {settings.ENV} mode.")
     try:
-        currently_playing = client_handler.clean_currently_playing()
-        init_tokens = currency_manager.get_balance(session_id)
-        client_vote = client_handler.song_feedback.get_vote(session_id)
-        init_payload = {
-            "sessionId": session_id,
-            **currently_playing,
-            "queue_length": client_handler.get_queue_length(),
-            "cost": currency_manager.calculate_cost(client_handler.get_queue_length()),
-            "tokens": init_tokens,
-            "client_vote": client_vote
-        }
-        await websocket.send(json.dumps(init_payload))
-
-        async for raw in websocket:
-            message = json.loads(raw)
-            response = client_handler.message_handler(message, session_id)
-
-            if response.get("success"):
-                event = await playback_manager.handle_feedback(
-                    message.get("action"),
-                    len(identity_manager.all_session_ids()),
-                    broadcast_queue_length
-                )
-                if event:
-                    await identity_manager.broadcast(event)
-
-                ql = client_handler.get_queue_length()
-                await identity_manager.broadcast({"queue_length": ql, "cost": currency_manager.calculate_cost(ql)})
-
-            await websocket.send(json.dumps(response))
-
-    except Exception as e:
-        logger.error("Error in client_connector:", e)
+        await stop_serving.wait()
     finally:
-        currency_manager.remove_client(session_id)
-        identity_manager.unregister(session_id)
+        supervisor.cancel()
+        # workers drain their own clients on SIGTERM
+        await asyncio.to_thread(pool.stop)
+        await coordinator.close()
+
+async def prepare_handoff() -> dict:
+    """Freeze state for a hot-restart successor: clients reconnect to it (1012) and the journal is flushed."""
+    await asyncio.gather(*(
+        websocket.close(code=SERVICE_RESTART_CLOSE_CODE, reason="Service restart")
+        for room in room_manager for websocket in room.identity_manager.all_websockets()
+    ), return_exceptions=True)
+    if journal:
+        await journal.close()
+    return room_manager.handoff_state()
 
-async def start_websocket_server():
-    async with serve(client_connector, settings.HOST, settings.ports["WEBSOCKET_SERVER_PORT"]):
+async def start_websocket_server(takeover=None, started: asyncio.Event | None = None):
+    if CLUSTERED:
+        await start_worker_cluster(settings.WEBSOCKET_WORKERS, started)
+        return
+    sock = takeover.sock if takeover else None
+    while True:
+        if sock is not None:
+            server = await serve(client_connector, sock=sock)
+        else:
+            server = await serve(client_connector, settings.HOST, settings.ports["WEBSOCKET_SERVER_PORT"])
+        if takeover:
+            takeover.ready()
+            takeover = None
+        if started:
+            started.set()
         logger.info(f"Session started on port {settings.ports['WEBSOCKET_SERVER_PORT']} in {settings.ENV} mode.")
-        await shutdown_event.wait()
 
-async def main():
-    # Start Flask (always) and Spotify client (only if tokens.json exists)
-    flask_thread, spotify_client_thread = start_spotify_integration()
+        if not settings.HOT_RESTART:
+            await stop_serving.wait()
+            await drain(server)
+            return
+        # a successor started with HOT_RESTART=1 can take over from us
+        handoff = HandoffServer(settings.HOT_RESTART_SOCKET, server, prepare_handoff).start()
+        waiters = {asyncio.ensure_future(stop_serving.wait()), asyncio.ensure_future(handoff.done.wait())}
+        _, pending = await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        for waiter in pending:
+            waiter.cancel()
+        handoff.close()
+        await drain(server)
+        if handoff.handed_off or stop_serving.is_set():
+            return
+        # the successor never got ready: keep serving on our copy of the socket
+        logger.warning("Hot restart failed, resuming service")
+        sock = handoff.spare
+        if journal:
+            await journal.resume(snapshot_source=room_manager.snapshot)
 
-    # Conditionally start polling if Spotify client is active
-    poll_task = None
-    if spotify_client_thread:
-        poll_task = asyncio.create_task(poll_currently_playing())
+def port_free(host: str, port: int) -> bool:
+    with socket.socket() as probe:
+        probe.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            probe.bind((host, port))
+            return True
+        except OSError:
+            return False
+
+async def retry_callback_server(handler, interval: float = 1.0):
+    """Start the callback server once its port frees up; returns its stop()."""
+    while True:
+        try:
+            return await start_callback_server(handler)
+        except OSError:
+            await asyncio.sleep(interval)
 
+async def start_spotify_integration_after_handoff(handler, timeout: float = settings.HOT_RESTART_TIMEOUT):
+    """
+    The previous process frees the callback port once it has handed off and exited.
+    If the port is still taken after `timeout`, keep serving websockets and start
+    the callback server in the background rather than turning the handoff into an outage.
+    """
+    deadline = time.monotonic() + timeout
+    while not port_free(settings.HOST, settings.ports["SPOTIFY_CLIENT_PORT"]) and time.monotonic() < deadline:
+        await asyncio.sleep(0.1)
     try:
-        await start_websocket_server()
-        logger.debug("Crowdtraq websocket thread shutdown...")
+        return await start_spotify_integration(handler)
+    except OSError as e:
+        logger.warning(f"Callback port still busy after hot restart ({e}), retrying in the background")
 
-    except KeyboardInterrupt:
-        pass
+    retry = asyncio.create_task(retry_callback_server(handler))
 
-    finally:
-        if poll_task:
-            poll_task.cancel()
+    async def stop():
+        if not retry.done():
+            await cancel(retry)
+        elif not retry.cancelled():
+            await retry.result()()
 
-        shutdown_start = time.time()
-        logger.info("Starting shutdown procedure. This may take up to 15 minutes until I get around to fixing this")
+    conn = SpotifyConnectionManager.get_instance()
+    return stop, conn if conn.load_tokens() else None
 
-        # Shut down Spotify client if it was started
-        if spotify_client_thread:
-            spotify_client_thread.shutdown()
-            spotify_client_thread.join(timeout=5)
-            logger.debug("Spotify client thread has been shut down.")
+async def cancel(*tasks: asyncio.Task):
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
 
-        # Shut down Flask server
-        if flask_thread:
-            flask_thread.shutdown()
-            flask_thread.join(timeout=5)
-            logger.debug("Flask server thread has been shut down.")
+def collect_metrics(rooms: RoomManager, lifecycle: Lifecycle, journal: Journal | None) -> dict:
+    """Component stats for /metrics."""
+    return {
+        "rooms": rooms.stats(),
+        "room": {room.code: room.stats() for room in rooms},
+        "spotify": SpotifyConnectionManager.get_async_instance().scheduler.stats(),
+        "journal": journal.stats() if journal else None,
+        "lifecycle": lifecycle.stats(),
+    }
 
-        shutdown_event.set()
-        shutdown_end = time.time()
-        elapsed = shutdown_end - shutdown_start
-        minutes, seconds = divmod(int(elapsed), 60)
-        logger.info(f"Shutdown took {minutes}m {seconds}s.")
+async def start_polling(rooms: RoomManager, spotify_connection) -> asyncio.Task | None:
+    """Poll every room; the server's own account (the default room) only once it is authorized."""
+    rooms.start_polling(default_room=spotify_connection is not None)
+    if spotify_connection is None:
+        return None
+    return asyncio.create_task(TokenManager(SpotifyConnectionManager.get_async_instance()).run())
+
+async def stop_polling(rooms: RoomManager, token_task: asyncio.Task | None):
+    if token_task is not None:
+        await cancel(token_task)
+    await rooms.stop_polling()
 
+async def become_leader(coordinator):
+    """Leader-only duties in cluster mode: the journal, the callback server, polling, token refresh and room eviction."""
+    rooms = coordinator.room_manager
+    lifecycle = Lifecycle()
+    journal = None
+    # nodes on one machine share the journal, so a new leader picks up where the old one stopped
+    if settings.JOURNAL_DIR:
+        journal = await lifecycle.start("journal", lambda: rooms.run_journal(Journal(settings.JOURNAL_DIR)), lambda: journal.close())
+    handler = build_handler(metrics=lambda: collect_metrics(rooms, lifecycle, journal))
+    stop_callback_server, spotify_connection = await lifecycle.start("callback server", lambda: start_spotify_integration(handler), lambda: stop_callback_server())
+    # host-opened rooms poll their own accounts even while the server's is not authorized
+    token_task = await lifecycle.start("poller", lambda: start_polling(rooms, spotify_connection), lambda: stop_polling(rooms, token_task))
+    evictor = await lifecycle.start("evictor", lambda: asyncio.create_task(rooms.run_evictor()), lambda: cancel(evictor))
+    logger.info(f"Default room code: {rooms.default_code}")
+    return lifecycle.stop
 
+async def run_cluster_node():
+    node = ClusterNode(
+        room_manager_factory=lambda: RoomManager(default_code=generate_room_code(settings.ROOM_CODE_LENGTH), members_factory=ClusterMembers),
+        on_leader=become_leader,
+        name=f"node-{settings.ports['WEBSOCKET_SERVER_PORT']}",
+    )
+    await node.run(shutdown_event)
+    SpotifyConnectionManager.get_async_instance().shutdown()
+
+async def open_rooms(handoff_state: dict | None):
+    """Replay balances, queues and votes from before the restart."""
+    global journal
+    if settings.JOURNAL_DIR:
+        journal = await room_manager.run_journal(Journal(settings.JOURNAL_DIR), handoff_state)
+    elif handoff_state:
+        room_manager.restore(handoff_state, [])
+
+async def close_rooms():
+    room_manager.close_all()
+    if journal:
+        await journal.close()
+
+async def serve_websockets(takeover=None) -> asyncio.Task:
+    """Start the websocket server task and return once it is listening."""
+    started = asyncio.Event()
+    server_task = asyncio.create_task(start_websocket_server(takeover, started))
+    listening = asyncio.ensure_future(started.wait())
+    await asyncio.wait({server_task, listening}, return_when=asyncio.FIRST_COMPLETED)
+    listening.cancel()
+    if server_task.done():
+        server_task.result()  # raises if the server could not start
+    return server_task
+
+async def stop_websockets(server_task: asyncio.Task):
+    stop_serving.set()
+    await server_task
+
+async def main():
+    # wake the loop on signals; a plain signal handler only runs once something else wakes it
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, handle_exit, signum, None)
+
+    if settings.CLUSTER_ENABLED:
+        await run_cluster_node()
+        return
+
+    # Take over from a running server (socket and live state), if asked to
+    takeover = await asyncio.to_thread(take_over, settings.HOT_RESTART_SOCKET) if settings.HOT_RESTART else None
+    if settings.HOT_RESTART and takeover is None:
+        logger.info("No running server to take over from, starting cold")
+
+    # Started in dependency order and stopped in reverse: polling stops before the Spotify client
+    # it calls, websocket clients are drained before the callback server and the rooms go away
+    lifecycle = Lifecycle()
+    server_task = None
+    handler = build_handler(
+        health=lambda: {"websocket": server_task is not None and not server_task.done() and not shutdown_event.is_set()},
+        metrics=lambda: collect_metrics(room_manager, lifecycle, journal),
+    )
+    try:
+        await lifecycle.start("rooms", lambda: open_rooms(takeover.state if takeover else None), close_rooms)
+        if takeover:
+            # serve the inherited socket first; clients are already reconnecting
+            server_task = await lifecycle.start("websocket server", lambda: serve_websockets(takeover), lambda: stop_websockets(server_task))
+            stop_callback_server, spotify_connection = await lifecycle.start("callback server", lambda: start_spotify_integration_after_handoff(handler), lambda: stop_callback_server())
+        else:
+            # Start the callback server (always) and load the Spotify client's tokens (only if tokens.json exists)
+            stop_callback_server, spotify_connection = await lifecycle.start("callback server", lambda: start_spotify_integration(handler), lambda: stop_callback_server())
+            server_task = await lifecycle.start("websocket server", serve_websockets, lambda: stop_websockets(server_task))
+
+        # Shutting the client down cancels Spotify calls still in flight
+        spotify_client = await lifecycle.start("spotify client", SpotifyConnectionManager.get_async_instance, lambda: spotify_client.shutdown())
+        # Poll every room; the server's account is polled and kept fresh only once it is authorized
+        token_task = await lifecycle.start("poller", lambda: start_polling(room_manager, spotify_connection), lambda: stop_polling(room_manager, token_task))
+        evictor = await lifecycle.start("evictor", lambda: asyncio.create_task(room_manager.run_evictor()), lambda: cancel(evictor))
+        logger.info(f"Default room code: {room_manager.default_code}")
+
+        # until shutdown, or until a hot-restart successor has taken over
+        shutdown = asyncio.ensure_future(shutdown_event.wait())
+        await asyncio.wait({server_task, shutdown}, return_when=asyncio.FIRST_COMPLETED)
+        shutdown.cancel()
+    finally:
+        shutdown_event.set()
+        logger.info("Shutting down...")
+        await lifecycle.stop(settings.SHUTDOWN_TIMEOUT)
 
 def handle_exit(signum, frame):
     logger.info("Caught termination signal. Shutting down...")
     shutdown_event.set()
 
 if __name__ == "__main__":
-    signal.signal(signal.SIGINT, handle_exit)
-    signal.signal(signal.SIGTERM, handle_exit)
     asyncio.run(main())
\ No newline at end of file
@@ -1,4 +1,2 @@
-# If you have route registration functions, you can expose them here
-from .routes import register_routes
-
-__all__ = ["register_routes"]
\ No newline at end of file
+# Route modules are imported directly (app.routes.http_routes, app.routes.routes);
+# nothing is imported here so the event-loop server does not load Flask.
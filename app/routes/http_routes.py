@@ -0,0 +1,48 @@
+from app.core.http_server import HttpResponse
+from app.services.room_manager import RoomManager
+from app.services.spotify_manager import SpotifyConnectionManager
+
+async def callback(request):
+    authorization_code = request.query.get("code")
+    if not authorization_code:
+        return HttpResponse(400, "Error: Missing authorization code")
+
+    # `state` carries the room code when a host authorizes a venue's own account
+    if "state" in request.query:
+        room_code = RoomManager.normalize(request.query["state"])
+        if room_code is None:
+            return HttpResponse(400, "Error: Invalid room code")
+        await authorize_room(room_code, authorization_code)
+    else:
+        spotify_connection = SpotifyConnectionManager.get_async_instance()
+        await spotify_connection.exchange_code_for_token(authorization_code)
+    #TODO: make this message prettier and maybe redirect to a different page
+    return HttpResponse(200, "Authorization successful! You may now close this window and start the main server")
+
+async def authorize_room(room_code: str, authorization_code: str):
+    """Save tokens for room `room_code`'s account; an open room picks them up right away."""
+    opened_here = not SpotifyConnectionManager.has_room_instance(room_code)
+    try:
+        await SpotifyConnectionManager.get_room_instance(room_code).exchange_code_for_token(authorization_code)
+    finally:
+        if opened_here:
+            SpotifyConnectionManager.release_room_instance(room_code)
+
+def build_handler(health=None, metrics=None):
+    """
+    Request handler for the callback port, served on the event loop by HttpServer.
+    `health()` returns named checks (bools); /healthz answers 503 unless all pass.
+    `metrics()` returns component stats for /metrics.
+    """
+    async def handle(request):
+        if request.method != "GET":
+            return HttpResponse(405, "Method Not Allowed")
+        if request.path == "/callback":
+            return await callback(request)
+        if request.path == "/healthz":
+            checks = health() if health else {}
+            return HttpResponse(200 if all(checks.values()) else 503, {"ok": all(checks.values()), **checks})
+        if request.path == "/metrics":
+            return HttpResponse(200, metrics() if metrics else {})
+        return HttpResponse(404, "Not Found")
+    return handle
@@ -1,4 +1,7 @@
 from flask import request, Blueprint, after_this_request
+from app.config import settings
+from app.core.spotify_client import SpotifyConnection
+from app.services.room_manager import ROOM_CODE_PATTERN
 from app.services.spotify_manager import SpotifyConnectionManager
 
 spotify_bp = Blueprint('spotify', __name__)
@@ -16,7 +19,15 @@ def callback():
     if not authorization_code:
         return "Error: Missing authorization code", 400
 
-    spotify_connection = SpotifyConnectionManager.get_instance()
+    room_code = request.args.get("state")
+    if room_code is not None:
+        # a host authorizing a venue's own account; the room loads the tokens when it opens
+        room_code = room_code.strip().upper()
+        if not ROOM_CODE_PATTERN.match(room_code):
+            return "Error: Invalid room code", 400
+        spotify_connection = SpotifyConnection(tokens_file=settings.room_tokens_file(room_code))
+    else:
+        spotify_connection = SpotifyConnectionManager.get_instance()
     spotify_connection.exchange_code_for_token(authorization_code)
     #TODO: make this message prettier and maybe redirect to a different page
     return "Authorization successful! You may now close this window and start the main server"
\ No newline at end of file
@@ -0,0 +1,97 @@
+import asyncio, logging
+from collections import deque
+from app.config import settings
+
+logger = logging.getLogger("app.core.client_outbox")
+
+# Close code for clients evicted for not keeping up (1013: try again later)
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+class ClientOutbox:
+    """
+    Bounded outbound queue for one websocket, drained by its own writer task.
+    Messages put with a `kind` are state snapshots: a newer one replaces any
+    queued message of the same kind. If the queue is still full the client
+    cannot keep up and is evicted (closed with 1013) instead of buffering more.
+    `on_evict` and `on_fail` are called once when the client is evicted or a send fails.
+    """
+    def __init__(self, websocket, max_size: int = settings.OUTBOX_MAX_MESSAGES, on_evict=None, on_fail=None):
+        self.websocket = websocket
+        self.max_size = max_size
+        self._on_evict = on_evict
+        self._on_fail = on_fail
+        self._queue: deque[tuple[str | None, str]] = deque()
+        self._wakeup = asyncio.Event()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._task: asyncio.Task | None = None
+        self.closed = False
+        self.evicted = False
+        self.sent = 0
+        self.superseded = 0
+        self.failed = 0
+
+    def __len__(self):
+        return len(self._queue)
+
+    def put(self, data: str, kind: str | None = None) -> bool:
+        """Queue an encoded message without waiting; False if the client is gone or was evicted."""
+        if self.closed:
+            return False
+        if kind is not None:
+            for i, (queued_kind, _) in enumerate(self._queue):
+                if queued_kind == kind:
+                    del self._queue[i]
+                    self.superseded += 1
+                    break
+        if len(self._queue) >= self.max_size:
+            self.evict()
+            return False
+        self._queue.append((kind, data))
+        self._idle.clear()
+        self._wakeup.set()
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._writer())
+        return True
+
+    async def _writer(self):
+        while not self.closed:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._queue and not self.closed:
+                _, data = self._queue.popleft()
+                try:
+                    await self.websocket.send(data)
+                    self.sent += 1
+                except Exception as e:
+                    self.failed += 1
+                    logger.debug(f"Send failed, closing outbox: {e}")
+                    self.close()
+                    if self._on_fail is not None:
+                        self._on_fail()
+            self._idle.set()
+
+    async def drain(self):
+        """Wait until everything queued so far has been handed to the websocket."""
+        await self._idle.wait()
+
+    def evict(self):
+        """Drop a client that is too far behind."""
+        if self.closed:
+            return
+        self.evicted = True
+        logger.warning(f"Evicting slow client with {len(self._queue)} queued messages")
+        self.close()
+        close = getattr(self.websocket, "close", None)
+        if close is not None:
+            asyncio.ensure_future(close(code=SLOW_CONSUMER_CLOSE_CODE, reason="Client too slow"))
+        if self._on_evict is not None:
+            self._on_evict()
+
+    def close(self):
+        """Stop the writer and discard anything still queued."""
+        self.closed = True
+        self._queue.clear()
+        self._idle.set()
+        if self._task is not None and self._task is not asyncio.current_task():
+            self._task.cancel()
@@ -0,0 +1,192 @@
+import asyncio, itertools, os, uuid, logging
+from app.config import settings
+from app.core.relay import RelayLink, MAX_LINE_BYTES
+from app.services.room_manager import RoomManager
+
+logger = logging.getLogger("app.core.coordinator")
+
+class RemoteSocket:
+    """A client connection held by a worker: its relay link and the worker's connection id."""
+    __slots__ = ("link", "conn")
+
+    def __init__(self, link: RelayLink, conn):
+        self.link = link
+        self.conn = conn
+
+class ClusterMembers:
+    """
+    IdentityManager stand-in for a room whose members are connected to worker
+    processes. A session's "websocket" is a RemoteSocket; sends and broadcasts
+    are forwarded to the workers, which own the real sockets.
+    """
+    def __init__(self, room_code: str):
+        self.room_code = room_code
+        self._clients: dict[str, RemoteSocket] = {}
+        self.broadcasts = 0
+
+    def register(self, websocket: RemoteSocket, session_id: str | None = None) -> str:
+        sid = session_id or str(uuid.uuid4())
+        self._clients[sid] = websocket
+        return sid
+
+    def unregister(self, session_id: str, websocket=None):
+        if websocket is None or self._clients.get(session_id) is websocket:
+            self._clients.pop(session_id, None)
+
+    def prune_link(self, link: RelayLink):
+        """Drop every session served by a worker that went away."""
+        for session_id in [sid for sid, remote in self._clients.items() if remote.link is link]:
+            del self._clients[session_id]
+
+    def get_websocket(self, session_id: str):
+        return self._clients.get(session_id)
+
+    def all_session_ids(self):
+        return list(self._clients.keys())
+
+    async def send_to(self, session_id: str, payload: dict):
+        remote = self._clients.get(session_id)
+        if remote is not None:
+            remote.link.send({"type": "send", "room": self.room_code, "session": session_id, "payload": payload})
+
+    async def broadcast(self, payload: dict, kind: str | None = None):
+        # one relay message per worker; each worker fans out to its own sockets
+        self.broadcasts += 1
+        message = {"type": "broadcast", "room": self.room_code, "payload": payload, "kind": kind}
+        for link in {remote.link for remote in self._clients.values()}:
+            link.send(message)
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "workers": len({remote.link for remote in self._clients.values()}),
+            "broadcasts": self.broadcasts,
+        }
+
+class Coordinator:
+    """
+    Owns every room (queue, balances, votes, now playing) and all Spotify
+    calls for a set of websocket worker processes. Workers forward hello,
+    message and leave events; the coordinator answers through `send` and
+    `broadcast` messages. Each session's messages are applied in order.
+    """
+    def __init__(self, room_manager: RoomManager | None = None):
+        self.room_manager = room_manager or RoomManager(default_code="MAIN", members_factory=ClusterMembers)
+        self._links: set[RelayLink] = set()
+        self._servers: list[asyncio.Server] = []
+        self._session_tails: dict[str, asyncio.Task] = {}
+        self._remotes: dict[tuple[str, object], RemoteSocket] = {}
+        self._link_ids = itertools.count(1)
+        self.messages = 0
+
+    async def start(self, path: str | None = None, host: str | None = None, port: int | None = None):
+        """Listen for workers on a Unix socket path and/or a TCP host/port."""
+        if path:
+            if os.path.exists(path):
+                os.unlink(path)
+            self._servers.append(await asyncio.start_unix_server(self._on_worker, path, limit=MAX_LINE_BYTES))
+        if port is not None:
+            self._servers.append(await asyncio.start_server(self._on_worker, host, port, limit=MAX_LINE_BYTES))
+        return self
+
+    @property
+    def sockets(self):
+        return [sock for server in self._servers for sock in server.sockets]
+
+    async def close(self):
+        for server in self._servers:
+            server.close()
+        for link in list(self._links):
+            link.close()
+        for server in self._servers:
+            await server.wait_closed()
+        self._servers.clear()
+        self.room_manager.close_all()
+
+    async def _on_worker(self, reader, writer):
+        link = RelayLink(reader, writer, name=f"worker-{next(self._link_ids)}")
+        self._links.add(link)
+        logger.info(f"{link.name} connected")
+        try:
+            async for message in link.messages():
+                self.messages += 1
+                self._dispatch(link, message)
+        finally:
+            self._links.discard(link)
+            for key in [key for key, remote in self._remotes.items() if remote.link is link]:
+                del self._remotes[key]
+            for room in self.room_manager:
+                if isinstance(room.identity_manager, ClusterMembers):
+                    room.identity_manager.prune_link(link)
+            link.close()
+            logger.info(f"{link.name} disconnected")
+
+    def _dispatch(self, link: RelayLink, message: dict):
+        match message.get("type"):
+            case "hello":
+                self._hello(link, message)
+            case "message":
+                self._in_order(message.get("session"), self._message(link, message))
+            case "leave":
+                self._in_order(message.get("session"), self._leave(link, message))
+            case other:
+                logger.warning(f"Unknown relay message type {other!r} from {link.name}")
+
+    def _in_order(self, key, coro):
+        """Run `coro` after the previous one for the same session, without blocking other sessions."""
+        previous = self._session_tails.get(key)
+
+        async def run():
+            if previous is not None:
+                await asyncio.gather(previous, return_exceptions=True)
+            try:
+                await coro
+            except Exception:
+                logger.exception(f"Error handling relay message for {key}")
+
+        task = asyncio.ensure_future(run())
+        self._session_tails[key] = task
+        task.add_done_callback(lambda t: self._session_tails.pop(key, None) if self._session_tails.get(key) is t else None)
+
+    def _hello(self, link: RelayLink, message: dict):
+        hello, conn = message.get("hello") or {}, message.get("conn")
+        room = self.room_manager.admit(hello)
+        if room is None:
+            link.send({"type": "reject", "conn": conn, "payload": {
+                "success": False,
+                "error": {"code": settings.INVALID_ROOM_CODE, "message": "Unknown or invalid room code.", "details": {}}
+            }})
+            return
+        # registered before anything else runs, so the session's later messages queue behind its join
+        remote = self._remotes[(link.name, conn)] = RemoteSocket(link, conn)
+        session_id = room.identity_manager.register(remote, hello.get("sessionId"))
+        link.send({"type": "joined", "conn": conn, "room": room.code, "session": session_id})
+        self._in_order(session_id, self._join(room, session_id, hello))
+
+    async def _join(self, room, session_id: str, hello: dict):
+        try:
+            await room.identity_manager.send_to(session_id, await room.join(session_id, hello))
+        except Exception as e:
+            # same outcome as a failed local join: the connection is closed and the member leaves
+            logger.error(f"Error joining room {room.code}: {e}")
+            remote = room.identity_manager.get_websocket(session_id)
+            if remote is not None:
+                remote.link.send({"type": "drop", "room": room.code, "session": session_id})
+
+    async def _message(self, link: RelayLink, message: dict):
+        room = self.room_manager.get(message.get("room"))
+        session_id = message.get("session")
+        remote = self._remotes.get((link.name, message.get("conn")))
+        if room is None or remote is None or room.identity_manager.get_websocket(session_id) is not remote:
+            return
+        response = await room.handle_message(session_id, message.get("message"))
+        await room.identity_manager.send_to(session_id, response)
+
+    async def _leave(self, link: RelayLink, message: dict):
+        room = self.room_manager.get(message.get("room"))
+        remote = self._remotes.pop((link.name, message.get("conn")), None)
+        if room is not None and remote is not None:
+            room.leave(message.get("session"), remote)
+
+    def stats(self) -> dict:
+        return {"workers": len(self._links), "messages": self.messages, **self.room_manager.stats()}
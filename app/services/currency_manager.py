@@ -6,11 +6,25 @@ class CurrencyManager:
     def __init__(self):
         # Track balances per client (could be websocket ID, user ID, etc.)
         self._balances = {}
+        # Optional callable(op, **fields) that records balance changes (see Room.attach_journal)
+        self.journal = None
+
+    def _changed(self, client_id):
+        if self.journal is not None:
+            self.journal("balance", session=client_id, tokens=self._balances[client_id])
+
+    def set_balance(self, client_id, tokens: int):
+        """Restore a balance (journal replay); not recorded."""
+        self._balances[client_id] = tokens
+
+    def snapshot(self) -> dict:
+        return dict(self._balances)
 
     def register_client(self, client_id):
         exists = client_id in self._balances
         if not exists:
             self._balances[client_id] = settings.STARTING_TOKENS
+            self._changed(client_id)
             logger.debug(f"[Currency] init balance: {client_id} -> {self._balances[client_id]}")
 
     def remove_client(self, client_id):
@@ -39,6 +53,7 @@ class CurrencyManager:
 
         if balance >= cost:
             self._balances[client_id] = balance - cost
+            self._changed(client_id)
             logger.debug(f"Client {client_id} spent {cost} tokens, new balance: {self._balances[client_id]}")
             return True, self._balances[client_id]
         return False, balance
@@ -51,10 +66,12 @@ class CurrencyManager:
             tokens = settings.POPULAR_TRACK_REWARD
         logger.debug(f"Rewarding client {owner_id} with {tokens} tokens for popular track")
         self._balances[owner_id] += tokens
+        self._changed(owner_id)
         return self._balances[owner_id]
     
     def add_tokens(self, client_id, tokens: int):
         """Add tokens to a client's balance."""
         if client_id in self._balances:
             self._balances[client_id] += tokens
+            self._changed(client_id)
             logger.debug(f"Client {client_id} received {tokens} tokens, new balance: {self._balances[client_id]}")
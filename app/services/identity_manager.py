@@ -1,10 +1,24 @@
-import uuid, json, logging
+import uuid, json, time, logging
+from app.config import settings
+from app.services.client_outbox import ClientOutbox
 
 logger = logging.getLogger("app.core.identity_manager")
 class IdentityManager:
-    def __init__(self):
-        # Map session_id -> websocket
+    def __init__(self, outbox_size: int = settings.OUTBOX_MAX_MESSAGES, clock=time.perf_counter):
+        # Map session_id -> websocket, and back, so pruning a dead socket is O(1)
         self._clients: dict[str, object] = {}
+        self._sessions: dict[object, str] = {}
+        # Map session_id -> outbound queue feeding that websocket
+        self._outboxes: dict[str, ClientOutbox] = {}
+        self.outbox_size = outbox_size
+        self._clock = clock
+        self.broadcasts = 0
+        self.last_recipients = 0
+        self.last_fanout = 0.0
+        self.max_fanout = 0.0
+        self.evictions = 0
+        self.superseded = 0
+        self.failed_sends = 0
 
     def create_session_id(self) -> str:
         """Always generate a new unique session ID."""
@@ -19,13 +33,53 @@ class IdentityManager:
         """
         sid = session_id or self.create_session_id()
         logger.debug(f"Registering client with session ID: {sid}")
+        # a reconnect replaces the session's old socket; a socket has only one session
+        self.unregister(sid)
+        self.prune(websocket)
         self._clients[sid] = websocket
+        self._sessions[websocket] = sid
+        self._outboxes[sid] = ClientOutbox(
+            websocket,
+            self.outbox_size,
+            on_evict=lambda: self._evicted(sid, websocket),
+            on_fail=lambda: self.prune(websocket),
+        )
         return sid
 
-    def unregister(self, session_id: str):
-        """Remove a client by session_id."""
+    def unregister(self, session_id: str, websocket=None):
+        """
+        Remove a client by session_id. If `websocket` is given, only remove the
+        session while it still belongs to that socket, so a stale connection
+        closing cannot drop the session's newer one.
+        """
+        current = self._clients.get(session_id)
+        if current is None or (websocket is not None and current is not websocket):
+            return
         logger.debug(f"Unregistering client with session ID: {session_id}")
-        self._clients.pop(session_id, None)
+        del self._clients[session_id]
+        self._sessions.pop(current, None)
+        self._retire(self._outboxes.pop(session_id, None))
+
+    def prune(self, websocket):
+        """Remove whichever session a (dead) websocket belongs to."""
+        session_id = self._sessions.get(websocket)
+        if session_id is not None:
+            self.unregister(session_id, websocket)
+
+    def session_for(self, websocket) -> str | None:
+        """Return the session_id registered for a websocket, or None."""
+        return self._sessions.get(websocket)
+
+    def _retire(self, outbox: ClientOutbox | None):
+        if outbox is None:
+            return
+        outbox.close()
+        self.superseded += outbox.superseded
+        self.failed_sends += outbox.failed
+
+    def _evicted(self, session_id: str, websocket):
+        self.evictions += 1
+        self.unregister(session_id, websocket)
 
     def get_websocket(self, session_id: str):
         """Return the websocket for a given session_id, or None."""
@@ -40,17 +94,46 @@ class IdentityManager:
         return sids
 
     async def send_to(self, session_id: str, payload: dict):
-        """Send a JSON payload to a specific client if connected."""
-        ws = self.get_websocket(session_id)
-        if ws:
-            await ws.send(json.dumps(payload))
+        """Queue a JSON payload for a specific client if connected."""
+        outbox = self._outboxes.get(session_id)
+        if outbox is not None:
+            outbox.put(json.dumps(payload))
 
-    async def broadcast(self, payload: dict):
-        """Broadcast a JSON payload to all connected clients."""
+    async def broadcast(self, payload: dict, kind: str | None = None):
+        """
+        Broadcast a JSON payload to all connected clients.
+        The payload is encoded once and queued on every client's outbox without
+        waiting on any socket. Pass `kind` for state snapshots that a newer
+        broadcast of the same kind may replace while still queued.
+        """
+        started = self._clock()
         data = json.dumps(payload)
-        for ws in self.all_websockets():
-            try:
-                await ws.send(data)
-            except Exception:
-                logger.error(f"Failed to send to a client:", ws)                
-                pass
\ No newline at end of file
+        delivered = 0
+        for outbox in list(self._outboxes.values()):
+            delivered += outbox.put(data, kind)
+
+        self.broadcasts += 1
+        self.last_recipients = delivered
+        self.last_fanout = self._clock() - started
+        self.max_fanout = max(self.max_fanout, self.last_fanout)
+        logger.debug(f"Broadcast to {delivered} clients in {self.last_fanout * 1000:.2f}ms")
+
+    async def drain(self):
+        """Wait until every outbox has handed its queued messages to the websocket."""
+        for outbox in list(self._outboxes.values()):
+            await outbox.drain()
+
+    def stats(self) -> dict:
+        depths = [len(outbox) for outbox in self._outboxes.values()]
+        return {
+            "clients": len(self._clients),
+            "broadcasts": self.broadcasts,
+            "last_recipients": self.last_recipients,
+            "last_fanout": self.last_fanout,
+            "max_fanout": self.max_fanout,
+            "queued": sum(depths),
+            "max_queue_depth": max(depths, default=0),
+            "superseded": self.superseded + sum(outbox.superseded for outbox in self._outboxes.values()),
+            "failed_sends": self.failed_sends + sum(outbox.failed for outbox in self._outboxes.values()),
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,189 @@
+import asyncio, json, os, time, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.journal")
+
+class Journal:
+    """
+    Write-ahead log of room state changes (balances, queue, votes) with
+    compacted snapshots. `append` only buffers, so it never blocks the event
+    loop; a writer task writes and fsyncs whatever accumulated during the last
+    `commit_interval` in one go (group commit). A crash loses at most that
+    window. After `snapshot_every` records the writer stores a snapshot of the
+    full state and truncates the log, so replay stays short.
+    """
+    LOG_NAME = "journal.log"
+    SNAPSHOT_NAME = "snapshot.json"
+
+    def __init__(
+        self,
+        directory: str,
+        commit_interval: float = settings.JOURNAL_COMMIT_INTERVAL,
+        snapshot_every: int = settings.JOURNAL_SNAPSHOT_EVERY,
+        clock=time.perf_counter,
+    ):
+        self.directory = directory
+        self.log_path = os.path.join(directory, self.LOG_NAME)
+        self.snapshot_path = os.path.join(directory, self.SNAPSHOT_NAME)
+        self.commit_interval = commit_interval
+        self.snapshot_every = snapshot_every
+        self._clock = clock
+        self._snapshot_source = None
+        self._buffer: list[bytes] = []
+        self._waiters: list[tuple[int, asyncio.Future]] = []
+        self._wake: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self._file = None
+        self.seq = 0
+        self._durable_seq = 0
+        self._since_snapshot = 0
+        self.records = 0
+        self.commits = 0
+        self.snapshots = 0
+        self.max_batch = 0
+        self.last_commit_ms = 0.0
+
+    def load(self) -> tuple[dict | None, list[dict]]:
+        """Read the last snapshot's state and the records logged after it (call before start)."""
+        os.makedirs(self.directory, exist_ok=True)
+        snapshot, snapshot_seq = None, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                stored = json.load(f)
+            snapshot, snapshot_seq = stored["state"], stored["seq"]
+
+        records, last_seq = [], snapshot_seq
+        if os.path.exists(self.log_path):
+            with open(self.log_path, "rb") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        # a write torn by a crash can only be the last line
+                        logger.warning("Ignoring a partial record at the end of the journal")
+                        break
+                    # a batch retried after a failed fsync may already be in the log
+                    if record["seq"] > last_seq:
+                        records.append(record)
+                        last_seq = record["seq"]
+        self.seq = self._durable_seq = last_seq
+        self._since_snapshot = len(records)
+        return snapshot, records
+
+    def start(self, snapshot_source=None):
+        """Begin logging; `snapshot_source()` returns the full state to compact into."""
+        os.makedirs(self.directory, exist_ok=True)
+        self._snapshot_source = snapshot_source
+        self._file = open(self.log_path, "ab")
+        self._wake = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+        return self
+
+    async def resume(self, snapshot_source=None):
+        """
+        Log again after a hot restart that failed (see close). The successor may
+        have written the journal meanwhile, so continue after its last seq and
+        compact our live state over whatever it wrote.
+        """
+        await asyncio.to_thread(self.load)
+        self.request_snapshot()
+        return self.start(snapshot_source)
+
+    def request_snapshot(self):
+        """Compact on the next commit, e.g. after restoring state from elsewhere."""
+        self._since_snapshot = self.snapshot_every
+
+    def append(self, room: str | None, op: str, **fields):
+        self.seq += 1
+        self._buffer.append(json.dumps({"seq": self.seq, "room": room, "op": op, **fields}, separators=(",", ":")).encode() + b"\n")
+        self.records += 1
+        self._since_snapshot += 1
+        if self._wake is not None:
+            self._wake.set()
+
+    async def commit(self):
+        """Wait until everything appended so far is on disk."""
+        if self._task is None or self._durable_seq >= self.seq:
+            return
+        done = asyncio.get_running_loop().create_future()
+        self._waiters.append((self.seq, done))
+        self._wake.set()
+        await done
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            # let the batch fill so one fsync covers every change in the window
+            await asyncio.sleep(self.commit_interval)
+            self._wake.clear()
+            batch, self._buffer = self._buffer, []
+            seq = self.seq
+            snapshot = None
+            if self._snapshot_source is not None and self._since_snapshot >= self.snapshot_every:
+                # captured together with the batch, so it covers exactly the records up to `seq`
+                snapshot = {"seq": seq, "state": self._snapshot_source()}
+                self._since_snapshot = 0
+            started = self._clock()
+            try:
+                await asyncio.to_thread(self._write, batch, snapshot)
+            except Exception as e:
+                logger.exception(f"Journal write failed, retrying: {e}")
+                self._buffer[:0] = batch
+                self._wake.set()
+                await asyncio.sleep(1)
+                continue
+            self.last_commit_ms = (self._clock() - started) * 1000
+            self.commits += 1
+            self.max_batch = max(self.max_batch, len(batch))
+            self._durable_seq = seq
+            pending = []
+            for target, done in self._waiters:
+                if target <= seq:
+                    if not done.done():
+                        done.set_result(None)
+                else:
+                    pending.append((target, done))
+            self._waiters = pending
+
+    def _write(self, batch: list[bytes], snapshot: dict | None):
+        if batch:
+            offset = self._file.tell()
+            try:
+                self._file.write(b"".join(batch))
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except OSError:
+                # drop a partial write so the retry does not follow a torn line
+                self._file.truncate(offset)
+                raise
+        if snapshot is not None:
+            tmp = self.snapshot_path + ".tmp"
+            with open(tmp, "wb") as f:
+                f.write(json.dumps(snapshot, separators=(",", ":")).encode())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_path)
+            # everything in the log is now covered by the snapshot
+            self._file.truncate(0)
+            os.fsync(self._file.fileno())
+            self.snapshots += 1
+
+    async def close(self):
+        if self._task is None:
+            return
+        await self.commit()
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await asyncio.to_thread(self._file.close)
+
+    def stats(self) -> dict:
+        return {
+            "seq": self.seq,
+            "records": self.records,
+            "pending": len(self._buffer),
+            "commits": self.commits,
+            "snapshots": self.snapshots,
+            "max_batch": self.max_batch,
+            "last_commit_ms": round(self.last_commit_ms, 3),
+        }
@@ -0,0 +1,104 @@
+import asyncio, time, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.now_playing")
+
+def format_currently_playing(info: dict | None) -> dict | None:
+    """Extract the client-facing fields from Spotify's currently-playing response."""
+    if not info:
+        return None
+    item = info.get("item") or {}
+    return {
+        "track_name": item.get("name"),
+        "artists": [artist.get("name") for artist in item.get("artists", [])],
+        "album": item.get("album", {}).get("name"),
+        "album_art": item.get("album", {}).get("images", [{}])[0].get("url"),
+        "duration_ms": item.get("duration_ms"),
+        "progress_ms": info.get("progress_ms"),
+        "is_playing": info.get("is_playing"),
+        "track_id": item.get("id"),
+        "uri": item.get("uri"),
+    }
+
+class NowPlayingSnapshot:
+    """
+    Server-wide copy of Spotify's currently-playing state.
+    The poller refreshes it; between polls progress is extrapolated locally,
+    and concurrent misses share a single upstream fetch.
+    """
+    def __init__(self, fetch, max_age: float = settings.NOW_PLAYING_MAX_AGE, clock=time.monotonic):
+        self._fetch = fetch
+        self.max_age = max_age
+        self._clock = clock
+        self._info = None
+        self._fetched_at = None
+        self._inflight = None
+        self.fetches = 0
+        self.coalesced = 0
+
+    def update(self, info: dict | None):
+        """Store a fresh currently-playing response."""
+        self._info = info
+        self._fetched_at = self._clock()
+
+    def current(self) -> dict | None:
+        """Last known state with progress_ms advanced by the time since it was fetched."""
+        if not self._info:
+            return None
+        info = dict(self._info)
+        if info.get("is_playing") and info.get("progress_ms") is not None:
+            elapsed_ms = int((self._clock() - self._fetched_at) * 1000)
+            progress = info["progress_ms"] + elapsed_ms
+            duration = (info.get("item") or {}).get("duration_ms")
+            info["progress_ms"] = min(progress, duration) if duration else progress
+        return info
+
+    def is_stale(self) -> bool:
+        if self._fetched_at is None:
+            return True
+        age = self._clock() - self._fetched_at
+        if age >= self.max_age:
+            return True
+        if not self._info or not self._info.get("is_playing"):
+            return False
+        duration = (self._info.get("item") or {}).get("duration_ms")
+        # Past the predicted end of the track, the next song is unknown until refreshed
+        return bool(duration) and self._info.get("progress_ms", 0) + age * 1000 >= duration
+
+    async def get(self) -> dict | None:
+        """Snapshot read; only falls back to Spotify when the snapshot is stale."""
+        if not self.is_stale():
+            return self.current()
+        await self.refresh()
+        return self.current()
+
+    async def refresh(self, min_age: float = 0) -> dict | None:
+        """
+        Fetch from Spotify now, joining any fetch already in flight.
+        With `min_age`, a snapshot fetched less than that many seconds ago is reused.
+        """
+        if self._inflight is None and min_age and self._fetched_at is not None \
+                and self._clock() - self._fetched_at < min_age:
+            self.coalesced += 1
+            return self._info
+        if self._inflight is None:
+            self._inflight = asyncio.ensure_future(self._fetch_and_store())
+            self._inflight.add_done_callback(self._clear_inflight)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(self._inflight)
+
+    async def _fetch_and_store(self):
+        info = await self._fetch()
+        self.fetches += 1
+        self.update(info)
+        return info
+
+    def _clear_inflight(self, task: asyncio.Future):
+        if self._inflight is task:
+            self._inflight = None
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Currently playing refresh failed: {task.exception()}")
+
+    def stats(self) -> dict:
+        return {"fetches": self.fetches, "coalesced": self.coalesced}
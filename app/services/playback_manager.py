@@ -1,16 +1,24 @@
 from app.config import settings
+from app.services.now_playing import NowPlayingSnapshot, format_currently_playing
+from app.services.poll_scheduler import PollScheduler
 import logging
 
 logger = logging.getLogger("app.core.playback_manager")
 
 class PlaybackManager:
-    def __init__(self, spotify_connection, song_queue, song_feedback, currency_manager):
+    def __init__(self, spotify_connection, song_queue, song_feedback, currency_manager, now_playing=None, refresh_min_age: float = 0):
         self.spotify = spotify_connection
         self.queue = song_queue
         self.feedback = song_feedback
         self.currency = currency_manager
         self.current_owner = None
+        self.owner_track_id = None
         self.last_track_id = None
+        # Shared with ClientHandler so client reads are served from the poller's last fetch
+        self.now_playing = now_playing or NowPlayingSnapshot(lambda: self.spotify.get_currently_playing())
+        # Reuse a snapshot younger than this instead of polling again (when several managers share it)
+        self.refresh_min_age = refresh_min_age
+        self.poll_scheduler = PollScheduler()
 
     def _get_current_track_id(self, info: dict) -> str | None:
         if not info or not info.get("is_playing"):
@@ -29,31 +37,34 @@ class PlaybackManager:
             removed = self.queue.remove_first(track_id)
             if removed:
                 self.current_owner = removed["owner"]
+                self.owner_track_id = track_id
                 await broadcast_queue_length()
         elif force:
             # Explicit reset even if not in queue
             self.current_owner = None
+            self.owner_track_id = None
         # else: leave current_owner unchanged
 
 
     def _calculate_sleep_time(self, info: dict) -> float:
-        duration = info["item"]["duration_ms"]
-        progress = info.get("progress_ms", 0)
-        return max((duration - progress) / 1000.0 - 1, 0.5)
+        return self.poll_scheduler.playing_delay(info["item"]["duration_ms"], info.get("progress_ms", 0))
 
 
     async def poll_currently_playing(self, broadcast_queue_length):
-        info = self.spotify.get_currently_playing()
+        info = await self.now_playing.refresh(self.refresh_min_age)
         track_id = self._get_current_track_id(info)
 
         if not track_id:
-            logger.debug("Nothing playing, polling again in 5 seconds")
-            return 5
+            sleep_time = self.poll_scheduler.idle_delay()
+            logger.debug(f"Nothing playing, polling again in {sleep_time:.1f} seconds")
+            return sleep_time
 
-        # Case 1: brand new track ID
+        # Case 1: brand new track ID; if it is not the queue head (played from outside
+        # the app) the previous owner must not keep collecting likes for it
         if track_id != self.last_track_id:
             logger.info(f"New track detected: {track_id}, updating queue and owner")
-            await self._handle_queue_and_owner(track_id, broadcast_queue_length)
+            self.poll_scheduler.record_track_change()
+            await self._handle_queue_and_owner(track_id, broadcast_queue_length, force=True)
             self.feedback.set_current_track(track_id)
             self.last_track_id = track_id
 
@@ -67,8 +78,37 @@ class PlaybackManager:
 
         return self._calculate_sleep_time(info)
 
+    async def reconcile_queue(self, broadcast_queue_length) -> int:
+        """
+        Check the local queue against Spotify's player queue (one call) and drop
+        entries Spotify will not play, e.g. tracks that failed or were skipped
+        past. Also clears an owner left over from an earlier track. Returns the
+        number of entries dropped.
+        """
+        if not self.queue.length():
+            return 0
+        # a guest's add_track (a higher-priority lane) may land while the listing is in flight
+        added_before = self.queue.mark()
+        player_queue = await self.spotify.get_player_queue()
+        if not player_queue:
+            return 0
+        current_id = (player_queue.get("currently_playing") or {}).get("id")
+        if current_id != self.last_track_id:
+            # a track change the poller has not seen yet; its next pass updates the head and owner
+            return 0
+        if self.current_owner is not None and self.owner_track_id != current_id:
+            logger.info(f"Track {current_id} was not queued by {self.current_owner}, clearing owner")
+            self.current_owner = None
+
+        upcoming = [track["id"] for track in player_queue.get("queue") or [] if track and track.get("id")]
+        removed = self.queue.reconcile(upcoming, complete=len(upcoming) < settings.QUEUE_RECONCILE_WINDOW, added_before=added_before)
+        if removed:
+            logger.info(f"Dropped {len(removed)} queued tracks Spotify will not play: {[entry['track_id'] for entry in removed]}")
+            await broadcast_queue_length()
+        return len(removed)
+
     async def handle_feedback(self, action: str, total_clients: int, broadcast_queue_length):
-        if action == "like_track" and total_clients > 0 and self.feedback.likes > total_clients * 0.66:
+        if action == "like_track" and self.feedback.supermajority("like", total_clients):
             logger.info("Track liked by supermajority, rewarding owner...")
             self.currency.add_tokens(self.current_owner, settings.POPULAR_TRACK_REWARD)
             return {
@@ -77,25 +117,14 @@ class PlaybackManager:
                 "tokens": self.currency.get_balance(self.current_owner)
             }
 
-        if action == "dislike_track" and total_clients > 0 and self.feedback.dislikes > total_clients * 0.66:
+        if action == "dislike_track" and self.feedback.supermajority("dislike", total_clients):
             logger.info("Track disliked by supermajority, skipping...")
-            self.spotify.skip_track()
+            await self.spotify.skip_track()
             # immediately re‑poll to update state and broadcast new track
             await self.poll_currently_playing(broadcast_queue_length)
-            info = self.spotify.get_currently_playing()
             return {
                 "event": "track_skipped",
-                "currently_playing": {
-                    "track_name": info["item"]["name"],
-                    "artists": [a["name"] for a in info["item"]["artists"]],
-                    "album": info["item"]["album"]["name"],
-                    "album_art": info["item"]["album"]["images"][0]["url"],
-                    "duration_ms": info["item"]["duration_ms"],
-                    "progress_ms": info.get("progress_ms"),
-                    "is_playing": info.get("is_playing"),
-                    "track_id": info["item"]["id"],
-                    "uri": info["item"]["uri"],
-                }
+                "currently_playing": format_currently_playing(self.now_playing.current())
             }
 
         return None
\ No newline at end of file
@@ -0,0 +1,84 @@
+import random, time, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.poll_scheduler")
+
+class PollScheduler:
+    """
+    Decides how long PlaybackManager sleeps between currently-playing polls.
+    Mid-track it polls coarsely (catching skips, pauses and seeks); near the
+    predicted end of a track it wakes just before the boundary and then polls
+    tightly; when idle or paused it backs off exponentially. Coarse and idle
+    delays are jittered so restarts do not synchronize.
+    """
+    def __init__(
+        self,
+        coarse_interval: float = settings.POLL_COARSE_INTERVAL,
+        boundary_lead: float = settings.POLL_BOUNDARY_LEAD,
+        tight_interval: float = settings.POLL_TIGHT_INTERVAL,
+        idle_min: float = settings.POLL_IDLE_MIN,
+        idle_max: float = settings.POLL_IDLE_MAX,
+        jitter: float = settings.POLL_JITTER,
+        rng=random.random,
+        clock=time.monotonic,
+    ):
+        self.coarse_interval = coarse_interval
+        self.boundary_lead = boundary_lead
+        self.tight_interval = tight_interval
+        self.idle_min = idle_min
+        self.idle_max = idle_max
+        self.jitter = jitter
+        self._rng = rng
+        self._clock = clock
+        self._idle_delay = 0.0
+        self._predicted_end = None
+        self.detections = 0
+        self.early_changes = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+        self._latency_total = 0.0
+
+    def _jittered(self, delay: float) -> float:
+        return delay * (1 + self.jitter * (2 * self._rng() - 1))
+
+    def playing_delay(self, duration_ms: int, progress_ms: int | None) -> float:
+        """Delay while a track plays: coarse mid-track, aimed just ahead of the boundary near the end."""
+        self._idle_delay = 0.0
+        remaining = (duration_ms - (progress_ms or 0)) / 1000.0
+        self._predicted_end = self._clock() + remaining
+        if remaining > self.coarse_interval + self.boundary_lead:
+            return self._jittered(self.coarse_interval)
+        return max(remaining - self.boundary_lead, self.tight_interval)
+
+    def idle_delay(self) -> float:
+        """Delay while nothing is playing or playback is paused; doubles up to idle_max."""
+        self._predicted_end = None
+        if self._idle_delay:
+            self._idle_delay = min(self._idle_delay * 2, self.idle_max)
+        else:
+            self._idle_delay = self.idle_min
+        return self._jittered(self._idle_delay)
+
+    def record_track_change(self):
+        """Call when a new track is detected, to measure detection latency against the predicted boundary."""
+        if self._predicted_end is None:
+            return
+        latency = self._clock() - self._predicted_end
+        if latency < 0:
+            # changed before the predicted end: a manual skip or seek
+            self.early_changes += 1
+            return
+        self.detections += 1
+        self.last_latency = latency
+        self.max_latency = max(self.max_latency, latency)
+        self._latency_total += latency
+        logger.debug(f"Track change detected {latency:.2f}s after predicted boundary")
+
+    def stats(self) -> dict:
+        return {
+            "detections": self.detections,
+            "early_changes": self.early_changes,
+            "last_latency": self.last_latency,
+            "max_latency": self.max_latency,
+            "avg_latency": self._latency_total / self.detections if self.detections else None,
+        }
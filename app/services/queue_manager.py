@@ -1,49 +1,216 @@
+from collections import deque
+from itertools import islice
+from app.config import settings
+
+class QueueEntry:
+    """One queued track; `seq` orders entries by when they were added."""
+    __slots__ = ("track_id", "owner", "seq")
+
+    def __init__(self, track_id: str, owner: str, seq: int):
+        self.track_id = track_id
+        self.owner = owner
+        self.seq = seq
+
+    def as_dict(self) -> dict:
+        return {"track_id": self.track_id, "owner": self.owner}
+
 class SongQueue:
+    """
+    FIFO of queued tracks with per-owner and per-track indexes. Tracks only
+    leave from the head, so each index is a deque of that owner's (or
+    track's) entries in queue order and every operation is O(1).
+    """
     def __init__(self):
-        self._queue = []
+        self._queue: deque[QueueEntry] = deque()
+        self._by_owner: dict[str, deque[QueueEntry]] = {}
+        self._by_track: dict[str, deque[QueueEntry]] = {}
+        self._next_seq = 0
+        # Optional callable(op, **fields) that records changes (see Room.attach_journal)
+        self.journal = None
+
+    def _entry(self, track_id, owner) -> QueueEntry:
+        entry = QueueEntry(track_id, owner, self._next_seq)
+        self._next_seq += 1
+        return entry
+
+    def mark(self) -> int:
+        """Position in the add order; entries added from now on are not `added_before` it."""
+        return self._next_seq
 
     def add(self, track_id, client_id):
-        self._queue.append({"track_id": track_id, "owner": client_id})
+        self._append(self._entry(track_id, client_id))
+        if self.journal is not None:
+            self.journal("queue_add", track_id=track_id, owner=client_id)
+
+    def _append(self, entry: QueueEntry):
+        self._queue.append(entry)
+        self._by_owner.setdefault(entry.owner, deque()).append(entry)
+        self._by_track.setdefault(entry.track_id, deque()).append(entry)
+
+    @staticmethod
+    def _unindex(index: dict, key):
+        entries = index[key]
+        entries.popleft()
+        if not entries:
+            del index[key]
 
     def remove_first(self, track_id):
-        if self._queue and self._queue[0]["track_id"] == track_id:
-            return self._queue.pop(0)
+        if self._queue and self._queue[0].track_id == track_id:
+            entry = self._queue.popleft()
+            self._unindex(self._by_owner, entry.owner)
+            self._unindex(self._by_track, entry.track_id)
+            if self.journal is not None:
+                self.journal("queue_pop", track_id=track_id)
+            return entry.as_dict()
         return None
 
     def peek_first(self):
-        return self._queue[0] if self._queue else None
+        return self._queue[0].as_dict() if self._queue else None
 
     def length(self):
         return len(self._queue)
 
-    def as_list(self):
-        return list(self._queue)
-    
+    def __len__(self):
+        return len(self._queue)
+
+    def __contains__(self, track_id) -> bool:
+        return track_id in self._by_track
+
+    def count_for_owner(self, client_id) -> int:
+        entries = self._by_owner.get(client_id)
+        return len(entries) if entries else 0
+
+    def count_for_track(self, track_id) -> int:
+        entries = self._by_track.get(track_id)
+        return len(entries) if entries else 0
+
+    def reconcile(self, upcoming: list[str], complete: bool = True, added_before: int | None = None) -> list[dict]:
+        """
+        Drop entries that are not in Spotify's upcoming `upcoming` track ids, in
+        order, and return them. Each entry is matched to the next occurrence of
+        its track after the previous match, so the pass is linear. When the
+        listing is truncated (`complete` False), unmatched entries after the last
+        match may just be past its end and are kept. Entries added at or after
+        the `added_before` mark (taken before fetching the listing) may be missing
+        from it only because they are newer, so they are always kept.
+        """
+        positions: dict[str, deque[int]] = {}
+        for i, track_id in enumerate(upcoming):
+            positions.setdefault(track_id, deque()).append(i)
+
+        matched, last, last_matched = [], -1, -1
+        for i, entry in enumerate(self._queue):
+            if added_before is not None and entry.seq >= added_before:
+                matched.append(True)
+                continue
+            candidates = positions.get(entry.track_id)
+            while candidates and candidates[0] <= last:
+                candidates.popleft()
+            if candidates:
+                last = candidates.popleft()
+                last_matched = i
+                matched.append(True)
+            else:
+                matched.append(False)
+
+        removed, kept = [], []
+        for i, entry in enumerate(self._queue):
+            if matched[i] or not (complete or i < last_matched):
+                kept.append(entry)
+            else:
+                removed.append(entry.as_dict())
+        if removed:
+            self._rebuild(kept)
+            if self.journal is not None:
+                self.journal("queue_set", entries=self.as_list())
+        return removed
+
+    def restore(self, entries: list[dict]):
+        """Replace the contents (journal replay); not recorded."""
+        self._rebuild([self._entry(entry["track_id"], entry["owner"]) for entry in entries])
+
+    def _rebuild(self, entries: list[QueueEntry]):
+        self._queue.clear()
+        self._by_owner.clear()
+        self._by_track.clear()
+        for entry in entries:
+            self._append(entry)
+
+    def as_list(self, offset: int = 0, limit: int | None = None):
+        """Entries in play order, optionally one page of them."""
+        stop = None if limit is None else offset + limit
+        return [entry.as_dict() for entry in islice(self._queue, offset, stop)]
+
 class SongFeedback:
+    """
+    Votes on the current track. Like/dislike totals are kept as running counts,
+    so reading them (on every vote) does not scan the room's votes.
+    """
     def __init__(self):
         self.current_track_id = None
-        self.votes = {}  # { session_id: "like" | "dislike" }
+        self.votes: dict[str, bool] = {}  # { session_id: True (like) | False (dislike) }
+        self._likes = 0
+        self._dislikes = 0
+        # Optional callable(op, **fields) that records changes (see Room.attach_journal)
+        self.journal = None
 
     def set_current_track(self, track_id: str):
         if track_id != self.current_track_id:
             # reset votes when track changes
             self.current_track_id = track_id
             self.votes.clear()
+            self._likes = self._dislikes = 0
+            if self.journal is not None:
+                self.journal("track", track_id=track_id)
+
+    def _vote(self, session_id: str, liked: bool):
+        previous = self.votes.get(session_id)
+        if previous is liked:
+            return
+        if previous is True:
+            self._likes -= 1
+        elif previous is False:
+            self._dislikes -= 1
+        self.votes[session_id] = liked
+        if liked:
+            self._likes += 1
+        else:
+            self._dislikes += 1
+        if self.journal is not None:
+            self.journal("vote", session=session_id, liked=liked)
+
+    def snapshot(self) -> dict:
+        return {"track_id": self.current_track_id, "votes": dict(self.votes)}
+
+    def restore(self, snapshot: dict):
+        """Replace the track and votes (journal replay); not recorded."""
+        self.current_track_id = snapshot.get("track_id")
+        self.votes = dict(snapshot.get("votes", {}))
+        self._likes = sum(1 for liked in self.votes.values() if liked)
+        self._dislikes = len(self.votes) - self._likes
 
     def like(self, session_id: str):
-        self.votes[session_id] = "like"
+        self._vote(session_id, True)
 
     def dislike(self, session_id: str):
-        self.votes[session_id] = "dislike"
+        self._vote(session_id, False)
 
     def get_vote(self, session_id: str) -> str | None:
         """Return 'like', 'dislike', or None if this client hasn't voted."""
-        return self.votes.get(session_id)
+        vote = self.votes.get(session_id)
+        if vote is None:
+            return None
+        return "like" if vote else "dislike"
 
     @property
     def likes(self) -> int:
-        return sum(1 for v in self.votes.values() if v == "like")
+        return self._likes
 
     @property
     def dislikes(self) -> int:
-        return sum(1 for v in self.votes.values() if v == "dislike")
\ No newline at end of file
+        return self._dislikes
+
+    def supermajority(self, vote: str, total_clients: int) -> bool:
+        """True if more than FEEDBACK_SUPERMAJORITY of the room's clients cast `vote` ('like' or 'dislike')."""
+        count = self._likes if vote == "like" else self._dislikes
+        return total_clients > 0 and count > total_clients * settings.FEEDBACK_SUPERMAJORITY
@@ -0,0 +1,458 @@
+import asyncio, hmac, json, os, re, time, logging
+from app.config import settings
+from app.services.currency_manager import CurrencyManager
+from app.services.identity_manager import IdentityManager
+from app.services.now_playing import NowPlayingSnapshot
+from app.services.search_cache import SearchCache
+from app.services.spotify_manager import SpotifyConnectionManager
+from app.services.track_metadata import TrackMetadataStore
+from app.services.playback_manager import PlaybackManager
+from app.core.token_manager import TokenManager
+from app.services.room_state import RoomState
+from app.services.state_publisher import StatePublisher
+from app.handlers.client_handler import ClientHandler
+
+logger = logging.getLogger("app.core.room_manager")
+
+ROOM_CODE_PATTERN = re.compile(r"^[A-Z0-9]{4,8}$")
+
+class Room:
+    """
+    One venue: its own queue, feedback, balances, members, state publisher and poller,
+    driving the Spotify account of `client_handler`'s connection. A room given a
+    `token_manager` owns that account (a host-opened room): it refreshes the
+    account's token while polling and shuts the connection down when it closes.
+    """
+    def __init__(self, code: str, client_handler: ClientHandler, currency_manager: CurrencyManager, identity_manager=None,
+                 token_manager: TokenManager | None = None, clock=time.monotonic):
+        self.code = code
+        self.token_manager = token_manager
+        self.tokens_file = token_manager.tokens_file if token_manager else settings.TOKENS_FILE
+        self.currency_manager = currency_manager
+        self.client_handler = client_handler
+        # members and their sockets; anything with IdentityManager's interface (see coordinator.ClusterMembers)
+        self.identity_manager = identity_manager or IdentityManager()
+        self.state_publisher = StatePublisher(self.identity_manager.broadcast, room_state=RoomState(
+            queue_length=0, cost=currency_manager.calculate_cost(0), now_playing=None
+        ))
+        # Pollers sharing a snapshot (several managers on one account) join their near-simultaneous fetches
+        self.playback_manager = PlaybackManager(
+            client_handler._spotify_connection,
+            client_handler._songQueue,
+            client_handler.song_feedback,
+            currency_manager,
+            now_playing=client_handler.now_playing,
+            refresh_min_age=settings.POLL_TIGHT_INTERVAL,
+        )
+        self._clock = clock
+        self.last_active = clock()
+        self._poll_task: asyncio.Task | None = None
+        self._reconcile_task: asyncio.Task | None = None
+        self._token_task: asyncio.Task | None = None
+
+    def __len__(self):
+        return len(self.identity_manager.all_session_ids())
+
+    def publish_state(self):
+        """Mark the versioned room state from the live queue and now-playing snapshot."""
+        ql = self.client_handler.get_queue_length()
+        current = self.client_handler.now_playing.current()
+        track_id = current["item"].get("id") if current and current.get("is_playing") and current.get("item") else None
+        self.state_publisher.mark(queue_length=ql, cost=self.currency_manager.calculate_cost(ql), now_playing=track_id)
+
+    async def broadcast_queue_length(self):
+        """Queue changed outside a client message (e.g. a queued track started); publish it to the room."""
+        self.publish_state()
+
+    def start_polling(self):
+        if self._poll_task is None:
+            self._poll_task = asyncio.create_task(self.poll_currently_playing())
+            self._reconcile_task = asyncio.create_task(self.reconcile_queue())
+
+    def stop_polling(self) -> list[asyncio.Task]:
+        """Cancel polling, reconciliation and token refresh; returns the cancelled tasks to await."""
+        tasks = [task for task in (self._poll_task, self._reconcile_task, self._token_task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        self._poll_task = self._reconcile_task = self._token_task = None
+        return tasks
+
+    async def poll_currently_playing(self):
+        while True:
+            try:
+                sleep_time = await self.playback_manager.poll_currently_playing(self.broadcast_queue_length)
+                self.publish_state()
+                if self.token_manager is not None and self._token_task is None:
+                    # the account is authorized now; keep its token fresh from here on
+                    self._token_task = asyncio.create_task(self.token_manager.run())
+                await asyncio.sleep(sleep_time)
+            except Exception as e:
+                if not os.path.exists(self.tokens_file):
+                    if self.token_manager is None:
+                        logger.info("Spotify not authorized. Run admin.py authorize to create tokens.json.")
+                        return
+                    # the host may authorize the room's account while it is open
+                    logger.info(f"Room {self.code} has no Spotify account yet. Run admin.py authorize --room {self.code}.")
+                    await asyncio.sleep(settings.ROOM_AUTHORIZE_RETRY)
+                else:
+                    logger.exception(f"Error polling currently playing in room {self.code}: {e}")
+                    await asyncio.sleep(5)
+
+    async def reconcile_queue(self, interval: float = settings.QUEUE_RECONCILE_INTERVAL):
+        """Periodically repair the local queue against Spotify's; a no-op while nothing is queued."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self.playback_manager.reconcile_queue(self.broadcast_queue_length)
+            except Exception as e:
+                logger.warning(f"Queue reconciliation failed in room {self.code}: {e}")
+
+    async def join(self, session_id: str, hello: dict) -> dict:
+        """Admit a registered member; returns its init payload."""
+        self.currency_manager.register_client(session_id)
+        self.last_active = self._clock()
+        # Clients that send the stateEpoch/stateVersion they last saw only get what changed since
+        room_state = self.state_publisher.room_state
+        changed, full = room_state.delta_since(hello.get("stateEpoch"), hello.get("stateVersion"))
+        init_payload = {
+            "sessionId": session_id,
+            "roomCode": self.code,
+            "stateEpoch": room_state.epoch,
+            "stateVersion": room_state.version,
+            "full": full,
+        }
+        if full or "now_playing" in changed:
+            init_payload.update(await self.client_handler.clean_currently_playing())
+        init_payload.update(changed)
+        init_payload["tokens"] = self.currency_manager.get_balance(session_id)
+        init_payload["client_vote"] = self.client_handler.song_feedback.get_vote(session_id)
+        return init_payload
+
+    async def handle_message(self, session_id: str, message) -> dict:
+        """Apply one client message and publish what it changed; returns the reply."""
+        response = await self.client_handler.message_handler(message, session_id)
+        if response.get("success"):
+            event = await self.playback_manager.handle_feedback(
+                message.get("action"),
+                len(self),
+                self.broadcast_queue_length
+            )
+            if event:
+                await self.state_publisher.publish_event(event)
+            self.publish_state()
+        return response
+
+    def leave(self, session_id: str, websocket):
+        # a reconnect may already have moved this session to a newer socket
+        owner = self.identity_manager.get_websocket(session_id)
+        if owner is None or owner is websocket:
+            self.currency_manager.remove_client(session_id)
+        self.identity_manager.unregister(session_id, websocket)
+        self.last_active = self._clock()
+
+    async def handle_client(self, websocket, hello: dict):
+        """Serve one member's connection until it closes."""
+        session_id = self.identity_manager.register(websocket, hello.get("sessionId"))
+        try:
+            await self.identity_manager.send_to(session_id, await self.join(session_id, hello))
+            async for raw in websocket:
+                response = await self.handle_message(session_id, json.loads(raw))
+                # replies share the outbox so they stay ordered after any event they caused
+                await self.identity_manager.send_to(session_id, response)
+        except Exception as e:
+            logger.error(f"Error in room {self.code} client connection: {e}")
+        finally:
+            self.leave(session_id, websocket)
+
+    def attach_journal(self, journal):
+        """Record this room's balance, queue and vote changes in `journal`."""
+        def record(op, **fields):
+            journal.append(self.code, op, **fields)
+        self.currency_manager.journal = record
+        self.client_handler._songQueue.journal = record
+        self.client_handler.song_feedback.journal = record
+
+    def snapshot(self) -> dict:
+        return {
+            "balances": self.currency_manager.snapshot(),
+            "queue": self.client_handler._songQueue.as_list(),
+            "feedback": self.client_handler.song_feedback.snapshot(),
+        }
+
+    def handoff(self) -> dict:
+        """snapshot() plus the live state a hot-restarted successor continues from."""
+        playback = self.playback_manager
+        return {
+            **self.snapshot(),
+            "playback": {"current_owner": playback.current_owner, "owner_track_id": playback.owner_track_id, "last_track_id": playback.last_track_id},
+            "state": self.state_publisher.room_state.snapshot(),
+        }
+
+    def restore(self, snapshot: dict):
+        for session_id, tokens in snapshot.get("balances", {}).items():
+            self.currency_manager.set_balance(session_id, tokens)
+        self.client_handler._songQueue.restore(snapshot.get("queue", []))
+        self.client_handler.song_feedback.restore(snapshot.get("feedback", {}))
+        if "playback" in snapshot:
+            for name, value in snapshot["playback"].items():
+                setattr(self.playback_manager, name, value)
+        if "state" in snapshot:
+            self.state_publisher.room_state.restore(snapshot["state"])
+
+    def apply(self, record: dict):
+        """Replay one journal record."""
+        queue, feedback = self.client_handler._songQueue, self.client_handler.song_feedback
+        match record["op"]:
+            case "balance":
+                self.currency_manager.set_balance(record["session"], record["tokens"])
+            case "queue_add":
+                queue.add(record["track_id"], record["owner"])
+            case "queue_pop":
+                queue.remove_first(record["track_id"])
+            case "queue_set":
+                queue.restore(record["entries"])
+            case "track":
+                feedback.set_current_track(record["track_id"])
+            case "vote":
+                if record["liked"]:
+                    feedback.like(record["session"])
+                else:
+                    feedback.dislike(record["session"])
+
+    def is_idle(self, idle_ttl: float) -> bool:
+        return len(self) == 0 and self._clock() - self.last_active >= idle_ttl
+
+    def close(self):
+        self.stop_polling()
+        self.state_publisher.close()
+        if self.token_manager is not None:
+            SpotifyConnectionManager.release_room_instance(self.code)
+
+    def stats(self) -> dict:
+        return {
+            "members": len(self),
+            "queue_length": self.client_handler.get_queue_length(),
+            "broadcast": self.identity_manager.stats(),
+            "state": self.state_publisher.stats(),
+            "spotify": self.client_handler._spotify_connection.scheduler.stats() if self.token_manager else None,
+        }
+
+class RoomManager:
+    """
+    Rooms by code. Clients that send no room code join the default room, which
+    drives the server's Spotify account (tokens.json) and is never evicted.
+    Every other room is a venue a host opened, with its own Spotify account
+    (see SpotifyConnectionManager.get_room_instance), so its skips, queue adds
+    and prices never touch another room's player; those rooms are evicted once
+    they have had no members for `idle_ttl` seconds. An unknown code is
+    rejected rather than creating a room.
+    """
+    def __init__(
+        self,
+        default_code: str,
+        max_rooms: int = settings.ROOM_MAX_ROOMS,
+        idle_ttl: float = settings.ROOM_IDLE_TTL,
+        members_factory=None,
+        clock=time.monotonic,
+    ):
+        self.default_code = default_code
+        # room code -> member registry for a new room; defaults to a local IdentityManager
+        self._members_factory = members_factory
+        self.max_rooms = max_rooms
+        self.idle_ttl = idle_ttl
+        self._clock = clock
+        self._rooms: dict[str, Room] = {}
+        self.polling_enabled = False
+        self.poll_default_room = True
+        # Search results are the same for every account; the other caches belong to the default room's account
+        self.search_cache = SearchCache()
+        self.now_playing = NowPlayingSnapshot(lambda: SpotifyConnectionManager.get_async_instance().get_currently_playing())
+        self.track_metadata = TrackMetadataStore(lambda ids: SpotifyConnectionManager.get_async_instance().get_tracks(ids))
+        self.journal = None
+        self.created = 0
+        self.evicted = 0
+
+    @staticmethod
+    def normalize(code) -> str | None:
+        if not isinstance(code, str):
+            return None
+        code = code.strip().upper()
+        return code if ROOM_CODE_PATTERN.match(code) else None
+
+    def __iter__(self):
+        return iter(list(self._rooms.values()))
+
+    def get(self, code) -> Room | None:
+        return self._rooms.get(self.normalize(code) or "")
+
+    def get_or_create(self, code=None) -> Room | None:
+        """The room for a hello's roomCode (default room if missing, created on demand); None if invalid or not open."""
+        code = self.normalize(code) if code else self.default_code
+        if code is None:
+            return None
+        room = self._rooms.get(code)
+        if room is None and code == self.default_code:
+            room = self.open_room(code)
+        return room
+
+    def admit(self, hello: dict) -> Room | None:
+        """The room a hello may join; a hello carrying the host key opens its roomCode if needed."""
+        room = self.get_or_create(hello.get("roomCode"))
+        host_key = hello.get("hostKey")
+        if room is None and settings.ROOM_HOST_KEY and isinstance(host_key, str) and hmac.compare_digest(host_key, settings.ROOM_HOST_KEY):
+            room = self.open_room(hello.get("roomCode"))
+        return room
+
+    def open_room(self, code) -> Room | None:
+        """Open (or return) the room `code`; None if the code is invalid or too many rooms are open."""
+        code = self.normalize(code)
+        if code is None:
+            return None
+        room = self._rooms.get(code)
+        if room is not None:
+            return room
+        if len(self._rooms) >= self.max_rooms:
+            self.evict_idle()
+            if len(self._rooms) >= self.max_rooms:
+                logger.warning(f"Refusing to create room {code}: {self.max_rooms} rooms already open")
+                return None
+
+        currency_manager = CurrencyManager()
+        if code == self.default_code:
+            token_manager = None
+            client_handler = ClientHandler(
+                currency_manager,
+                search_cache=self.search_cache,
+                now_playing=self.now_playing,
+                track_metadata=self.track_metadata,
+            )
+        else:
+            # a venue of its own: its account, scheduler, now-playing snapshot and metadata
+            spotify = SpotifyConnectionManager.get_room_instance(code)
+            token_manager = TokenManager(spotify, tokens_file=spotify.connection.tokens_file)
+            client_handler = ClientHandler(
+                currency_manager,
+                search_cache=self.search_cache,
+                now_playing=NowPlayingSnapshot(lambda: spotify.get_currently_playing()),
+                track_metadata=TrackMetadataStore(lambda ids: spotify.get_tracks(ids)),
+                spotify_connection=spotify,
+            )
+        members = self._members_factory(code) if self._members_factory else None
+        room = Room(code, client_handler, currency_manager, identity_manager=members, token_manager=token_manager, clock=self._clock)
+        self._rooms[code] = room
+        if self.journal is not None:
+            room.attach_journal(self.journal)
+        self.created += 1
+        logger.info(f"Created room {code}")
+        if self._should_poll(room):
+            room.start_polling()
+        return room
+
+    def _should_poll(self, room: Room) -> bool:
+        return self.polling_enabled and (room.code != self.default_code or self.poll_default_room)
+
+    def start_polling(self, default_room: bool = True):
+        """
+        Enable playback polling in every current and future room. With `default_room`
+        False (the server's own account is not authorized) only host-opened rooms poll.
+        """
+        self.polling_enabled = True
+        self.poll_default_room = default_room
+        for room in self._rooms.values():
+            if self._should_poll(room):
+                room.start_polling()
+
+    async def stop_polling(self):
+        """Stop polling in every room and wait until no poll is still talking to Spotify."""
+        self.polling_enabled = False
+        self.poll_default_room = True
+        tasks = [task for room in self._rooms.values() for task in room.stop_polling()]
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def evict_idle(self) -> int:
+        """Close host-opened rooms nobody has been in for `idle_ttl`; the default room keeps its guests' state."""
+        idle = [code for code, room in self._rooms.items() if code != self.default_code and room.is_idle(self.idle_ttl)]
+        for code in idle:
+            self._rooms.pop(code).close()
+            if self.journal is not None:
+                self.journal.append(code, "close_room")
+            logger.info(f"Evicted idle room {code}")
+        self.evicted += len(idle)
+        return len(idle)
+
+    async def run_evictor(self, interval: float = settings.ROOM_EVICT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def snapshot(self) -> dict:
+        return {"default_code": self.default_code, "rooms": {code: room.snapshot() for code, room in self._rooms.items()}}
+
+    def handoff_state(self) -> dict:
+        """Everything a hot-restarted successor needs (see app.core.hot_restart)."""
+        return {
+            "default_code": self.default_code,
+            "rooms": {code: room.handoff() for code, room in self._rooms.items()},
+            "now_playing": self.now_playing.current(),
+        }
+
+    def restore(self, snapshot: dict | None, records: list[dict]):
+        """Rebuild rooms from a journal snapshot (or handoff state) and the records logged after it."""
+        if snapshot:
+            self.default_code = snapshot.get("default_code") or self.default_code
+            if snapshot.get("now_playing"):
+                self.now_playing.update(snapshot["now_playing"])
+            for code, state in snapshot.get("rooms", {}).items():
+                room = self.open_room(code)
+                if room is not None:
+                    room.restore(state)
+        for record in records:
+            code = record.get("room")
+            match record["op"]:
+                case "default_room":
+                    self.default_code = record["code"]
+                case "close_room":
+                    room = self._rooms.pop(code, None)
+                    if room is not None:
+                        room.close()
+                case _:
+                    room = self.open_room(code)
+                    if room is not None:
+                        room.apply(record)
+
+    def attach_journal(self, journal):
+        """Record every room's changes from now on (after restore)."""
+        self.journal = journal
+        journal.append(None, "default_room", code=self.default_code)
+        for room in self._rooms.values():
+            room.attach_journal(journal)
+
+    async def run_journal(self, journal, handoff_state: dict | None = None):
+        """
+        Replay `journal` into the rooms, then keep it up to date with compacted
+        snapshots. State handed over by a hot restart replaces the replay and is
+        compacted into the journal right away.
+        """
+        started = time.perf_counter()
+        snapshot, records = await asyncio.to_thread(journal.load)
+        if handoff_state is not None:
+            snapshot, records = handoff_state, []
+            journal.request_snapshot()
+        self.restore(snapshot, records)
+        logger.info(f"Restored {len(self._rooms)} rooms ({len(records)} journal records) in {(time.perf_counter() - started) * 1000:.0f} ms")
+        self.attach_journal(journal)
+        journal.start(snapshot_source=self.snapshot)
+        return journal
+
+    def close_all(self):
+        for room in self._rooms.values():
+            room.close()
+        self._rooms.clear()
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self._rooms),
+            "created": self.created,
+            "evicted": self.evicted,
+            "members": sum(len(room) for room in self._rooms.values()),
+        }
@@ -0,0 +1,61 @@
+import uuid, logging
+from app.config import settings
+
+logger = logging.getLogger("app.core.room_state")
+
+class RoomState:
+    """
+    Monotonically versioned room state (queue length, cost, now playing).
+    Each update that changes something bumps the version once and records
+    which fields changed at that version, so a reconnecting client that
+    reports its last seen version can be sent just the fields it missed.
+    The epoch changes on every cold start (a hot restart carries it over);
+    versions from another epoch are meaningless and get a full snapshot.
+    """
+    def __init__(self, max_delta_gap: int = settings.STATE_DELTA_MAX_GAP, **fields):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.version = 0
+        self.max_delta_gap = max_delta_gap
+        self._fields: dict = dict(fields)
+        self._changed_at: dict[str, int] = {name: 0 for name in fields}
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._fields
+
+    def get(self, name: str, default=None):
+        return self._fields.get(name, default)
+
+    @property
+    def fields(self) -> dict:
+        return dict(self._fields)
+
+    def update(self, **fields) -> set[str]:
+        """Apply new values; returns the names that actually changed."""
+        changed = {name for name, value in fields.items() if name not in self._fields or self._fields[name] != value}
+        if changed:
+            self.version += 1
+            for name in changed:
+                self._fields[name] = fields[name]
+                self._changed_at[name] = self.version
+        return changed
+
+    def snapshot(self) -> dict:
+        return {"epoch": self.epoch, "version": self.version, "fields": dict(self._fields), "changed_at": dict(self._changed_at)}
+
+    def restore(self, snapshot: dict):
+        """Continue a previous process's epoch, so its clients keep getting deltas."""
+        self.epoch = snapshot["epoch"]
+        self.version = snapshot["version"]
+        self._fields = dict(snapshot["fields"])
+        self._changed_at = dict(snapshot["changed_at"])
+
+    def delta_since(self, epoch: str | None, version: int | None) -> tuple[dict, bool]:
+        """
+        Fields changed after `version`, and whether that is a full snapshot.
+        Unknown epochs, impossible versions and clients more than
+        max_delta_gap versions behind get everything.
+        """
+        if epoch != self.epoch or not isinstance(version, int) or not 0 <= version <= self.version \
+                or self.version - version > self.max_delta_gap:
+            return self.fields, True
+        return {name: self._fields[name] for name, at in self._changed_at.items() if at > version}, False
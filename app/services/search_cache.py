@@ -0,0 +1,116 @@
+import asyncio, json, time, logging
+from collections import OrderedDict
+from app.config import settings
+
+logger = logging.getLogger("app.core.search_cache")
+
+class SearchCache:
+    """
+    In-process TTL + LRU cache for search results.
+    Bounded by entry count and an approximate memory budget; identical
+    searches already in flight share a single upstream request.
+    """
+    def __init__(
+        self,
+        max_entries: int = settings.SEARCH_CACHE_MAX_ENTRIES,
+        max_bytes: int = settings.SEARCH_CACHE_MAX_BYTES,
+        ttl: float = settings.SEARCH_CACHE_TTL,
+        clock=time.monotonic,
+    ):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        # key -> (expires_at, size_bytes, value), least recently used first
+        self._entries: OrderedDict[str, tuple[float, int, object]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """Case- and whitespace-insensitive cache key."""
+        return " ".join(str(query).casefold().split())
+
+    def get(self, query: str):
+        """Return a cached value, or None on a miss or expired entry."""
+        key = self.normalize(query)
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, size, value = entry
+        if expires_at <= self._clock():
+            self._remove(key)
+            self.expirations += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, query: str, value):
+        key = self.normalize(query)
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        if key in self._entries:
+            self._remove(key)
+        self._entries[key] = (self._clock() + self.ttl, size, value)
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    async def get_or_fetch(self, query: str, fetch):
+        """
+        Return the cached value for query, calling `fetch(normalized_query)` on a miss.
+        Concurrent misses for the same key await one shared fetch.
+        """
+        key = self.normalize(query)
+        cached = self.get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            self.misses += 1
+            task = asyncio.ensure_future(fetch(key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, key=key: self._on_fetched(key, t))
+        else:
+            self.coalesced += 1
+            logger.debug(f"Coalescing search for '{key}' with in-flight request")
+
+        # shield so one caller disconnecting does not cancel the fetch for the others
+        return await asyncio.shield(task)
+
+    def _on_fetched(self, key: str, task: asyncio.Future):
+        self._inflight.pop(key, None)
+        if task.cancelled() or task.exception() is not None:
+            return
+        result = task.result()
+        if result is not None:
+            self.put(key, result)
+
+    def _remove(self, key: str):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+        }
@@ -1,10 +1,49 @@
-from app.core.spotify_client import SpotifyConnection
+import os
+from app.config import settings
+from app.core.spotify_client import SpotifyConnection, AsyncSpotifyConnection
 
 class SpotifyConnectionManager:
     _instance = None
+    _async_instance = None
+    # room code -> the connection to that venue's own Spotify account
+    _room_instances: dict[str, AsyncSpotifyConnection] = {}
 
     @staticmethod
     def get_instance():
         if SpotifyConnectionManager._instance is None:
             SpotifyConnectionManager._instance = SpotifyConnection()
-        return SpotifyConnectionManager._instance
\ No newline at end of file
+        return SpotifyConnectionManager._instance
+
+    @staticmethod
+    def get_async_instance():
+        """Shared non-blocking wrapper around the singleton connection, for use on the event loop."""
+        if SpotifyConnectionManager._async_instance is None:
+            SpotifyConnectionManager._async_instance = AsyncSpotifyConnection(SpotifyConnectionManager.get_instance())
+        return SpotifyConnectionManager._async_instance
+
+    @staticmethod
+    def has_room_instance(code: str) -> bool:
+        return code in SpotifyConnectionManager._room_instances
+
+    @staticmethod
+    def get_room_instance(code: str) -> AsyncSpotifyConnection:
+        """
+        Connection to the Spotify account of host-opened room `code`, with its own
+        tokens (settings.room_tokens_file), worker pool and request scheduler.
+        """
+        connection = SpotifyConnectionManager._room_instances.get(code)
+        if connection is None:
+            account = SpotifyConnection(tokens_file=settings.room_tokens_file(code))
+            # a room opened before its host authorized it has no tokens yet; that is not an error
+            if os.path.exists(account.tokens_file):
+                account.load_tokens()
+            connection = SpotifyConnectionManager._room_instances[code] = AsyncSpotifyConnection(account)
+        return connection
+
+    @staticmethod
+    def release_room_instance(code: str):
+        """Shut down room `code`'s connection (its tokens stay on disk for when it reopens)."""
+        connection = SpotifyConnectionManager._room_instances.pop(code, None)
+        if connection is not None:
+            connection.shutdown()
+            connection.connection.close()
@@ -0,0 +1,81 @@
+import asyncio, time, logging
+from app.config import settings
+from app.services.room_state import RoomState
+
+logger = logging.getLogger("app.core.state_publisher")
+
+class StatePublisher:
+    """
+    Coalesces room state broadcasts. Changes are marked as they happen and at
+    most one merged state update goes out per tick, so a burst of 100 likes
+    costs one broadcast instead of 100. Events are urgent and sent immediately.
+    `broadcast` is an async callable taking (payload, kind=...). State updates
+    carry the RoomState version so clients can ask for a delta on reconnect.
+    """
+    STATE_KIND = "queue_state"
+
+    def __init__(self, broadcast, tick: float = settings.STATE_BROADCAST_TICK, room_state: RoomState | None = None, clock=time.monotonic):
+        self._broadcast = broadcast
+        self.tick = tick
+        self._clock = clock
+        self.room_state = room_state or RoomState()
+        self._dirty: set[str] = set()
+        self._task: asyncio.Task | None = None
+        self.marks = 0
+        self.flushes = 0
+        self.events = 0
+        self.max_delay = 0.0
+        self._first_dirty_at = None
+
+    @property
+    def state(self) -> dict:
+        return self.room_state.fields
+
+    def mark(self, **fields):
+        """Record new state values; changed fields are flushed on the next tick."""
+        self.marks += 1
+        changed = self.room_state.update(**fields)
+        if not changed:
+            return
+        if not self._dirty:
+            self._first_dirty_at = self._clock()
+        self._dirty |= changed
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._flush_later())
+
+    async def _flush_later(self):
+        try:
+            await asyncio.sleep(self.tick)
+            await self.flush()
+        finally:
+            self._task = None
+
+    async def flush(self):
+        """Broadcast the current state now if anything changed since the last flush."""
+        if not self._dirty:
+            return
+        self._dirty.clear()
+        self.flushes += 1
+        self.max_delay = max(self.max_delay, self._clock() - self._first_dirty_at)
+        # full snapshot, so a queued older update can be superseded without losing fields
+        await self._broadcast({**self.room_state.fields, "stateVersion": self.room_state.version}, kind=self.STATE_KIND)
+
+    async def publish_event(self, event: dict):
+        """Send an urgent event (track_skipped, reward, ...) without waiting for the tick."""
+        self.events += 1
+        await self._broadcast(event)
+
+    def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def stats(self) -> dict:
+        return {
+            "marks": self.marks,
+            "flushes": self.flushes,
+            "coalesced": self.marks - self.flushes,
+            "events": self.events,
+            "pending": sorted(self._dirty),
+            "max_delay": self.max_delay,
+        }
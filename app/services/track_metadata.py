@@ -0,0 +1,92 @@
+import asyncio, logging
+from collections import OrderedDict
+from app.config import settings
+
+logger = logging.getLogger("app.core.track_metadata")
+
+# Spotify's multi-id /v1/tracks endpoint accepts at most 50 ids per call
+TRACK_LOOKUP_BATCH_SIZE = 50
+
+class TrackMetadataStore:
+    """
+    LRU cache of display metadata (name, artists, album art, duration) per track id.
+    Filled from search results we already have and, for unknown ids, from
+    batched multi-id lookups: one upstream call per 50 missing tracks.
+    """
+    def __init__(self, fetch, max_entries: int = settings.TRACK_METADATA_MAX_ENTRIES):
+        self._fetch = fetch
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, dict] = OrderedDict()
+        self._pending: dict[str, asyncio.Future] = {}
+        self.upstream_calls = 0
+
+    @staticmethod
+    def from_item(item: dict) -> dict:
+        """Compact metadata from a Spotify track object."""
+        album = item.get("album") or {}
+        return {
+            "track_id": item.get("id"),
+            "track_name": item.get("name"),
+            "artists": [artist.get("name") for artist in item.get("artists", [])],
+            "album_art": (album.get("images") or [{}])[0].get("url"),
+            "duration_ms": item.get("duration_ms"),
+        }
+
+    def seed(self, items):
+        """Cache metadata from track objects returned by any other Spotify call."""
+        for item in items:
+            if item and item.get("id"):
+                self._put(item["id"], self.from_item(item))
+
+    def get(self, track_id: str) -> dict | None:
+        meta = self._entries.get(track_id)
+        if meta is not None:
+            self._entries.move_to_end(track_id)
+        return meta
+
+    async def get_many(self, track_ids) -> dict[str, dict]:
+        """Return {track_id: metadata} for every id we know or can look up."""
+        wanted = list(dict.fromkeys(t for t in track_ids if t))
+        missing = [t for t in wanted if t not in self._entries and t not in self._pending]
+
+        for start in range(0, len(missing), TRACK_LOOKUP_BATCH_SIZE):
+            batch = missing[start:start + TRACK_LOOKUP_BATCH_SIZE]
+            task = asyncio.ensure_future(self._fetch_batch(batch))
+            for track_id in batch:
+                self._pending[track_id] = task
+            task.add_done_callback(lambda t, batch=batch: self._clear_pending(batch, t))
+
+        waits = {self._pending[t] for t in wanted if t in self._pending}
+        if waits:
+            results = await asyncio.gather(*(asyncio.shield(w) for w in waits), return_exceptions=True)
+            for result in results:
+                if isinstance(result, Exception):
+                    logger.warning(f"Track metadata lookup failed: {result}")
+
+        found = {}
+        for track_id in wanted:
+            meta = self.get(track_id)
+            if meta is not None:
+                found[track_id] = meta
+        return found
+
+    async def _fetch_batch(self, batch: list[str]):
+        self.upstream_calls += 1
+        response = await self._fetch(batch)
+        self.seed((response or {}).get("tracks") or [])
+
+    def _clear_pending(self, batch: list[str], task: asyncio.Future):
+        for track_id in batch:
+            if self._pending.get(track_id) is task:
+                del self._pending[track_id]
+        if not task.cancelled():
+            task.exception()  # mark retrieved; callers already logged it
+
+    def _put(self, track_id: str, meta: dict):
+        self._entries[track_id] = meta
+        self._entries.move_to_end(track_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "upstream_calls": self.upstream_calls}
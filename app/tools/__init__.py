@@ -0,0 +1 @@
+# Developer tooling: fake Spotify API and load generation
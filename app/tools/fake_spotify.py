@@ -0,0 +1,259 @@
+"""
+Local stand-in for the Spotify endpoints in settings.api, for load and latency testing.
+
+    python -m app.tools.fake_spotify --port 9090 --latency lognormal --latency-ms 80 --rate-limit 0.02
+
+Then start the server with SPOTIFY_API_URL and SPOTIFY_ACCOUNTS_URL set to http://127.0.0.1:9090.
+"""
+import argparse, asyncio, hashlib, itertools, math, random, time, logging
+from app.core.http_server import HttpResponse, start_http_server
+
+logger = logging.getLogger("app.tools.fake_spotify")
+
+class LatencyModel:
+    """Per-request latency distribution: none, fixed, uniform or lognormal (all in ms)."""
+    KINDS = ("none", "fixed", "uniform", "lognormal")
+
+    def __init__(self, kind: str = "none", mean_ms: float = 50, spread_ms: float = 25, sigma: float = 0.5, rng: random.Random | None = None):
+        if kind not in self.KINDS:
+            raise ValueError(f"Unknown latency kind '{kind}', expected one of {self.KINDS}")
+        self.kind = kind
+        self.mean_ms = mean_ms
+        self.spread_ms = spread_ms
+        self.sigma = sigma
+        self._rng = rng or random.Random()
+
+    def sample(self) -> float:
+        """Seconds to delay the next response."""
+        match self.kind:
+            case "none":
+                ms = 0.0
+            case "fixed":
+                ms = self.mean_ms
+            case "uniform":
+                ms = self._rng.uniform(self.mean_ms - self.spread_ms, self.mean_ms + self.spread_ms)
+            case "lognormal":
+                # mean_ms is the median; sigma controls the tail
+                ms = self._rng.lognormvariate(math.log(max(self.mean_ms, 0.001)), self.sigma)
+        return max(ms, 0.0) / 1000.0
+
+def make_track(track_id: str, duration_ms: int | None = None) -> dict:
+    """Deterministic track object shaped like Spotify's."""
+    digest = int(hashlib.sha1(track_id.encode()).hexdigest(), 16)
+    return {
+        "id": track_id,
+        "name": f"Track {track_id}",
+        "artists": [{"name": f"Artist {digest % 97}"}],
+        "album": {"name": f"Album {digest % 53}", "images": [{"url": f"https://fake.local/art/{track_id}.jpg"}]},
+        "duration_ms": duration_ms or 120_000 + digest % 180_000,
+        "uri": f"spotify:track:{track_id}",
+    }
+
+class FakePlayer:
+    """
+    Playback state on a simulated clock. `time_scale` > 1 fast-forwards playback.
+    Tracks play back to back; queued tracks play before the filler catalog.
+    """
+    def __init__(self, track_duration_ms: int | None = None, time_scale: float = 1.0, playing: bool = True, clock=time.monotonic):
+        self.track_duration_ms = track_duration_ms
+        self.time_scale = time_scale
+        self.is_playing = playing
+        self._clock = clock
+        self._filler = (f"filler{i}" for i in itertools.count())
+        self.queue: list[str] = []
+        self.current = make_track(next(self._filler), track_duration_ms)
+        self._started_at = clock()
+        self._paused_progress = 0
+
+    def _progress_ms(self) -> int:
+        if not self.is_playing:
+            return self._paused_progress
+        return int((self._clock() - self._started_at) * 1000 * self.time_scale)
+
+    def _advance(self):
+        """Move past every track whose simulated duration has elapsed."""
+        while self.is_playing and self._progress_ms() >= self.current["duration_ms"]:
+            overshoot_s = (self._progress_ms() - self.current["duration_ms"]) / 1000 / self.time_scale
+            self._start(self._next_track_id())
+            self._started_at = self._clock() - overshoot_s
+
+    def _next_track_id(self) -> str:
+        return self.queue.pop(0) if self.queue else next(self._filler)
+
+    def _start(self, track_id: str):
+        self.current = make_track(track_id, self.track_duration_ms)
+        self._started_at = self._clock()
+        self._paused_progress = 0
+
+    def currently_playing(self) -> dict | None:
+        self._advance()
+        if not self.is_playing:
+            return None
+        return {"is_playing": True, "progress_ms": self._progress_ms(), "item": self.current}
+
+    def upcoming(self, limit: int = 20) -> dict:
+        """Shaped like GET /v1/me/player/queue: the current track and the queued ones in play order."""
+        self._advance()
+        queue = [make_track(t, self.track_duration_ms) for t in self.queue[:limit]]
+        return {"currently_playing": self.current if self.is_playing else None, "queue": queue}
+
+    def add_to_queue(self, track_id: str):
+        self._advance()
+        self.queue.append(track_id)
+
+    def skip(self):
+        self._advance()
+        self._start(self._next_track_id())
+
+    def set_playing(self, playing: bool):
+        self._advance()
+        if playing and not self.is_playing:
+            self._started_at = self._clock() - self._paused_progress / 1000 / self.time_scale
+        elif not playing and self.is_playing:
+            self._paused_progress = self._progress_ms()
+        self.is_playing = playing
+
+class FakeSpotify:
+    """
+    Emulates the token, currently-playing, search, track lookup, player queue,
+    queue add and next endpoints, with configurable latency, 429 injection and
+    error rates.
+    """
+    def __init__(
+        self,
+        latency: LatencyModel | None = None,
+        rate_limit_rate: float = 0.0,
+        retry_after: int = 1,
+        error_rate: float = 0.0,
+        player: FakePlayer | None = None,
+        seed: int | None = None,
+    ):
+        self._rng = random.Random(seed)
+        self.latency = latency or LatencyModel(rng=self._rng)
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.error_rate = error_rate
+        self.player = player or FakePlayer()
+        self._tokens = itertools.count(1)
+        self.requests: dict[str, int] = {}
+        self.rate_limited = 0
+        self.errors = 0
+        self.connections = 0
+        self._server = None
+
+    async def handle(self, request) -> HttpResponse:
+        self.requests[request.path] = self.requests.get(request.path, 0) + 1
+        delay = self.latency.sample()
+        if delay:
+            await asyncio.sleep(delay)
+        if self.rate_limit_rate and self._rng.random() < self.rate_limit_rate:
+            self.rate_limited += 1
+            return HttpResponse(429, {"error": {"status": 429, "message": "API rate limit exceeded"}},
+                                headers={"Retry-After": str(self.retry_after)})
+        if self.error_rate and self._rng.random() < self.error_rate:
+            self.errors += 1
+            return HttpResponse(500, {"error": {"status": 500, "message": "Server error"}})
+        if request.path == "/api/token" and request.method == "POST":
+            return self._token(request)
+        if not request.headers.get("authorization", "").startswith("Bearer "):
+            return HttpResponse(401, {"error": {"status": 401, "message": "No token provided"}})
+        match (request.method, request.path):
+            case ("GET", "/v1/me/player/currently-playing"):
+                info = self.player.currently_playing()
+                return HttpResponse(200, info) if info else HttpResponse(204)
+            case ("GET", "/v1/search"):
+                return HttpResponse(200, self._search(request.query.get("q", ""), int(request.query.get("limit", 5))))
+            case ("GET", "/v1/tracks"):
+                ids = [t for t in request.query.get("ids", "").split(",") if t]
+                return HttpResponse(200, {"tracks": [make_track(t) for t in ids[:50]]})
+            case ("GET", "/v1/me/player/queue"):
+                return HttpResponse(200, self.player.upcoming())
+            case ("POST", "/v1/me/player/queue"):
+                uri = request.query.get("uri", "")
+                if not uri.startswith("spotify:track:"):
+                    return HttpResponse(400, {"error": {"status": 400, "message": "Invalid uri"}})
+                self.player.add_to_queue(uri.removeprefix("spotify:track:"))
+                return HttpResponse(200)
+            case ("POST", "/v1/me/player/next"):
+                self.player.skip()
+                return HttpResponse(200)
+        return HttpResponse(404, {"error": {"status": 404, "message": "Not found"}})
+
+    def _token(self, request) -> HttpResponse:
+        form = request.form()
+        if form.get("grant_type") not in ("authorization_code", "refresh_token", "client_credentials"):
+            return HttpResponse(400, {"error": "unsupported_grant_type"})
+        return HttpResponse(200, {
+            "access_token": f"fake-access-{next(self._tokens)}",
+            "token_type": "Bearer",
+            "expires_in": 3600,
+            "refresh_token": "fake-refresh",
+            "scope": "user-modify-playback-state user-read-currently-playing user-read-playback-state",
+        })
+
+    def _search(self, query: str, limit: int) -> dict:
+        base = hashlib.sha1(query.casefold().encode()).hexdigest()[:10]
+        return {"tracks": {"items": [make_track(f"{base}{i}") for i in range(min(limit, 50))]}}
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> str:
+        """Start serving; returns the base URL to pass to settings.override_spotify_urls."""
+        self._server = await start_http_server(self.handle, host, port, on_connect=self._count_connection)
+        sock_host, sock_port = self._server.sockets[0].getsockname()[:2]
+        return f"http://{sock_host}:{sock_port}"
+
+    def _count_connection(self):
+        # accepted TCP connections, to observe keep-alive reuse
+        self.connections += 1
+
+    async def stop(self):
+        if self._server is not None:
+            await self._server.close()
+            self._server = None
+
+    def stats(self) -> dict:
+        return {
+            "requests": dict(self.requests),
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "connections": self.connections,
+        }
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Spotify API for offline load testing")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9090)
+    parser.add_argument("--latency", choices=LatencyModel.KINDS, default="none", help="Latency distribution")
+    parser.add_argument("--latency-ms", type=float, default=50, help="Fixed/mean/median latency in ms")
+    parser.add_argument("--latency-spread-ms", type=float, default=25, help="Half-width for uniform latency")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="Sigma for lognormal latency")
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Fraction of requests answered with 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After seconds on injected 429s")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of requests answered with 500")
+    parser.add_argument("--track-ms", type=int, default=None, help="Fixed duration for every track")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Playback speed of the simulated clock")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    fake = FakeSpotify(
+        latency=LatencyModel(args.latency, args.latency_ms, args.latency_spread_ms, args.latency_sigma, rng=rng),
+        rate_limit_rate=args.rate_limit,
+        retry_after=args.retry_after,
+        error_rate=args.error_rate,
+        player=FakePlayer(track_duration_ms=args.track_ms, time_scale=args.time_scale),
+        seed=args.seed,
+    )
+
+    async def serve():
+        base_url = await fake.start(args.host, args.port)
+        print(f"Fake Spotify listening on {base_url}")
+        print(f"Run the server with SPOTIFY_API_URL={base_url} SPOTIFY_ACCOUNTS_URL={base_url}")
+        await asyncio.Event().wait()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Websocket load generator for the CrowdTraQ server.
+
+    python -m app.tools.loadgen --clients 200 --duration 30 --output bench.json
+
+By default it runs in-process: it starts a fake Spotify (see fake_spotify.py),
+serves app.main.client_connector on an ephemeral port and points N simulated
+guests at it. Pass --url to drive an already running server instead.
+Results are written as JSON so runs can be compared across commits.
+"""
+import argparse, asyncio, json, logging, os, random, resource, subprocess, sys, time
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+
+logger = logging.getLogger("app.tools.loadgen")
+
+DEFAULT_MIX = "search=5,add_track=1,like_track=3,dislike_track=1,refresh=2"
+MUTATING_ACTIONS = {"add_track", "like_track", "dislike_track"}
+# A client gives up on a reply after this long instead of waiting forever
+RESPONSE_TIMEOUT_S = 30
+SEARCH_TERMS = ["daft punk", "beyonce", "queen", "dua lipa", "abba", "prince", "lizzo", "the weeknd"]
+
+def parse_mix(spec: str) -> dict[str, float]:
+    """Parse 'search=5,refresh=2' into action weights."""
+    mix = {}
+    for part in spec.split(","):
+        action, _, weight = part.partition("=")
+        mix[action.strip()] = float(weight or 1)
+    if not mix or sum(mix.values()) <= 0:
+        raise ValueError(f"Invalid action mix '{spec}'")
+    return mix
+
+def percentile(sorted_values: list[float], pct: float) -> float | None:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return None
+    rank = max(int(round(pct / 100 * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+def summarize(samples: list[float]) -> dict:
+    values = sorted(samples)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 50),
+        "p95_ms": percentile(values, 95),
+        "p99_ms": percentile(values, 99),
+        "max_ms": values[-1] if values else None,
+        "mean_ms": sum(values) / len(values) if values else None,
+    }
+
+def rss_bytes() -> int | None:
+    """Current resident set size of this process."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # ru_maxrss is a high-water mark in KiB on Linux; good enough off Linux
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def is_broadcast(message) -> bool:
+    """Server pushes (state updates and events) rather than a reply to our own action."""
+    if not isinstance(message, dict):
+        return False
+    if "event" in message:
+        return True
+    return "queue_length" in message and "success" not in message and "sessionId" not in message
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+        self.fanout: list[float] = []
+        self.messages_sent = 0
+        self.messages_received = 0
+        self.connect_failures = 0
+        self.last_mutation_at = None
+
+    def record(self, action: str, latency_ms: float, ok: bool):
+        self.latencies.setdefault(action, []).append(latency_ms)
+        if not ok:
+            self.errors[action] = self.errors.get(action, 0) + 1
+
+def build_message(action: str, rng: random.Random) -> dict:
+    match action:
+        case "search":
+            return {"action": "search", "data": {"query": rng.choice(SEARCH_TERMS)}}
+        case "add_track":
+            return {"action": "add_track", "data": {"track_id": f"load{rng.randrange(10_000)}"}}
+    return {"action": action}
+
+async def run_client(url: str, mix: dict[str, float], deadline: float, think_s: float, stats: LoadStats, rng: random.Random, hello: dict | None = None):
+    actions, weights = list(mix), list(mix.values())
+    responses: asyncio.Queue = asyncio.Queue()
+    closed = object()
+
+    async def reader(ws):
+        try:
+            async for raw in ws:
+                stats.messages_received += 1
+                message = json.loads(raw)
+                if is_broadcast(message):
+                    # approximate: attributed to the most recent mutating action anywhere in the run
+                    if stats.last_mutation_at is not None:
+                        stats.fanout.append((time.perf_counter() - stats.last_mutation_at) * 1000)
+                else:
+                    responses.put_nowait(message)
+        finally:
+            # wake the sender if the server went away
+            responses.put_nowait(closed)
+
+    async def next_response():
+        message = await asyncio.wait_for(responses.get(), RESPONSE_TIMEOUT_S)
+        if message is closed:
+            raise ConnectionError("server closed the connection")
+        return message
+
+    try:
+        async with connect(url, open_timeout=30, max_queue=None) as ws:
+            started = time.perf_counter()
+            await ws.send(json.dumps(hello or {}))
+            stats.messages_sent += 1
+            reader_task = asyncio.create_task(reader(ws))
+            init = await next_response()
+            stats.record("hello", (time.perf_counter() - started) * 1000, isinstance(init, dict) and "sessionId" in init)
+
+            while time.perf_counter() < deadline:
+                action = rng.choices(actions, weights)[0]
+                sent_at = time.perf_counter()
+                if action in MUTATING_ACTIONS:
+                    stats.last_mutation_at = sent_at
+                await ws.send(json.dumps(build_message(action, rng)))
+                stats.messages_sent += 1
+                response = await next_response()
+                ok = isinstance(response, dict) and response.get("success", True) is not False
+                stats.record(action, (time.perf_counter() - sent_at) * 1000, ok)
+                if think_s:
+                    await asyncio.sleep(rng.uniform(0, 2 * think_s))
+            reader_task.cancel()
+    except (OSError, asyncio.TimeoutError, ConnectionClosed) as e:
+        stats.connect_failures += 1
+        logger.debug(f"Client failed: {e}")
+
+def room_code(i: int, rooms: int) -> str:
+    return f"LOAD{i % rooms:02d}"
+
+async def start_in_process_server(latency_ms: float, rate_limit: float, rooms: int = 1):
+    """Fake Spotify + app.main websocket server on ephemeral ports. Returns (url, cleanup)."""
+    from websockets.asyncio.server import serve
+    from app.config import settings
+    from app.services.spotify_manager import SpotifyConnectionManager
+    from app.tools.fake_spotify import FakeSpotify, LatencyModel
+    import app.main as server
+
+    logging.getLogger("app").setLevel(logging.WARNING)
+    fake = FakeSpotify(latency=LatencyModel("lognormal" if latency_ms else "none", latency_ms), rate_limit_rate=rate_limit)
+    settings.override_spotify_urls(await fake.start())
+    token_info = {"access_token": "load", "refresh_token": "load", "expires_at": time.time() + 3600}
+    SpotifyConnectionManager.get_async_instance().connection.load_token_info(token_info)
+    ws_server = await serve(server.client_connector, "127.0.0.1", 0, max_queue=None)
+    # only the default room opens on demand; the others are opened as a host would,
+    # each with its own (here: fake) Spotify account
+    for i in range(rooms if rooms > 1 else 0):
+        room = server.room_manager.open_room(room_code(i, rooms))
+        room.client_handler._spotify_connection.connection.load_token_info(token_info)
+    server.room_manager.start_polling()
+    port = ws_server.sockets[0].getsockname()[1]
+
+    async def cleanup():
+        server.room_manager.close_all()
+        ws_server.close()
+        await ws_server.wait_closed()
+        await fake.stop()
+
+    return f"ws://127.0.0.1:{port}", cleanup
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+async def run_load(clients: int, duration: float, mix: dict[str, float], think_ms: float = 100,
+                   url: str | None = None, ramp_s: float = 1.0, latency_ms: float = 0, rate_limit: float = 0,
+                   seed: int | None = None, rooms: int = 1, host_key: str | None = None) -> dict:
+    stats = LoadStats()
+    rng = random.Random(seed)
+    cleanup = None
+    in_process = url is None
+    rss_before = rss_bytes()
+    if in_process:
+        url, cleanup = await start_in_process_server(latency_ms, rate_limit, rooms)
+        rss_before = rss_bytes()
+
+    started = time.perf_counter()
+    deadline = started + ramp_s + duration
+    tasks = []
+    for i in range(clients):
+        # with one room, send no code so clients land in the server's default room;
+        # a running server only admits other codes once a host (the host key) opened them
+        hello = {"roomCode": room_code(i, rooms)} if rooms > 1 else None
+        if hello and host_key:
+            hello["hostKey"] = host_key
+        tasks.append(asyncio.create_task(
+            run_client(url, mix, deadline, think_ms / 1000, stats, random.Random(rng.random()), hello)
+        ))
+        if ramp_s:
+            await asyncio.sleep(ramp_s / clients)
+    rss_connected = rss_bytes()
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    if cleanup:
+        await cleanup()
+
+    connected = clients - stats.connect_failures
+    return {
+        "commit": git_commit(),
+        "timestamp": time.time(),
+        "params": {
+            "clients": clients,
+            "rooms": rooms,
+            "duration_s": duration,
+            "mix": mix,
+            "think_ms": think_ms,
+            "mode": "in-process" if in_process else "external",
+            "url": url,
+            "spotify_latency_ms": latency_ms,
+            "spotify_rate_limit": rate_limit,
+        },
+        "elapsed_s": elapsed,
+        "connected": connected,
+        "connect_failures": stats.connect_failures,
+        "actions": {
+            action: {**summarize(samples), "errors": stats.errors.get(action, 0)}
+            for action, samples in stats.latencies.items()
+        },
+        "broadcast_fanout": summarize(stats.fanout),
+        "messages_per_second": (stats.messages_sent + stats.messages_received) / elapsed if elapsed else 0,
+        "messages_sent": stats.messages_sent,
+        "messages_received": stats.messages_received,
+        # in-process runs include the server; external runs measure client memory only
+        "rss_per_connection_bytes": (rss_connected - rss_before) / connected if connected and rss_before and rss_connected else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Websocket load generator for CrowdTraQ")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10, help="Seconds of steady load after ramp-up")
+    parser.add_argument("--rooms", type=int, default=1, help="Spread clients over this many room codes")
+    parser.add_argument("--host-key", default=os.getenv("ROOM_HOST_KEY"), help="Open the --rooms on a running server (its ROOM_HOST_KEY; each room needs tokens-<CODE>.json there)")
+    parser.add_argument("--ramp", type=float, default=1.0, help="Seconds over which clients connect")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"Action weights (default: {DEFAULT_MIX})")
+    parser.add_argument("--think-ms", type=float, default=100, help="Mean pause between a client's actions")
+    parser.add_argument("--url", default=None, help="Target a running server instead of an in-process one")
+    parser.add_argument("--spotify-latency-ms", type=float, default=0, help="Median fake Spotify latency (in-process)")
+    parser.add_argument("--spotify-rate-limit", type=float, default=0, help="Fraction of fake Spotify calls answered 429")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Write JSON results here (default: stdout)")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_load(
+        args.clients, args.duration, parse_mix(args.mix), args.think_ms, args.url, args.ramp,
+        args.spotify_latency_ms, args.spotify_rate_limit, args.seed, args.rooms, args.host_key,
+    ))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    else:
+        sys.stdout.write(output + "\n")
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import MagicMock
+from unittest.mock import AsyncMock
 from app.services.currency_manager import CurrencyManager
 from app.services.queue_manager import SongQueue, SongFeedback
 from app.services.identity_manager import IdentityManager
@@ -26,7 +26,7 @@ def patch_spotify_connection_manager(monkeypatch):
         def __init__(self, status_code=200):
             self.status_code = status_code
 
-    fake_conn = MagicMock()
+    fake_conn = AsyncMock()
     fake_conn.token_info = {"access_token": "fake-token"}
     fake_conn.credentials = {"access_token": "fake-token"}
     fake_conn._spotify_user_token = "fake-token"
@@ -59,4 +59,4 @@ def patch_spotify_connection_manager(monkeypatch):
     }
 
     # Patch all modules that use the singleton
-    monkeypatch.setattr("app.handlers.client_handler.SpotifyConnectionManager.get_instance", lambda: fake_conn)
\ No newline at end of file
+    monkeypatch.setattr("app.handlers.client_handler.SpotifyConnectionManager.get_async_instance", lambda: fake_conn)
\ No newline at end of file
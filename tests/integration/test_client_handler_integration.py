@@ -12,7 +12,7 @@ async def test_message_handler_add_track(currency_manager, song_queue, song_feed
     currency_manager.add_tokens(client_id, 10)
 
     message = {"action": "add_track", "data": {"track_id": "t123"}}
-    response = handler.message_handler(message, client_id)
+    response = await handler.message_handler(message, client_id)
 
     assert response["success"] is True
     assert song_queue.peek_first()["track_id"] == "t123"
@@ -28,13 +28,13 @@ async def test_message_handler_vote_track(currency_manager, song_queue, song_fee
     song_feedback.set_current_track("t999")
 
     message = {"action": "like_track"}
-    response = handler.message_handler(message, client_id)
+    response = await handler.message_handler(message, client_id)
 
     assert response["success"] is True
     assert song_feedback.get_vote(client_id) == "like"
 
     message = {"action": "dislike_track"}
-    response = handler.message_handler(message, client_id)
+    response = await handler.message_handler(message, client_id)
 
     assert response["success"] is True
     assert song_feedback.get_vote(client_id) == "dislike"
@@ -47,7 +47,7 @@ async def test_add_track_missing_id(currency_manager):
     currency_manager.add_tokens(client_id, 10)
 
     message = {"action": "add_track", "data": {}}
-    response = handler.message_handler(message, client_id)
+    response = await handler.message_handler(message, client_id)
 
     assert response["success"] is False
     assert response["error"]["code"] == "INVALID_TRACK_ID"
\ No newline at end of file
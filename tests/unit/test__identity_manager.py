@@ -41,6 +41,7 @@ async def test_send_to_calls_ws_send():
     payload = {"msg": "hello"}
 
     await im.send_to(sid, payload)
+    await im.drain()
 
     fake_ws.send.assert_awaited_once_with('{"msg": "hello"}')
 
@@ -61,6 +62,7 @@ async def test_broadcast_sends_to_all():
 
     payload = {"msg": "broadcast"}
     await im.broadcast(payload)
+    await im.drain()
 
     ws1.send.assert_awaited_once_with('{"msg": "broadcast"}')
     ws2.send.assert_awaited_once_with('{"msg": "broadcast"}')
@@ -77,5 +79,120 @@ async def test_broadcast_handles_exception():
     payload = {"msg": "broadcast"}
     # Should not raise even though ws1.send fails
     await im.broadcast(payload)
+    await im.drain()
 
-    ws2.send.assert_awaited_once()
\ No newline at end of file
+    ws2.send.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_broadcast_does_not_wait_for_slow_client():
+    im = IdentityManager()
+    stalled = asyncio.Event()
+
+    async def never_finishes(data):
+        await stalled.wait()
+
+    slow = AsyncMock()
+    slow.send.side_effect = never_finishes
+    fast = AsyncMock()
+    im.register(slow, "slow")
+    im.register(fast, "fast")
+
+    await asyncio.wait_for(im.broadcast({"msg": "hi"}), timeout=1)
+    await asyncio.wait_for(im._outboxes["fast"].drain(), timeout=1)
+
+    fast.send.assert_awaited_once_with('{"msg": "hi"}')
+    assert im.stats()["last_recipients"] == 2
+
+@pytest.mark.asyncio
+async def test_slow_client_is_evicted_and_unregistered():
+    im = IdentityManager(outbox_size=2)
+    stalled = asyncio.Event()
+
+    async def never_finishes(data):
+        await stalled.wait()
+
+    slow = AsyncMock()
+    slow.send.side_effect = never_finishes
+    im.register(slow, "slow")
+
+    for i in range(4):
+        await im.broadcast({"event": "reward", "n": i})
+        await asyncio.sleep(0)
+
+    assert "slow" not in im.all_session_ids()
+    assert im.stats()["evictions"] == 1
+    slow.close.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_state_broadcasts_supersede_queued_ones():
+    im = IdentityManager()
+    stalled = asyncio.Event()
+    sent = []
+
+    async def blocked_send(data):
+        await stalled.wait()
+        sent.append(data)
+
+    ws = AsyncMock()
+    ws.send.side_effect = blocked_send
+    im.register(ws, "sid")
+
+    await im.broadcast({"queue_length": 1}, kind="queue_state")
+    await asyncio.sleep(0)  # writer picks up the first update and blocks on it
+    for n in (2, 3, 4):
+        await im.broadcast({"queue_length": n}, kind="queue_state")
+    assert im.stats()["max_queue_depth"] == 1
+
+    stalled.set()
+    await im.drain()
+    assert sent == ['{"queue_length": 1}', '{"queue_length": 4}']
+    assert im.stats()["superseded"] == 2
+
+@pytest.mark.asyncio
+async def test_unregister_stops_outbox():
+    im = IdentityManager()
+    ws = AsyncMock()
+    sid = im.register(ws)
+    im.unregister(sid)
+    await im.send_to(sid, {"msg": "late"})
+    await im.broadcast({"msg": "late"})
+    ws.send.assert_not_awaited()
+
+def test_session_for_reverse_lookup_and_prune():
+    im = IdentityManager()
+    ws1, ws2 = object(), object()
+    im.register(ws1, "a")
+    im.register(ws2, "b")
+    assert im.session_for(ws1) == "a"
+
+    im.prune(ws1)
+    assert im.get_websocket("a") is None
+    assert im.session_for(ws1) is None
+    assert im.all_session_ids() == ["b"]
+    im.prune(ws1)  # already gone: no-op
+
+def test_stale_socket_cannot_unregister_reconnected_session():
+    im = IdentityManager()
+    old, new = object(), object()
+    im.register(old, "sid")
+    im.register(new, "sid")
+
+    assert im.session_for(old) is None
+    im.unregister("sid", old)
+    assert im.get_websocket("sid") is new
+    im.unregister("sid", new)
+    assert im.get_websocket("sid") is None
+
+@pytest.mark.asyncio
+async def test_failed_send_prunes_session():
+    im = IdentityManager()
+    ws = AsyncMock()
+    ws.send.side_effect = ConnectionError("gone")
+    im.register(ws, "sid")
+
+    await im.broadcast({"msg": "hi"})
+    await im.drain()
+
+    assert im.get_websocket("sid") is None
+    assert im.session_for(ws) is None
+    assert im.stats()["failed_sends"] == 1
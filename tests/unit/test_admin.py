@@ -16,6 +16,12 @@ def test_authorize_prints_url(mock_mgr, capsys):
     assert "Go to this URL" in out
 
 
+@patch("app.admin.SpotifyConnectionManager")
+def test_authorize_room_passes_its_code_as_state(mock_mgr):
+    admin.authorize("abcd")
+    mock_mgr.get_instance.return_value.get_authorization_url.assert_called_once_with(state="ABCD")
+
+
 # --- refresh() ---
 @patch("app.admin.SpotifyConnectionManager")
 def test_refresh_with_tokens_file(mock_mgr, tmp_path, capsys):
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from app.handlers.client_handler import ClientHandler
 
 # --- Constructor & Queue Length ---
@@ -24,97 +24,107 @@ def test_error_returns_expected_dict():
 
 # --- message_handler validation ---
 
-def test_message_handler_rejects_non_dict():
+@pytest.mark.asyncio
+async def test_message_handler_rejects_non_dict():
     handler = ClientHandler(MagicMock())
-    result = handler.message_handler("not a dict", "client1")
+    result = await handler.message_handler("not a dict", "client1")
     assert result["error"]["code"] != ""  # should be GENERAL_ERROR
 
-def test_message_handler_rejects_missing_action():
+@pytest.mark.asyncio
+async def test_message_handler_rejects_missing_action():
     handler = ClientHandler(MagicMock())
-    result = handler.message_handler({}, "client1")
+    result = await handler.message_handler({}, "client1")
     assert result["error"]["code"] != ""  # should be UNKNOWN_ACTION
 
-def test_message_handler_rejects_unknown_action():
+@pytest.mark.asyncio
+async def test_message_handler_rejects_unknown_action():
     handler = ClientHandler(MagicMock())
-    result = handler.message_handler({"action": "bogus"}, "client1")
+    result = await handler.message_handler({"action": "bogus"}, "client1")
     assert result["success"] == False
 
 # --- add_track flow ---
 
-def test_add_track_missing_track_id():
+@pytest.mark.asyncio
+async def test_add_track_missing_track_id():
     handler = ClientHandler(MagicMock())
-    result = handler.message_handler({"action": "add_track", "data": {}}, "client1")
+    result = await handler.message_handler({"action": "add_track", "data": {}}, "client1")
     assert result["error"]["code"] != ""  # should be INVALID_TRACK_ID
 
-def test_add_track_insufficient_tokens():
+@pytest.mark.asyncio
+async def test_add_track_insufficient_tokens():
     fake_currency = MagicMock()
     fake_currency.try_spend.return_value = (False, 5)
     fake_currency.calculate_cost.return_value = 10
 
     handler = ClientHandler(fake_currency)
-    handler._spotify_connection = MagicMock()
+    handler._spotify_connection = AsyncMock()
 
-    result = handler.message_handler({"action": "add_track", "data": {"track_id": "abc"}}, "client1")
+    result = await handler.message_handler({"action": "add_track", "data": {"track_id": "abc"}}, "client1")
     assert result["error"]["code"] != ""  # should be QUEUE_INSUFFICIENT_TOKENS
 
-def test_add_track_success():
+@pytest.mark.asyncio
+async def test_add_track_success():
     fake_currency = MagicMock()
     fake_currency.try_spend.return_value = (True, 8)
 
     # Create a fake spotify connection that won't touch tokens
-    fake_spotify = MagicMock()
+    fake_spotify = AsyncMock()
     fake_response = MagicMock()
     fake_response.status_code = 200
     fake_spotify.add_track_by_id.return_value = fake_response
 
-    with patch("app.handlers.client_handler.SpotifyConnectionManager.get_instance", return_value=fake_spotify):
+    with patch("app.handlers.client_handler.SpotifyConnectionManager.get_async_instance", return_value=fake_spotify):
         handler = ClientHandler(fake_currency)
 
         # If code re-fetches the connection in message_handler, this patch ensures it still returns fake_spotify
         handler._songQueue.add = MagicMock()
 
-        result = handler.message_handler({"action": "add_track", "data": {"track_id": "abc"}}, "client1")
+        result = await handler.message_handler({"action": "add_track", "data": {"track_id": "abc"}}, "client1")
 
     assert result["success"] is True
     handler._songQueue.add.assert_called_once_with("abc", "client1")
-    fake_spotify.add_track_by_id.assert_called_once_with("abc")
+    fake_spotify.add_track_by_id.assert_awaited_once_with("abc")
 
 
 # --- like/dislike track ---
 
-def test_like_track_calls_feedback():
+@pytest.mark.asyncio
+async def test_like_track_calls_feedback():
     handler = ClientHandler(MagicMock())
     handler.song_feedback.like = MagicMock()
-    handler.check_currently_playing = MagicMock(return_value={"success": True})
+    handler.check_currently_playing = AsyncMock(return_value={"success": True})
 
-    result = handler.message_handler({"action": "like_track"}, "client1")
+    result = await handler.message_handler({"action": "like_track"}, "client1")
     handler.song_feedback.like.assert_called_once_with("client1")
     assert result == {"success": True}
 
-def test_dislike_track_calls_feedback():
+@pytest.mark.asyncio
+async def test_dislike_track_calls_feedback():
     handler = ClientHandler(MagicMock())
     handler.song_feedback.dislike = MagicMock()
-    handler.check_currently_playing = MagicMock(return_value={"success": True})
+    handler.check_currently_playing = AsyncMock(return_value={"success": True})
 
-    result = handler.message_handler({"action": "dislike_track"}, "client1")
+    result = await handler.message_handler({"action": "dislike_track"}, "client1")
     handler.song_feedback.dislike.assert_called_once_with("client1")
     assert result == {"success": True}
 
 # --- check_currently_playing ---
 
-def test_check_currently_playing_no_track():
+@pytest.mark.asyncio
+async def test_check_currently_playing_no_track():
     handler = ClientHandler(MagicMock())
-    handler._spotify_connection = MagicMock()
+    handler._spotify_connection = AsyncMock()
     handler._spotify_connection.get_currently_playing.return_value = None
 
-    result = handler.check_currently_playing()
+    result = await handler.check_currently_playing()
     assert result["error"]["code"] != ""  # should be NO_TRACK_PLAYING
 
 # --- clean_currently_playing ---
 
-def test_clean_currently_playing_formats_data():
+@pytest.mark.asyncio
+async def test_clean_currently_playing_formats_data():
     handler = ClientHandler(MagicMock())
-    handler._spotify_connection = MagicMock()
+    handler._spotify_connection = AsyncMock()
     handler._spotify_connection.get_currently_playing.return_value = {
         "item": {
             "name": "Song A",
@@ -128,15 +138,16 @@ def test_clean_currently_playing_formats_data():
         "is_playing": True,
     }
 
-    result = handler.clean_currently_playing()
+    result = await handler.clean_currently_playing()
     assert result["currently_playing"]["track_name"] == "Song A"
     assert result["currently_playing"]["artists"] == ["Artist A"]
 
 # --- search_song ---
 
-def test_search_song_returns_formatted_data():
+@pytest.mark.asyncio
+async def test_search_song_returns_formatted_data():
     handler = ClientHandler(MagicMock())
-    handler._spotify_connection = MagicMock()
+    handler._spotify_connection = AsyncMock()
     handler._spotify_connection.search_songs.return_value = {
         "tracks": {
             "items": [
@@ -150,6 +161,53 @@ def test_search_song_returns_formatted_data():
         }
     }
 
-    result = handler.search_song("Song A")
+    result = await handler.search_song("Song A")
     assert result["search_data"][0]["track_name"] == "Song A"
-    assert result["search_data"][0]["artists"] == ["Artist A"]
\ No newline at end of file
+    assert result["search_data"][0]["artists"] == ["Artist A"]
+@pytest.mark.asyncio
+async def test_search_song_uses_cache_for_repeated_queries():
+    handler = ClientHandler(MagicMock())
+    handler._spotify_connection = AsyncMock()
+    handler._spotify_connection.search_songs.return_value = {"tracks": {"items": []}}
+
+    await handler.search_song("Song A")
+    await handler.search_song("  song a")
+
+    handler._spotify_connection.search_songs.assert_awaited_once_with("song a")
+
+# --- get_queue ---
+
+@pytest.mark.asyncio
+async def test_get_queue_returns_metadata_and_ownership():
+    handler = ClientHandler(MagicMock())
+    handler._spotify_connection = AsyncMock()
+    handler._spotify_connection.get_tracks.return_value = {"tracks": [
+        {"id": "t2", "name": "Song B", "artists": [{"name": "Artist B"}], "album": {"images": [{"url": "b.jpg"}]}, "duration_ms": 2000},
+    ]}
+    handler.track_metadata.seed([
+        {"id": "t1", "name": "Song A", "artists": [{"name": "Artist A"}], "album": {"images": [{"url": "a.jpg"}]}, "duration_ms": 1000},
+    ])
+    handler._songQueue.add("t1", "client1")
+    handler._songQueue.add("t2", "client2")
+
+    result = await handler.get_upcoming_queue("client1")
+
+    assert [e["track_name"] for e in result["queue"]] == ["Song A", "Song B"]
+    assert [e["mine"] for e in result["queue"]] == [True, False]
+    handler._spotify_connection.get_tracks.assert_awaited_once_with(["t2"])
+
+@pytest.mark.asyncio
+async def test_get_queue_pages():
+    handler = ClientHandler(MagicMock())
+    handler.track_metadata.seed([
+        {"id": f"t{i}", "name": f"Song {i}", "artists": [], "album": {"images": [{"url": "x.jpg"}]}, "duration_ms": 1000}
+        for i in range(4)
+    ])
+    for i in range(4):
+        handler._songQueue.add(f"t{i}", "client1")
+
+    result = await handler.message_handler({"action": "get_queue", "data": {"offset": 1, "limit": 2}}, "client1")
+
+    assert [e["track_id"] for e in result["queue"]] == ["t1", "t2"]
+    assert result["offset"] == 1
+    assert result["total"] == 4
@@ -0,0 +1,68 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from app.services.client_outbox import ClientOutbox, SLOW_CONSUMER_CLOSE_CODE
+
+@pytest.mark.asyncio
+async def test_messages_are_sent_in_order():
+    ws = AsyncMock()
+    outbox = ClientOutbox(ws, max_size=10)
+    for i in range(3):
+        assert outbox.put(f"m{i}")
+    await outbox.drain()
+    assert [c.args[0] for c in ws.send.await_args_list] == ["m0", "m1", "m2"]
+    assert outbox.sent == 3
+
+@pytest.mark.asyncio
+async def test_overflow_evicts_and_closes_socket():
+    stalled = asyncio.Event()
+
+    async def never_finishes(data):
+        await stalled.wait()
+
+    ws = AsyncMock()
+    ws.send.side_effect = never_finishes
+    on_evict = MagicMock()
+    outbox = ClientOutbox(ws, max_size=2, on_evict=on_evict)
+
+    assert outbox.put("a")
+    await asyncio.sleep(0)  # "a" is now in flight
+    assert outbox.put("b")
+    assert outbox.put("c")
+    assert not outbox.put("d")
+    await asyncio.sleep(0)
+
+    assert outbox.evicted and outbox.closed
+    assert len(outbox) == 0
+    on_evict.assert_called_once()
+    ws.close.assert_awaited_once_with(code=SLOW_CONSUMER_CLOSE_CODE, reason="Client too slow")
+    assert not outbox.put("e")
+
+@pytest.mark.asyncio
+async def test_superseding_keeps_state_from_filling_the_queue():
+    stalled = asyncio.Event()
+
+    async def blocked(data):
+        await stalled.wait()
+
+    ws = AsyncMock()
+    ws.send.side_effect = blocked
+    outbox = ClientOutbox(ws, max_size=2)
+    for n in range(20):
+        assert outbox.put(f"state{n}", kind="queue_state")
+    assert not outbox.evicted
+    assert len(outbox) == 1
+    stalled.set()
+    await outbox.drain()
+
+@pytest.mark.asyncio
+async def test_send_failure_closes_outbox():
+    ws = AsyncMock()
+    ws.send.side_effect = ConnectionError("gone")
+    outbox = ClientOutbox(ws)
+    outbox.put("a")
+    outbox.put("b")
+    await outbox.drain()
+    assert outbox.closed
+    assert outbox.failed == 1
+    assert not outbox.evicted
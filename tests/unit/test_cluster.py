@@ -0,0 +1,150 @@
+import pytest
+import json
+import signal
+import socket
+import asyncio
+import multiprocessing
+import time
+from unittest.mock import AsyncMock, MagicMock
+from websockets.asyncio.client import connect
+from websockets.exceptions import ConnectionClosed
+from app.config import settings
+from app.core.cluster import ClusterNode
+from app.tools.fake_spotify import FakeSpotify
+from app.services.spotify_manager import SpotifyConnectionManager
+
+@pytest.fixture
+def spotify(monkeypatch):
+    connection = MagicMock()
+    connection.get_currently_playing = AsyncMock(return_value=None)
+    connection.add_track_by_id = AsyncMock(return_value=MagicMock(status_code=200))
+    monkeypatch.setattr(SpotifyConnectionManager, "get_async_instance", staticmethod(lambda: connection))
+    return connection
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+async def start_node(cluster_port, name, on_leader=None):
+    node = ClusterNode(ws_host="127.0.0.1", ws_port=0, cluster_host="127.0.0.1", cluster_port=cluster_port, on_leader=on_leader, name=name)
+    stop = asyncio.Event()
+    task = asyncio.create_task(node.run(stop))
+    await asyncio.wait_for(node.ready.wait(), 2)
+    return node, stop, task
+
+async def recv_until(ws, predicate):
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), 2))
+        if predicate(message):
+            return message
+
+@pytest.mark.asyncio
+async def test_one_leader_handles_spotify_for_every_node(spotify):
+    cluster_port = free_port()
+    on_leader = MagicMock(return_value=None)
+    a, stop_a, task_a = await start_node(cluster_port, "a", on_leader)
+    b, stop_b, task_b = await start_node(cluster_port, "b", on_leader)
+    try:
+        assert a.is_leader and not b.is_leader
+        on_leader.assert_called_once_with(a.coordinator)
+
+        async with connect(f"ws://127.0.0.1:{a.port}") as alice, connect(f"ws://127.0.0.1:{b.port}") as bob:
+            await alice.send(json.dumps({}))
+            await recv_until(alice, lambda m: "sessionId" in m)
+            await bob.send(json.dumps({}))
+            await recv_until(bob, lambda m: "sessionId" in m)
+
+            # a follower's client mutates state through the leader, and everyone sees it
+            await bob.send(json.dumps({"action": "add_track", "data": {"track_id": "t1"}}))
+            assert (await recv_until(bob, lambda m: "success" in m))["success"] is True
+            await recv_until(alice, lambda m: m.get("queue_length") == 1)
+            spotify.add_track_by_id.assert_awaited_once_with("t1")
+            assert a.coordinator.stats()["members"] == 2
+    finally:
+        stop_a.set()
+        stop_b.set()
+        await asyncio.gather(task_a, task_b)
+
+@pytest.mark.asyncio
+async def test_follower_takes_over_when_leader_stops(spotify):
+    cluster_port = free_port()
+    a, stop_a, task_a = await start_node(cluster_port, "a")
+    b, stop_b, task_b = await start_node(cluster_port, "b")
+    try:
+        async with connect(f"ws://127.0.0.1:{b.port}") as bob:
+            await bob.send(json.dumps({}))
+            await recv_until(bob, lambda m: "sessionId" in m)
+            stop_a.set()
+            await task_a
+            # clients are told to reconnect while the follower is elected
+            await asyncio.wait_for(bob.wait_closed(), 2)
+            assert bob.close_code == 1012
+
+        for _ in range(100):
+            if b.is_leader and b.ready.is_set():
+                break
+            await asyncio.sleep(0.02)
+        assert b.is_leader
+        async with connect(f"ws://127.0.0.1:{b.port}") as bob:
+            await bob.send(json.dumps({}))
+            assert "sessionId" in await recv_until(bob, lambda m: "sessionId" in m)
+    finally:
+        stop_a.set()
+        stop_b.set()
+        await asyncio.gather(task_a, task_b)
+
+def run_node_process(ws_port, cluster_port, name, spotify_url):
+    """Process entry point: one ClusterNode against a fake Spotify, stopped by SIGTERM."""
+    settings.override_spotify_urls(spotify_url)
+    SpotifyConnectionManager.get_async_instance().connection.load_token_info(
+        {"access_token": "test", "refresh_token": "test", "expires_at": time.time() + 3600}
+    )
+
+    async def serve():
+        stop = asyncio.Event()
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, stop.set)
+        node = ClusterNode(ws_host="127.0.0.1", ws_port=ws_port, cluster_host="127.0.0.1", cluster_port=cluster_port, name=name)
+        await node.run(stop)
+    asyncio.run(serve())
+
+async def join(port, timeout=10):
+    """Say hello to the node on `port` until it answers with a session (it may be electing a leader)."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while True:
+        try:
+            async with connect(f"ws://127.0.0.1:{port}") as ws:
+                await ws.send(json.dumps({}))
+                return await recv_until(ws, lambda m: "sessionId" in m)
+        except (OSError, asyncio.TimeoutError, ConnectionClosed):
+            if loop.time() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+
+@pytest.mark.asyncio
+async def test_follower_process_takes_over_when_leader_process_dies():
+    # separate processes, spawned the way WorkerPool starts its workers
+    context = multiprocessing.get_context("spawn")
+    fake = FakeSpotify()
+    spotify_url = await fake.start()
+    cluster_port, port_a, port_b = free_port(), free_port(), free_port()
+    a = context.Process(target=run_node_process, args=(port_a, cluster_port, "a", spotify_url), daemon=True)
+    b = context.Process(target=run_node_process, args=(port_b, cluster_port, "b", spotify_url), daemon=True)
+    try:
+        a.start()
+        await join(port_a)  # a is serving, so it won the election
+        b.start()
+        await join(port_b)
+
+        a.kill()  # no clean step-down: the leader just disappears
+        await asyncio.to_thread(a.join, 5)
+        # b can only serve again once it became the leader itself
+        assert "sessionId" in await join(port_b)
+        assert b.is_alive()
+    finally:
+        for process in (a, b):
+            if process.is_alive():
+                process.terminate()
+            await asyncio.to_thread(process.join, 5)
+        await fake.stop()
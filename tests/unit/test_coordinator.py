@@ -0,0 +1,172 @@
+import pytest
+import pytest_asyncio
+import json
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+from app.services.coordinator import ClusterMembers, Coordinator, RemoteSocket
+from app.services.room_manager import RoomManager
+from app.services.spotify_manager import SpotifyConnectionManager
+import time
+from app.core.worker import WorkerNode, WorkerPool
+from app.core.relay import RelayLink
+
+@pytest.fixture
+def spotify(monkeypatch):
+    connection = MagicMock()
+    connection.get_currently_playing = AsyncMock(return_value=None)
+    connection.add_track_by_id = AsyncMock(return_value=MagicMock(status_code=200))
+    monkeypatch.setattr(SpotifyConnectionManager, "get_async_instance", staticmethod(lambda: connection))
+    return connection
+
+@pytest_asyncio.fixture
+async def cluster(tmp_path, spotify):
+    path = str(tmp_path / "coordinator.sock")
+    coordinator = await Coordinator(RoomManager(default_code="MAIN", members_factory=ClusterMembers)).start(path=path)
+    nodes, servers, urls = [], [], []
+    for i in range(2):
+        node = await WorkerNode(path=path, name=f"worker-{i}").connect()
+        server = await serve(node.client_connector, "127.0.0.1", 0)
+        nodes.append(node)
+        servers.append(server)
+        urls.append(f"ws://127.0.0.1:{server.sockets[0].getsockname()[1]}")
+    yield coordinator, nodes, urls
+    for server in servers:
+        server.close()
+        await server.wait_closed()
+    for node in nodes:
+        await node.close()
+    await coordinator.close()
+
+async def recv_until(ws, predicate):
+    while True:
+        message = json.loads(await asyncio.wait_for(ws.recv(), 2))
+        if predicate(message):
+            return message
+
+@pytest.mark.asyncio
+async def test_cluster_members_forward_one_broadcast_per_worker():
+    links = [MagicMock(), MagicMock()]
+    members = ClusterMembers("ROOM")
+    a = members.register(RemoteSocket(links[0], 1))
+    members.register(RemoteSocket(links[0], 2))
+    members.register(RemoteSocket(links[1], 1))
+
+    await members.broadcast({"queue_length": 1}, kind="queue_state")
+    assert links[0].send.call_count == 1
+    assert links[1].send.call_count == 1
+
+    await members.send_to(a, {"success": True})
+    links[0].send.assert_called_with({"type": "send", "room": "ROOM", "session": a, "payload": {"success": True}})
+
+    members.prune_link(links[0])
+    assert members.stats() == {"clients": 1, "workers": 1, "broadcasts": 1}
+
+@pytest.mark.asyncio
+async def test_hello_reply_and_broadcast_cross_workers(cluster):
+    coordinator, nodes, urls = cluster
+    async with connect(urls[0]) as alice, connect(urls[1]) as bob:
+        await alice.send(json.dumps({}))
+        init = await recv_until(alice, lambda m: "sessionId" in m)
+        assert init["roomCode"] == "MAIN"
+        assert init["tokens"] == 5
+        await bob.send(json.dumps({"roomCode": "MAIN"}))
+        await recv_until(bob, lambda m: "sessionId" in m)
+        assert coordinator.stats()["members"] == 2
+
+        await alice.send(json.dumps({"action": "add_track", "data": {"track_id": "t1"}}))
+        reply = await recv_until(alice, lambda m: "success" in m)
+        assert reply["success"] is True
+        # the state change reaches the member on the other worker
+        state = await recv_until(bob, lambda m: m.get("queue_length") == 1)
+        assert "stateVersion" in state
+
+    for _ in range(50):
+        if coordinator.stats()["members"] == 0:
+            break
+        await asyncio.sleep(0.02)
+    assert coordinator.stats()["members"] == 0
+    assert nodes[0].stats()["clients"] == 0
+
+@pytest.mark.asyncio
+async def test_invalid_room_code_is_rejected(cluster):
+    coordinator, nodes, urls = cluster
+    async with connect(urls[0]) as ws:
+        await ws.send(json.dumps({"roomCode": "no!"}))
+        reply = json.loads(await asyncio.wait_for(ws.recv(), 2))
+    assert reply["error"]["code"] == "INVALID_ROOM_CODE"
+    assert coordinator.stats()["rooms"] == 0
+
+@pytest.mark.asyncio
+async def test_workers_drop_clients_when_coordinator_goes_away(cluster):
+    coordinator, nodes, urls = cluster
+    async with connect(urls[0]) as ws:
+        await ws.send(json.dumps({}))
+        await recv_until(ws, lambda m: "sessionId" in m)
+        await coordinator.close()
+        await asyncio.wait_for(nodes[0].closed.wait(), 2)
+        await asyncio.wait_for(ws.wait_closed(), 2)
+        assert ws.close_code == 1012
+
+@pytest.mark.asyncio
+async def test_failed_join_closes_the_client(cluster, spotify):
+    coordinator, nodes, urls = cluster
+    spotify.get_currently_playing.side_effect = RuntimeError("spotify down")
+    async with connect(urls[0]) as ws:
+        await ws.send(json.dumps({}))
+        await asyncio.wait_for(ws.wait_closed(), 2)
+        assert ws.close_code == 1011
+
+class StuckProcess:
+    """Ignores SIGTERM: join waits out its whole timeout."""
+    def __init__(self, name):
+        self.name = name
+        self.killed = False
+
+    def terminate(self):
+        pass
+
+    def join(self, timeout=None):
+        if not self.killed:
+            time.sleep(timeout)
+
+    def is_alive(self):
+        return not self.killed
+
+    def kill(self):
+        self.killed = True
+
+def test_worker_pool_stop_waits_once_for_all_workers():
+    pool = WorkerPool(3, "unused.sock", "127.0.0.1", 0)
+    pool._processes = {i: StuckProcess(f"worker-{i}") for i in range(3)}
+
+    started = time.monotonic()
+    pool.stop(timeout=0.2)
+    # one shared deadline, not 0.2s per worker
+    assert time.monotonic() - started < 0.4
+    assert all(process.killed for process in pool._processes.values())
+
+@pytest.mark.asyncio
+async def test_relay_link_drops_a_peer_that_stops_reading():
+    done = asyncio.Event()
+
+    async def on_peer(reader, writer):
+        # reads nothing, so everything sent to it backs up
+        await done.wait()
+        writer.close()
+
+    server = await asyncio.start_server(on_peer, "127.0.0.1", 0)
+    reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname())
+    link = RelayLink(reader, writer, name="stuck", high_water=1_000_000)
+
+    payload = "x" * 10_000
+    for _ in range(1_000):
+        link.send({"type": "send", "payload": payload})
+        if link.closed:
+            break
+    assert link.closed
+    assert link.sent < 1_000
+    done.set()
+    server.close()
+    await server.wait_closed()
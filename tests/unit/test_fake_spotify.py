@@ -0,0 +1,119 @@
+import pytest
+import asyncio
+from app.config import settings
+from app.core.spotify_client import SpotifyConnection, RateLimitedError
+from app.tools.fake_spotify import FakeSpotify, FakePlayer, LatencyModel
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def point_api_at(monkeypatch):
+    def _point(base_url):
+        for name, url in settings.build_api(base_url, base_url).items():
+            monkeypatch.setitem(settings.api, name, url)
+    return _point
+
+def make_connection():
+    conn = SpotifyConnection()
+    conn.load_token_info({"access_token": "tok", "refresh_token": "ref", "expires_at": 9999999999})
+    return conn
+
+# --- Latency model ---
+
+def test_latency_model_kinds():
+    assert LatencyModel("none").sample() == 0
+    assert LatencyModel("fixed", mean_ms=20).sample() == pytest.approx(0.02)
+    samples = [LatencyModel("uniform", mean_ms=50, spread_ms=10).sample() for _ in range(50)]
+    assert all(0.04 <= s <= 0.06 for s in samples)
+    with pytest.raises(ValueError):
+        LatencyModel("gaussian")
+
+# --- Simulated player ---
+
+def test_player_advances_to_queued_track_on_simulated_clock():
+    clock = FakeClock()
+    player = FakePlayer(track_duration_ms=10_000, clock=clock)
+    player.add_to_queue("mine")
+
+    clock.now = 4
+    assert player.currently_playing()["progress_ms"] == 4000
+    clock.now = 11
+    info = player.currently_playing()
+    assert info["item"]["id"] == "mine"
+    assert info["progress_ms"] == 1000
+
+def test_player_skip_and_pause():
+    clock = FakeClock()
+    player = FakePlayer(track_duration_ms=10_000, clock=clock)
+    first = player.currently_playing()["item"]["id"]
+    player.skip()
+    assert player.currently_playing()["item"]["id"] != first
+
+    player.set_playing(False)
+    assert player.currently_playing() is None
+
+# --- HTTP endpoints through the real client ---
+
+@pytest.mark.asyncio
+async def test_client_round_trip_against_fake(point_api_at):
+    fake = FakeSpotify()
+    point_api_at(await fake.start())
+    conn = make_connection()
+
+    current = await asyncio.to_thread(conn.get_currently_playing)
+    assert current["is_playing"] is True
+
+    results = await asyncio.to_thread(conn.search_songs, "daft punk", limit=3)
+    assert len(results["tracks"]["items"]) == 3
+
+    response = await asyncio.to_thread(conn.add_track_by_id, "abc")
+    assert response.status_code == 200
+    assert fake.player.queue == ["abc"]
+    player_queue = await asyncio.to_thread(conn.get_player_queue)
+    assert [t["id"] for t in player_queue["queue"]] == ["abc"]
+
+    tracks = await asyncio.to_thread(conn.get_tracks, ["a", "b"])
+    assert [t["id"] for t in tracks["tracks"]] == ["a", "b"]
+
+    await asyncio.to_thread(conn.skip_track)
+    assert fake.player.currently_playing()["item"]["id"] == "abc"
+
+    await asyncio.to_thread(conn.refresh_access_token)
+    assert conn.token_info["access_token"].startswith("fake-access-")
+
+    # every call above reused one pooled keep-alive connection
+    assert fake.stats()["connections"] == 1
+    conn.close()
+    await fake.stop()
+
+@pytest.mark.asyncio
+async def test_fake_injects_rate_limits(point_api_at):
+    fake = FakeSpotify(rate_limit_rate=1.0, retry_after=3)
+    point_api_at(await fake.start())
+    conn = make_connection()
+
+    with pytest.raises(RateLimitedError) as exc:
+        await asyncio.to_thread(conn.search_songs, "x")
+    assert exc.value.retry_after == 3
+    conn.close()
+    await fake.stop()
+
+@pytest.mark.asyncio
+async def test_fake_injects_errors_and_latency(point_api_at):
+    fake = FakeSpotify(error_rate=1.0, latency=LatencyModel("fixed", mean_ms=50))
+    point_api_at(await fake.start())
+    conn = make_connection()
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    with pytest.raises(Exception, match="500"):
+        await asyncio.to_thread(conn.get_currently_playing)
+    assert loop.time() - start >= 0.05
+    assert fake.stats()["errors"] == 1
+    conn.close()
+    await fake.stop()
@@ -0,0 +1,80 @@
+import pytest
+import json
+import asyncio
+from unittest.mock import AsyncMock
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+from app.core.hot_restart import HandoffServer, decode_state, encode_state, take_over
+from app.services.room_manager import RoomManager
+
+async def echo(websocket):
+    async for message in websocket:
+        await websocket.send(message)
+
+def test_state_round_trips_compactly():
+    state = {"rooms": {"ABCD": {"balances": {f"s{i}": 5 for i in range(100)}}}}
+    payload = encode_state(state)
+    assert decode_state(payload) == state
+    assert len(payload) < len(json.dumps(state))
+
+@pytest.mark.asyncio
+async def test_successor_takes_over_socket_and_state(tmp_path):
+    path = str(tmp_path / "handoff.sock")
+    old = await serve(echo, "127.0.0.1", 0)
+    port = old.sockets[0].getsockname()[1]
+    prepare = AsyncMock(return_value={"rooms": {"ABCD": {"balances": {"alice": 3}}}})
+    handoff = HandoffServer(path, old, prepare).start()
+
+    takeover = await asyncio.to_thread(take_over, path)
+    assert takeover.state == {"rooms": {"ABCD": {"balances": {"alice": 3}}}}
+    new = await serve(echo, sock=takeover.sock)
+    takeover.ready()
+    await asyncio.wait_for(handoff.done.wait(), 2)
+    assert handoff.handed_off
+    prepare.assert_awaited_once()
+    handoff.close()
+
+    # same port, now served by the successor
+    async with connect(f"ws://127.0.0.1:{port}") as ws:
+        await ws.send("hi")
+        assert await ws.recv() == "hi"
+    new.close()
+    await new.wait_closed()
+
+@pytest.mark.asyncio
+async def test_failed_successor_leaves_a_spare_socket(tmp_path):
+    path = str(tmp_path / "handoff.sock")
+    old = await serve(echo, "127.0.0.1", 0)
+    handoff = HandoffServer(path, old, AsyncMock(return_value={}), timeout=1).start()
+
+    takeover = await asyncio.to_thread(take_over, path)
+    takeover._conn.close()  # dies before READY
+    takeover.sock.close()
+    await asyncio.wait_for(handoff.done.wait(), 2)
+    assert not handoff.handed_off
+    assert handoff.spare is not None
+    handoff.spare.close()
+    handoff.close()
+
+def test_take_over_without_a_running_server(tmp_path):
+    assert take_over(str(tmp_path / "missing.sock")) is None
+
+def test_handoff_state_keeps_room_state_epoch_and_playback():
+    rooms = RoomManager(default_code="MAIN")
+    room = rooms.open_room("ABCD")
+    room.currency_manager.register_client("alice")
+    room.client_handler._songQueue.add("t1", "alice")
+    room.state_publisher.room_state.update(queue_length=1)
+    room.playback_manager.last_track_id = "t0"
+
+    successor = RoomManager(default_code="ZZZZ")
+    successor.restore(decode_state(encode_state(rooms.handoff_state())), [])
+    restored = successor.get("ABCD")
+    assert successor.default_code == "MAIN"
+    assert restored.currency_manager.get_balance("alice") == 5
+    assert restored.client_handler.get_queue_length() == 1
+    assert restored.playback_manager.last_track_id == "t0"
+    state = restored.state_publisher.room_state
+    assert (state.epoch, state.version) == (room.state_publisher.room_state.epoch, 1)
+    # a client that saw version 1 before the restart gets an empty delta
+    assert state.delta_since(state.epoch, 1) == ({}, False)
@@ -0,0 +1,69 @@
+import pytest
+import asyncio
+import json
+from unittest.mock import AsyncMock, patch
+from app.core.http_server import HttpRequest, start_http_server
+from app.routes.http_routes import build_handler
+
+async def get(handler, target):
+    return await handler(HttpRequest("GET", target, {}))
+
+@pytest.mark.asyncio
+async def test_callback_missing_code():
+    response = await get(build_handler(), "/callback")
+    assert response.status == 400
+    assert b"Missing authorization code" in response.body
+
+@pytest.mark.asyncio
+@patch("app.routes.http_routes.SpotifyConnectionManager")
+async def test_callback_with_code_exchanges_it_off_the_loop(mock_mgr):
+    exchange = mock_mgr.get_async_instance.return_value.exchange_code_for_token = AsyncMock()
+
+    response = await get(build_handler(), "/callback?code=fakecode")
+
+    exchange.assert_awaited_once_with("fakecode")
+    assert response.status == 200
+    assert b"Authorization successful" in response.body
+
+@pytest.mark.asyncio
+async def test_healthz_fails_when_a_check_fails():
+    checks = {"websocket": True}
+    handler = build_handler(health=lambda: dict(checks))
+    response = await get(handler, "/healthz")
+    assert (response.status, json.loads(response.body)) == (200, {"ok": True, "websocket": True})
+
+    checks["websocket"] = False
+    assert (await get(handler, "/healthz")).status == 503
+
+@pytest.mark.asyncio
+async def test_metrics_and_unknown_paths_over_http():
+    handler = build_handler(metrics=lambda: {"rooms": {"rooms": 2}})
+    server = await start_http_server(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(b"GET /metrics HTTP/1.1\r\nHost: x\r\n\r\nGET /nope HTTP/1.1\r\nHost: x\r\nConnection: close\r\n\r\n")
+    raw = await reader.read()
+    writer.close()
+    await server.close()
+
+    first, second = raw.split(b"HTTP/1.1 ")[1:]
+    assert first.startswith(b"200") and first.endswith(b'{"rooms": {"rooms": 2}}')
+    assert second.startswith(b"404")
+
+@pytest.mark.asyncio
+@patch("app.routes.http_routes.SpotifyConnectionManager")
+async def test_callback_with_room_state_authorizes_that_rooms_account(mock_mgr):
+    mock_mgr.has_room_instance.return_value = False
+    exchange = mock_mgr.get_room_instance.return_value.exchange_code_for_token = AsyncMock()
+
+    response = await get(build_handler(), "/callback?code=fakecode&state=abcd")
+
+    assert response.status == 200
+    mock_mgr.get_room_instance.assert_called_once_with("ABCD")
+    exchange.assert_awaited_once_with("fakecode")
+    # the room is not open; it loads the saved tokens when it opens
+    mock_mgr.release_room_instance.assert_called_once_with("ABCD")
+    mock_mgr.get_async_instance.assert_not_called()
+
+    assert (await get(build_handler(), "/callback?code=fakecode&state=../x")).status == 400
@@ -1,6 +1,8 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 import string
+import subprocess
+import sys
 
 from app.core.init_app import (
     SpotifyConnectionThread,
@@ -9,9 +11,14 @@ from app.core.init_app import (
     establish_spotify_connection,
 )
 
+def test_importing_the_server_does_not_import_flask():
+    code = "import sys, app.main; print('flask' in sys.modules)"
+    result = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == "False"
+
 # --- SpotifyConnectionThread ---
 
-@patch("app.core.init_app.make_server")
+@patch("werkzeug.serving.make_server")
 def test_spotify_thread_init_sets_server(mock_make_server):
     mock_server = MagicMock()
     mock_make_server.return_value = mock_server
@@ -20,7 +27,8 @@ def test_spotify_thread_init_sets_server(mock_make_server):
     assert thread.server is mock_server
     assert thread.context is not None
 
-def test_spotify_thread_shutdown_calls_server_shutdown():
+@patch("werkzeug.serving.make_server")
+def test_spotify_thread_shutdown_calls_server_shutdown(mock_make_server):
     thread = SpotifyConnectionThread()
     thread.server = MagicMock()
     thread.shutdown()
@@ -38,39 +46,50 @@ def test_generate_room_code_uppercase_only():
 
 # --- start_spotify_integration ---
 
-@patch("app.core.init_app.SpotifyConnectionThread")
+@pytest.mark.asyncio
+@patch("app.core.init_app.start_http_server", new_callable=AsyncMock)
 @patch("app.core.init_app.SpotifyConnectionManager")
-def test_start_spotify_integration_no_tokens(mock_mgr_cls, mock_thread_cls):
-    mock_thread = MagicMock()
-    mock_thread_cls.return_value = mock_thread
-
+async def test_start_spotify_integration_no_tokens(mock_mgr_cls, mock_start_http_server):
     mock_mgr_instance = MagicMock()
     mock_mgr_instance.load_tokens.return_value = False
     mock_mgr_cls.get_instance.return_value = mock_mgr_instance
+    handler = AsyncMock()
 
-    flask_thread, spotify_client_thread = start_spotify_integration()
+    stop, spotify_connection = await start_spotify_integration(handler)
 
-    mock_thread.start.assert_called_once()
-    assert flask_thread is mock_thread
-    assert spotify_client_thread is None
+    mock_start_http_server.assert_awaited_once()
+    assert mock_start_http_server.await_args.args[0] is handler
+    assert stop is mock_start_http_server.return_value.close
+    assert spotify_connection is None
 
-@patch("app.core.init_app.SpotifyConnectionThread")
+@pytest.mark.asyncio
+@patch("app.core.init_app.start_http_server", new_callable=AsyncMock)
 @patch("app.core.init_app.SpotifyConnectionManager")
-def test_start_spotify_integration_with_tokens(mock_mgr_cls, mock_thread_cls):
-    mock_flask_thread = MagicMock()
-    mock_client_thread = MagicMock()
-    mock_thread_cls.side_effect = [mock_flask_thread, mock_client_thread]
-
+async def test_start_spotify_integration_with_tokens(mock_mgr_cls, mock_start_http_server):
     mock_mgr_instance = MagicMock()
     mock_mgr_instance.load_tokens.return_value = True
     mock_mgr_cls.get_instance.return_value = mock_mgr_instance
 
-    flask_thread, spotify_client_thread = start_spotify_integration()
+    _, spotify_connection = await start_spotify_integration(AsyncMock())
+
+    # one callback server; a second one would try to bind the same port
+    mock_start_http_server.assert_awaited_once()
+    assert spotify_connection is mock_mgr_instance
+
+@pytest.mark.asyncio
+@patch("app.core.init_app.start_http_server", new_callable=AsyncMock)
+@patch("app.core.init_app.SpotifyConnectionThread")
+@patch("app.core.init_app.SpotifyConnectionManager")
+async def test_flask_callback_is_opt_in(mock_mgr_cls, mock_thread_cls, mock_start_http_server, monkeypatch):
+    monkeypatch.setattr("app.core.init_app.settings.FLASK_CALLBACK", True)
+    mock_mgr_cls.get_instance.return_value.load_tokens.return_value = False
+
+    stop, _ = await start_spotify_integration(AsyncMock())
 
-    assert mock_flask_thread.start.called
-    assert mock_client_thread.start.called
-    assert flask_thread is mock_flask_thread
-    assert spotify_client_thread is mock_client_thread
+    mock_start_http_server.assert_not_awaited()
+    mock_thread_cls.return_value.start.assert_called_once()
+    await stop()
+    mock_thread_cls.return_value.shutdown.assert_called_once()
 
 # --- establish_spotify_connection ---
 
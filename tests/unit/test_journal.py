@@ -0,0 +1,118 @@
+import pytest
+import os
+from app.services.journal import Journal
+from app.services.room_manager import RoomManager
+
+@pytest.mark.asyncio
+async def test_appends_are_group_committed_and_replayed(tmp_path):
+    journal = Journal(str(tmp_path), commit_interval=0.01).start()
+    for i in range(100):
+        journal.append("ROOM", "balance", session=f"s{i}", tokens=i)
+    await journal.commit()
+    assert journal.stats()["commits"] == 1
+    assert journal.stats()["max_batch"] == 100
+    await journal.close()
+
+    snapshot, records = Journal(str(tmp_path)).load()
+    assert snapshot is None
+    assert [r["seq"] for r in records] == list(range(1, 101))
+    assert records[-1] == {"seq": 100, "room": "ROOM", "op": "balance", "session": "s99", "tokens": 99}
+
+@pytest.mark.asyncio
+async def test_snapshot_compacts_the_log(tmp_path):
+    state = {"n": 0}
+    journal = Journal(str(tmp_path), commit_interval=0, snapshot_every=3).start(snapshot_source=lambda: dict(state))
+    for i in range(3):
+        state["n"] = i + 1
+        journal.append(None, "step", n=i + 1)
+    await journal.commit()
+    assert journal.stats()["snapshots"] == 1
+    assert os.path.getsize(journal.log_path) == 0
+
+    journal.append(None, "step", n=4)
+    await journal.close()
+
+    reloaded = Journal(str(tmp_path))
+    snapshot, records = reloaded.load()
+    assert snapshot == {"n": 3}
+    assert records == [{"seq": 4, "room": None, "op": "step", "n": 4}]
+    assert reloaded.seq == 4
+
+def test_load_ignores_a_torn_last_record(tmp_path):
+    with open(tmp_path / Journal.LOG_NAME, "wb") as f:
+        f.write(b'{"seq":1,"room":"A","op":"track","track_id":"t1"}\n{"seq":2,"ro')
+    snapshot, records = Journal(str(tmp_path)).load()
+    assert [r["seq"] for r in records] == [1]
+
+def test_load_skips_records_of_a_retried_batch(tmp_path):
+    # the first commit wrote seq 1-2 but its fsync failed, so the retry wrote them again
+    with open(tmp_path / Journal.LOG_NAME, "wb") as f:
+        for seq in [1, 2, 1, 2, 3]:
+            f.write(b'{"seq":%d,"room":"A","op":"queue_add","track_id":"t%d","owner":"s"}\n' % (seq, seq))
+    journal = Journal(str(tmp_path))
+    snapshot, records = journal.load()
+    assert [r["seq"] for r in records] == [1, 2, 3]
+    assert journal.seq == 3
+
+def test_failed_write_is_rolled_back(tmp_path, monkeypatch):
+    journal = Journal(str(tmp_path))
+    journal._file = open(journal.log_path, "ab")
+    journal._write([b'{"seq":1}\n'], None)
+
+    def fail(fd):
+        raise OSError("disk full")
+    monkeypatch.setattr(os, "fsync", fail)
+    with pytest.raises(OSError):
+        journal._write([b'{"seq":2}\n'], None)
+    journal._file.close()
+    assert (tmp_path / Journal.LOG_NAME).read_bytes() == b'{"seq":1}\n'
+
+@pytest.mark.asyncio
+async def test_rooms_survive_a_restart(tmp_path):
+    rooms = RoomManager(default_code="MAIN")
+    journal = await rooms.run_journal(Journal(str(tmp_path), commit_interval=0))
+    room = rooms.open_room("ABCD")
+    room.currency_manager.register_client("alice")
+    room.currency_manager.register_client("bob")
+    assert room.currency_manager.try_spend("alice", 1)[0]
+    room.client_handler._songQueue.add("t1", "alice")
+    room.client_handler._songQueue.add("t2", "bob")
+    room.client_handler._songQueue.remove_first("t1")
+    room.client_handler.song_feedback.set_current_track("t1")
+    room.client_handler.song_feedback.like("bob")
+    rooms.close_all()
+    await journal.close()
+
+    restored = RoomManager(default_code="ZZZZ")
+    await (await restored.run_journal(Journal(str(tmp_path)))).close()
+    room = restored.get("ABCD")
+    assert restored.default_code == "MAIN"
+    assert room.currency_manager.get_balance("alice") == 2
+    assert room.currency_manager.get_balance("bob") == 5
+    assert room.client_handler._songQueue.as_list() == [{"track_id": "t2", "owner": "bob"}]
+    assert room.client_handler.song_feedback.get_vote("bob") == "like"
+    assert room.client_handler.song_feedback.likes == 1
+
+@pytest.mark.asyncio
+async def test_resume_after_a_failed_handoff_keeps_later_changes(tmp_path):
+    old = RoomManager(default_code="MAIN")
+    journal = await old.run_journal(Journal(str(tmp_path), commit_interval=0))
+    room = old.get_or_create(None)
+    room.currency_manager.register_client("alice")
+    # prepare_handoff flushes and closes the journal
+    await journal.close()
+
+    # the successor replays the handed-over state, compacts it, then dies before READY
+    successor = RoomManager(default_code="ZZZZ")
+    await (await successor.run_journal(Journal(str(tmp_path), commit_interval=0), old.handoff_state())).close()
+    successor.close_all()
+
+    await journal.resume(snapshot_source=old.snapshot)
+    assert room.currency_manager.try_spend("alice", 1)[0]
+    await journal.close()
+
+    restored = RoomManager(default_code="YYYY")
+    await (await restored.run_journal(Journal(str(tmp_path)))).close()
+    assert restored.get("MAIN").currency_manager.get_balance("alice") == room.currency_manager.get_balance("alice")
+    restored.close_all()
+    old.close_all()
@@ -0,0 +1,72 @@
+import pytest
+import asyncio
+import time
+from websockets.asyncio.client import connect
+from websockets.asyncio.server import serve
+from app.core.lifecycle import Lifecycle, drain, GOING_AWAY_CLOSE_CODE
+
+@pytest.mark.asyncio
+async def test_stops_in_reverse_start_order_and_times_each():
+    lifecycle = Lifecycle()
+    events = []
+
+    async def stop_async():
+        events.append("stop websocket server")
+
+    assert await lifecycle.start("callback server", lambda: events.append("start callback server") or "thread", lambda: events.append("stop callback server")) == "thread"
+    await lifecycle.start("websocket server", lambda: events.append("start websocket server"), stop_async)
+    await lifecycle.start("poller", lambda: events.append("start poller"), lambda: events.append("stop poller"))
+    # a returned task keeps running; start does not wait for it
+    task = await lifecycle.start("evictor", lambda: asyncio.create_task(asyncio.sleep(10)), lambda: task.cancel())
+    assert not task.done()
+
+    timings = await lifecycle.stop(1)
+    assert events == [
+        "start callback server", "start websocket server", "start poller",
+        "stop poller", "stop websocket server", "stop callback server",
+    ]
+    assert list(timings) == ["evictor", "poller", "websocket server", "callback server"]
+    assert task.cancelled() or task.cancelling()
+    assert lifecycle.stats()["running"] == []
+
+@pytest.mark.asyncio
+async def test_a_stuck_component_cannot_hold_up_shutdown():
+    lifecycle = Lifecycle(min_stop=0.05)
+    stopped = []
+
+    async def close_rooms():
+        await asyncio.sleep(0.01)  # e.g. the journal's final fsync
+        stopped.append("rooms")
+
+    await lifecycle.start("rooms", lambda: None, close_rooms)
+    await lifecycle.start("callback server", lambda: None, lambda: stopped.append("callback server"))
+    await lifecycle.start("stuck", lambda: None, lambda: asyncio.sleep(10))
+    await lifecycle.start("broken", lambda: None, lambda: 1 / 0)
+
+    started = time.monotonic()
+    await lifecycle.stop(0.1)
+    assert time.monotonic() - started < 0.5
+    # the stuck one used up the deadline, yet everything after it still stopped
+    assert stopped == ["callback server", "rooms"]
+    assert set(lifecycle.stop_ms) == {"broken", "stuck", "callback server", "rooms"}
+
+@pytest.mark.asyncio
+async def test_drain_closes_clients_and_drops_unresponsive_ones():
+    async def handler(websocket):
+        await websocket.wait_closed()
+
+    server = await serve(handler, "127.0.0.1", 0)
+    port = server.sockets[0].getsockname()[1]
+    polite = await connect(f"ws://127.0.0.1:{port}")
+    # never reads, so it never answers the close frame
+    stuck = await connect(f"ws://127.0.0.1:{port}", close_timeout=10)
+    stuck.protocol.receive_data = lambda data: None
+    await asyncio.sleep(0.05)
+
+    started = time.monotonic()
+    await drain(server, timeout=0.2)
+    assert time.monotonic() - started < 1
+    await polite.wait_closed()
+    assert polite.close_code == GOING_AWAY_CLOSE_CODE
+    assert not server.handlers or all(task.done() for task in server.handlers.values())
+    stuck.transport.abort()
@@ -0,0 +1,67 @@
+import asyncio
+import json
+import pytest
+from websockets.asyncio.server import serve
+
+from app.tools.loadgen import parse_mix, percentile, summarize, is_broadcast, run_load
+
+def test_parse_mix_weights_and_defaults():
+    assert parse_mix("search=5, refresh=2,like_track") == {"search": 5.0, "refresh": 2.0, "like_track": 1.0}
+    with pytest.raises(ValueError):
+        parse_mix("search=0")
+
+def test_percentile_nearest_rank():
+    values = sorted(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([], 50) is None
+    assert summarize([3, 1, 2])["max_ms"] == 3
+
+def test_is_broadcast_classification():
+    assert is_broadcast({"queue_length": 2, "cost": 1})
+    assert is_broadcast({"event": "reward", "amount": 2})
+    assert not is_broadcast({"success": True, "tokens": 4})
+    assert not is_broadcast({"sessionId": "abc", "queue_length": 0})
+    assert not is_broadcast(None)
+
+@pytest.mark.asyncio
+async def test_run_load_against_external_server():
+    async def handler(ws):
+        await ws.recv()
+        await ws.send(json.dumps({"sessionId": "s", "queue_length": 0}))
+        async for raw in ws:
+            message = json.loads(raw)
+            if message["action"] == "like_track":
+                await ws.send(json.dumps({"queue_length": 0, "cost": 1}))
+                await ws.send(json.dumps({"success": True}))
+            else:
+                await ws.send(json.dumps({"success": False, "error": {"code": "X"}}))
+
+    async with serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        results = await run_load(3, 0.3, {"like_track": 1, "search": 1}, think_ms=5,
+                                 url=f"ws://127.0.0.1:{port}", ramp_s=0, seed=1)
+
+    assert results["connected"] == 3
+    assert results["params"]["mode"] == "external"
+    assert results["actions"]["hello"]["count"] == 3
+    assert results["actions"]["like_track"]["errors"] == 0
+    assert results["actions"]["search"]["errors"] == results["actions"]["search"]["count"] > 0
+    assert results["broadcast_fanout"]["count"] == results["actions"]["like_track"]["count"]
+    assert results["messages_per_second"] > 0
+
+@pytest.mark.asyncio
+async def test_clients_give_up_when_the_server_hangs_up():
+    async def handler(ws):
+        await ws.recv()
+        await ws.send(json.dumps({"sessionId": "s", "queue_length": 0}))
+        await ws.recv()
+        # closes instead of answering the first action
+
+    async with serve(handler, "127.0.0.1", 0) as server:
+        port = server.sockets[0].getsockname()[1]
+        results = await asyncio.wait_for(run_load(2, 5, {"search": 1}, think_ms=0,
+                                                  url=f"ws://127.0.0.1:{port}", ramp_s=0, seed=1), 3)
+
+    assert results["connected"] == 0
+    assert results["actions"]["hello"]["count"] == 2
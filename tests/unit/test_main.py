@@ -3,38 +3,88 @@ import json
 import asyncio
 from unittest.mock import AsyncMock, MagicMock
 from app import main
-
-@pytest.mark.asyncio
-async def test_safe_send_calls_ws_send():
-    ws = AsyncMock()
-    payload = '{"msg": "hi"}'
-    await main.safe_send(ws, payload)
-    ws.send.assert_awaited_once_with(payload)
-
-def test_broadcast_queue_length_sends_and_prunes(monkeypatch):
-    # Fake client_handler with sync get_queue_length
-    fake_handler = MagicMock()
-    fake_handler.get_queue_length.return_value = 2
-    monkeypatch.setattr(main, "client_handler", fake_handler)
-
-    # Two websockets, one fails
-    ws1 = AsyncMock()
-    ws2 = AsyncMock()
-    ws1.send.side_effect = Exception("fail")
-    main.connected_clients.clear()
-    main.connected_clients["c1"] = ws1
-    main.connected_clients["c2"] = ws2
-
-    # Run broadcast
-    asyncio.run(main.broadcast_queue_length())
-
-    # ws2 should have been sent
-    ws2.send.assert_awaited_once()
-    # ws1 should be pruned
-    assert "c1" not in main.connected_clients
-    assert "c2" in main.connected_clients
+from app.services.room_manager import Room, RoomManager
 
 def test_handle_exit_sets_shutdown_event():
     main.shutdown_event.clear()
     main.handle_exit(None, None)
-    assert main.shutdown_event.is_set()
\ No newline at end of file
+    assert main.shutdown_event.is_set()
+
+class FakeWebsocket:
+    def __init__(self, hello):
+        self._hello = hello
+
+    async def recv(self):
+        return json.dumps(self._hello)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        raise StopAsyncIteration
+
+@pytest.mark.asyncio
+async def test_client_connector_routes_hello_to_room(monkeypatch):
+    rooms = RoomManager(default_code="MAIN")
+    monkeypatch.setattr(main, "room_manager", rooms)
+    handle = AsyncMock()
+    monkeypatch.setattr(Room, "handle_client", handle)
+
+    rooms.open_room("ABCD")
+    await main.client_connector(FakeWebsocket({"sessionId": "a", "roomCode": "abcd"}))
+    await main.client_connector(FakeWebsocket({"sessionId": "b"}))
+
+    assert [c.args[1]["sessionId"] for c in handle.await_args_list] == ["a", "b"]
+    assert rooms.get("ABCD") is not None and rooms.get("MAIN") is not None
+    assert rooms.stats()["rooms"] == 2
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("code", ["no!", "WXYZ"])
+async def test_client_connector_rejects_invalid_or_unknown_room_code(monkeypatch, code):
+    rooms = RoomManager(default_code="MAIN")
+    monkeypatch.setattr(main, "room_manager", rooms)
+    ws = FakeWebsocket({"roomCode": code})
+    ws.send = AsyncMock()
+
+    await main.client_connector(ws)
+
+    payload = json.loads(ws.send.await_args.args[0])
+    assert payload["error"]["code"] == main.settings.INVALID_ROOM_CODE
+    assert rooms.get("WXYZ") is None
+
+@pytest.mark.asyncio
+async def test_busy_callback_port_after_handoff_does_not_fail_the_takeover(monkeypatch):
+    monkeypatch.setattr(main, "start_spotify_integration", AsyncMock(side_effect=OSError("Address already in use")))
+    monkeypatch.setattr(main, "start_callback_server", AsyncMock(side_effect=OSError("Address already in use")))
+    spotify = MagicMock()
+    monkeypatch.setattr(main.SpotifyConnectionManager, "get_instance", MagicMock(return_value=spotify))
+
+    stop, connection = await main.start_spotify_integration_after_handoff(AsyncMock(), timeout=0)
+    assert connection is spotify
+    # the retry is still waiting for the port; stopping just cancels it
+    await stop()
+
+@pytest.mark.asyncio
+async def test_retry_callback_server_waits_for_the_port(monkeypatch):
+    stop_server = AsyncMock()
+    start = AsyncMock(side_effect=[OSError("Address already in use"), stop_server])
+    monkeypatch.setattr(main, "start_callback_server", start)
+
+    assert await main.retry_callback_server(AsyncMock(), interval=0) is stop_server
+    assert start.await_count == 2
+
+@pytest.mark.asyncio
+async def test_handoff_socket_only_with_hot_restart(monkeypatch, tmp_path):
+    path = tmp_path / "handoff.sock"
+    monkeypatch.setattr(main.settings, "HOST", "127.0.0.1")
+    monkeypatch.setitem(main.settings.ports, "WEBSOCKET_SERVER_PORT", 0)
+    monkeypatch.setattr(main.settings, "HOT_RESTART_SOCKET", str(path))
+
+    for hot_restart in (False, True):
+        monkeypatch.setattr(main.settings, "HOT_RESTART", hot_restart)
+        main.stop_serving.clear()
+        server_task = await main.serve_websockets()
+        await asyncio.sleep(0.05)
+        assert path.exists() == hot_restart
+        await main.stop_websockets(server_task)
+    main.stop_serving.clear()
@@ -0,0 +1,111 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock
+from app.services.now_playing import NowPlayingSnapshot, format_currently_playing
+
+class FakeClock:
+    def __init__(self):
+        self.now = 100.0
+
+    def __call__(self):
+        return self.now
+
+PLAYING = {
+    "is_playing": True,
+    "progress_ms": 1000,
+    "item": {
+        "id": "t1",
+        "name": "Song",
+        "artists": [{"name": "Artist"}],
+        "album": {"name": "Album", "images": [{"url": "img"}]},
+        "duration_ms": 10000,
+        "uri": "spotify:track:t1",
+    },
+}
+
+def test_format_currently_playing():
+    formatted = format_currently_playing(PLAYING)
+    assert formatted["track_name"] == "Song"
+    assert formatted["artists"] == ["Artist"]
+    assert formatted["album_art"] == "img"
+    assert format_currently_playing(None) is None
+
+def test_current_extrapolates_progress_between_polls():
+    clock = FakeClock()
+    snapshot = NowPlayingSnapshot(AsyncMock(), max_age=60, clock=clock)
+    snapshot.update(PLAYING)
+
+    clock.now += 2.5
+    assert snapshot.current()["progress_ms"] == 3500
+
+    clock.now += 30
+    assert snapshot.current()["progress_ms"] == 10000  # clamped to duration
+
+def test_paused_track_is_not_extrapolated():
+    clock = FakeClock()
+    snapshot = NowPlayingSnapshot(AsyncMock(), clock=clock)
+    snapshot.update({**PLAYING, "is_playing": False})
+    clock.now += 5
+    assert snapshot.current()["progress_ms"] == 1000
+
+def test_is_stale_after_max_age_or_predicted_track_end():
+    clock = FakeClock()
+    snapshot = NowPlayingSnapshot(AsyncMock(), max_age=60, clock=clock)
+    assert snapshot.is_stale()
+
+    snapshot.update(PLAYING)
+    assert not snapshot.is_stale()
+    clock.now += 9  # 1000ms + 9000ms reaches the 10000ms duration
+    assert snapshot.is_stale()
+
+    snapshot.update(None)
+    clock.now += 59
+    assert not snapshot.is_stale()
+    clock.now += 1
+    assert snapshot.is_stale()
+
+@pytest.mark.asyncio
+async def test_get_serves_fresh_snapshot_without_fetching():
+    fetch = AsyncMock(return_value=PLAYING)
+    snapshot = NowPlayingSnapshot(fetch)
+    snapshot.update(PLAYING)
+
+    assert (await snapshot.get())["item"]["id"] == "t1"
+    fetch.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_share_one_fetch():
+    release = asyncio.Event()
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return PLAYING
+
+    snapshot = NowPlayingSnapshot(fetch)
+    readers = [asyncio.create_task(snapshot.get()) for _ in range(200)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*readers)
+
+    assert calls == 1
+    assert all(r["item"]["id"] == "t1" for r in results)
+    assert snapshot.stats() == {"fetches": 1, "coalesced": 199}
+
+@pytest.mark.asyncio
+async def test_refresh_min_age_reuses_recent_fetch():
+    clock = FakeClock()
+    fetch = AsyncMock(return_value=PLAYING)
+    snapshot = NowPlayingSnapshot(fetch, clock=clock)
+
+    await snapshot.refresh(min_age=0.5)
+    clock.now += 0.2
+    await snapshot.refresh(min_age=0.5)
+    assert fetch.await_count == 1
+
+    clock.now += 0.5
+    await snapshot.refresh(min_age=0.5)
+    await snapshot.refresh()
+    assert fetch.await_count == 3
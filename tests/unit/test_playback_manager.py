@@ -2,10 +2,11 @@ import pytest
 import asyncio
 from unittest.mock import AsyncMock, MagicMock
 from app.services.playback_manager import PlaybackManager
+from app.services.queue_manager import SongQueue
 
 @pytest.fixture
 def setup_manager():
-    spotify = MagicMock()
+    spotify = AsyncMock()
     queue = MagicMock()
     feedback = MagicMock()
     currency = MagicMock()
@@ -69,8 +70,7 @@ async def test_poll_currently_playing_new_track(setup_manager):
 async def test_handle_feedback_like_reward(setup_manager):
     manager, spotify, queue, feedback, currency = setup_manager
     manager.current_owner = "client1"
-    feedback.likes = 7
-    feedback.dislikes = 0
+    feedback.supermajority.return_value = True
     currency.get_balance.return_value = 20
 
     result = await manager.handle_feedback("like_track", total_clients=10, broadcast_queue_length=AsyncMock())
@@ -78,12 +78,12 @@ async def test_handle_feedback_like_reward(setup_manager):
     assert result["owner"] == "client1"
     assert result["tokens"] == 20
     currency.add_tokens.assert_called_once()
+    feedback.supermajority.assert_called_once_with("like", 10)
 
 @pytest.mark.asyncio
 async def test_handle_feedback_dislike_skips(setup_manager):
     manager, spotify, queue, feedback, currency = setup_manager
-    feedback.dislikes = 7
-    feedback.likes = 0
+    feedback.supermajority.return_value = True
     spotify.get_currently_playing.return_value = {
         "is_playing": True,
         "item": {
@@ -100,12 +100,100 @@ async def test_handle_feedback_dislike_skips(setup_manager):
     result = await manager.handle_feedback("dislike_track", total_clients=10, broadcast_queue_length=AsyncMock())
     assert result["event"] == "track_skipped"
     assert "currently_playing" in result
-    spotify.skip_track.assert_called_once()
+    spotify.skip_track.assert_awaited_once()
 
 @pytest.mark.asyncio
 async def test_handle_feedback_no_majority_returns_none(setup_manager):
     manager, spotify, queue, feedback, currency = setup_manager
-    feedback.likes = 1
-    feedback.dislikes = 1
+    feedback.supermajority.return_value = False
     result = await manager.handle_feedback("like_track", total_clients=10, broadcast_queue_length=AsyncMock())
-    assert result is None
\ No newline at end of file
+    assert result is None
+@pytest.mark.asyncio
+async def test_poll_refreshes_shared_snapshot(setup_manager):
+    manager, spotify, queue, feedback, currency = setup_manager
+    spotify.get_currently_playing.return_value = {
+        "is_playing": True,
+        "item": {"id": "track123", "duration_ms": 10000},
+        "progress_ms": 1000,
+    }
+    queue.peek_first.return_value = None
+
+    await manager.poll_currently_playing(AsyncMock())
+
+    assert manager.now_playing.current()["item"]["id"] == "track123"
+    assert not manager.now_playing.is_stale()
+
+@pytest.mark.asyncio
+async def test_poll_backs_off_while_nothing_playing(setup_manager):
+    manager, spotify, *_ = setup_manager
+    spotify.get_currently_playing.return_value = None
+    manager.poll_scheduler.jitter = 0
+
+    delays = [await manager.poll_currently_playing(AsyncMock()) for _ in range(3)]
+    assert delays[0] < delays[1] < delays[2]
+
+@pytest.mark.asyncio
+async def test_reconcile_queue_drops_stale_entries_and_owner():
+    spotify = AsyncMock()
+    queue = SongQueue()
+    queue.add("gone", "client1")
+    queue.add("next", "client2")
+    manager = PlaybackManager(spotify, queue, MagicMock(), MagicMock())
+    manager.last_track_id = "outside"
+    manager.current_owner = "client0"
+    manager.owner_track_id = "previous"
+    spotify.get_player_queue.return_value = {"currently_playing": {"id": "outside"}, "queue": [{"id": "next"}]}
+    broadcast = AsyncMock()
+
+    assert await manager.reconcile_queue(broadcast) == 1
+    assert queue.as_list() == [{"track_id": "next", "owner": "client2"}]
+    assert manager.current_owner is None
+    broadcast.assert_awaited_once()
+
+@pytest.mark.asyncio
+async def test_reconcile_queue_waits_for_poller_and_skips_empty_queue():
+    spotify = AsyncMock()
+    queue = SongQueue()
+    manager = PlaybackManager(spotify, queue, MagicMock(), MagicMock())
+
+    assert await manager.reconcile_queue(AsyncMock()) == 0
+    spotify.get_player_queue.assert_not_awaited()
+
+    queue.add("t1", "client1")
+    manager.last_track_id = "old"
+    spotify.get_player_queue.return_value = {"currently_playing": {"id": "new"}, "queue": []}
+    assert await manager.reconcile_queue(AsyncMock()) == 0
+    assert queue.length() == 1
+
+@pytest.mark.asyncio
+async def test_reconcile_queue_keeps_tracks_added_during_the_fetch():
+    spotify = AsyncMock()
+    queue = SongQueue()
+    queue.add("gone", "client1")
+    manager = PlaybackManager(spotify, queue, MagicMock(), MagicMock())
+    manager.last_track_id = "current"
+
+    async def listing():
+        # a guest's paid add lands while the request is in flight
+        queue.add("paid", "client2")
+        return {"currently_playing": {"id": "current"}, "queue": []}
+
+    spotify.get_player_queue.side_effect = listing
+    assert await manager.reconcile_queue(AsyncMock()) == 1
+    assert queue.as_list() == [{"track_id": "paid", "owner": "client2"}]
+
+@pytest.mark.asyncio
+async def test_new_track_from_outside_the_queue_clears_the_owner():
+    spotify = AsyncMock()
+    manager = PlaybackManager(spotify, SongQueue(), MagicMock(), MagicMock())
+    manager.last_track_id = "previous"
+    manager.current_owner = "client1"
+    manager.owner_track_id = "previous"
+    spotify.get_currently_playing.return_value = {
+        "is_playing": True,
+        "item": {"id": "outside", "duration_ms": 10000},
+        "progress_ms": 1000,
+    }
+
+    await manager.poll_currently_playing(AsyncMock())
+    assert (manager.current_owner, manager.owner_track_id) == (None, None)
@@ -0,0 +1,70 @@
+import pytest
+from app.services.poll_scheduler import PollScheduler
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def make_scheduler(clock=None, rng=lambda: 0.5):
+    return PollScheduler(
+        coarse_interval=10,
+        boundary_lead=1.0,
+        tight_interval=0.5,
+        idle_min=2,
+        idle_max=15,
+        jitter=0.1,
+        rng=rng,
+        clock=clock or FakeClock(),
+    )
+
+def test_mid_track_polls_coarsely():
+    scheduler = make_scheduler()
+    assert scheduler.playing_delay(180_000, 10_000) == 10
+
+def test_near_boundary_wakes_just_before_track_end():
+    scheduler = make_scheduler()
+    assert scheduler.playing_delay(10_000, 2_000) == pytest.approx(7.0)
+
+def test_at_boundary_polls_tightly():
+    scheduler = make_scheduler()
+    assert scheduler.playing_delay(10_000, 9_800) == 0.5
+
+def test_idle_backs_off_exponentially_and_resets():
+    scheduler = make_scheduler()
+    assert [scheduler.idle_delay() for _ in range(5)] == [2, 4, 8, 15, 15]
+
+    scheduler.playing_delay(180_000, 0)
+    assert scheduler.idle_delay() == 2
+
+def test_jitter_stays_within_bounds():
+    low = make_scheduler(rng=lambda: 0.0)
+    high = make_scheduler(rng=lambda: 0.999999)
+    assert low.playing_delay(180_000, 0) == pytest.approx(9.0)
+    assert high.playing_delay(180_000, 0) == pytest.approx(11.0, abs=1e-4)
+
+def test_detection_latency_measured_against_predicted_boundary():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock=clock)
+    scheduler.playing_delay(10_000, 9_000)  # predicted end at t=1.0
+
+    clock.now = 1.4
+    scheduler.record_track_change()
+
+    stats = scheduler.stats()
+    assert stats["detections"] == 1
+    assert stats["last_latency"] == pytest.approx(0.4)
+    assert stats["max_latency"] == pytest.approx(0.4)
+
+def test_manual_skip_counts_as_early_change():
+    clock = FakeClock()
+    scheduler = make_scheduler(clock=clock)
+    scheduler.playing_delay(180_000, 0)
+
+    clock.now = 30
+    scheduler.record_track_change()
+
+    assert scheduler.stats()["early_changes"] == 1
+    assert scheduler.stats()["detections"] == 0
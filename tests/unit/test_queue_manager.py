@@ -72,4 +72,82 @@ def test_likes_and_dislikes_properties():
     fb.dislike("u3")
 
     assert fb.likes == 2
-    assert fb.dislikes == 1
\ No newline at end of file
+    assert fb.dislikes == 1
+def test_changing_a_vote_moves_it_between_tallies():
+    fb = SongFeedback()
+    fb.like("u1")
+    fb.like("u1")
+    assert (fb.likes, fb.dislikes) == (1, 0)
+
+    fb.dislike("u1")
+    assert (fb.likes, fb.dislikes) == (0, 1)
+    assert fb.get_vote("u1") == "dislike"
+
+    fb.set_current_track("track2")
+    assert (fb.likes, fb.dislikes) == (0, 0)
+
+def test_supermajority():
+    fb = SongFeedback()
+    for i in range(7):
+        fb.like(f"u{i}")
+    fb.dislike("u9")
+
+    assert fb.supermajority("like", 10)
+    assert not fb.supermajority("like", 11)
+    assert not fb.supermajority("dislike", 10)
+    assert not fb.supermajority("like", 0)
+
+def test_owner_and_track_indexes_follow_the_head():
+    q = SongQueue()
+    q.add("t1", "a")
+    q.add("t2", "b")
+    q.add("t1", "a")
+    assert q.count_for_owner("a") == 2
+    assert q.count_for_track("t1") == 2
+    assert "t2" in q and "t9" not in q
+
+    q.remove_first("t1")
+    assert q.count_for_owner("a") == 1
+    q.remove_first("t2")
+    assert q.count_for_owner("b") == 0
+    assert "t2" not in q
+    assert len(q) == 1
+
+def test_as_list_pages():
+    q = SongQueue()
+    for i in range(5):
+        q.add(f"t{i}", "a")
+    assert [e["track_id"] for e in q.as_list(1, 2)] == ["t1", "t2"]
+    assert [e["track_id"] for e in q.as_list(3)] == ["t3", "t4"]
+    assert q.as_list(10, 2) == []
+
+def test_reconcile_drops_entries_spotify_will_not_play():
+    q = SongQueue()
+    for track_id, owner in [("t1", "a"), ("t2", "b"), ("t3", "a"), ("t2", "c")]:
+        q.add(track_id, owner)
+
+    # t1 failed to play; an outside track sits between t3 and the second t2
+    removed = q.reconcile(["t2", "t3", "outside", "t2"])
+
+    assert removed == [{"track_id": "t1", "owner": "a"}]
+    assert [(e["track_id"], e["owner"]) for e in q.as_list()] == [("t2", "b"), ("t3", "a"), ("t2", "c")]
+    assert q.count_for_owner("a") == 1
+    assert q.count_for_track("t1") == 0
+
+def test_reconcile_keeps_entries_past_a_truncated_listing():
+    q = SongQueue()
+    for track_id in ["t1", "t2", "t3"]:
+        q.add(track_id, "a")
+
+    assert q.reconcile(["t1"], complete=False) == []
+    assert q.length() == 3
+    assert q.reconcile(["t1"], complete=True) == [{"track_id": "t2", "owner": "a"}, {"track_id": "t3", "owner": "a"}]
+
+def test_reconcile_keeps_entries_added_after_the_mark():
+    q = SongQueue()
+    q.add("t1", "a")
+    mark = q.mark()
+    q.add("t2", "b")
+
+    assert q.reconcile([], added_before=mark) == [{"track_id": "t1", "owner": "a"}]
+    assert q.as_list() == [{"track_id": "t2", "owner": "b"}]
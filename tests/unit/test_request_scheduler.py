@@ -0,0 +1,118 @@
+import pytest
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from app.core.request_scheduler import (
+    RequestScheduler,
+    RateLimitedError,
+    PRIORITY_USER,
+    PRIORITY_SEARCH,
+    PRIORITY_BACKGROUND,
+)
+
+@pytest.fixture
+def executor():
+    pool = ThreadPoolExecutor(max_workers=1)
+    yield pool
+    pool.shutdown(wait=False)
+
+@pytest.mark.asyncio
+async def test_submit_runs_call_and_returns_result(executor):
+    scheduler = RequestScheduler(executor, rate=100, burst=5)
+    assert await scheduler.submit(PRIORITY_USER, lambda x: x * 2, 21) == 42
+    scheduler.close()
+
+@pytest.mark.asyncio
+async def test_waiting_calls_released_in_priority_order(executor):
+    scheduler = RequestScheduler(executor, rate=1000, burst=10)
+    scheduler.pause(0.05)
+    order = []
+
+    calls = [
+        asyncio.create_task(scheduler.submit(PRIORITY_BACKGROUND, order.append, "poll")),
+        asyncio.create_task(scheduler.submit(PRIORITY_SEARCH, order.append, "search")),
+        asyncio.create_task(scheduler.submit(PRIORITY_USER, order.append, "add_track")),
+    ]
+    await asyncio.gather(*calls)
+
+    assert order == ["add_track", "search", "poll"]
+    scheduler.close()
+
+@pytest.mark.asyncio
+async def test_token_bucket_paces_requests(executor):
+    scheduler = RequestScheduler(executor, rate=50, burst=1)
+    start = time.monotonic()
+    await asyncio.gather(*(scheduler.submit(PRIORITY_SEARCH, lambda: None) for _ in range(6)))
+    elapsed = time.monotonic() - start
+
+    # one burst token, then 5 more at 50/s
+    assert elapsed >= 0.09
+    scheduler.close()
+
+@pytest.mark.asyncio
+async def test_no_burst_right_after_a_pause(executor):
+    scheduler = RequestScheduler(executor, rate=10, burst=10)
+    scheduler.pause(0.1)
+    resumed = time.monotonic() + 0.1
+    sent = []
+
+    await asyncio.gather(*(scheduler.submit(PRIORITY_BACKGROUND, lambda: sent.append(time.monotonic())) for _ in range(3)))
+
+    # the bucket refills from the end of the pause: one call per 100 ms, not a full burst
+    assert sum(1 for at in sent if at < resumed + 0.15) <= 1
+    assert sent[-1] - sent[0] >= 0.15
+    scheduler.close()
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_is_retried_after_retry_after(executor):
+    scheduler = RequestScheduler(executor, rate=100, burst=5, max_retries=2)
+    attempts = []
+
+    def flaky():
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise RateLimitedError(0.05)
+        return "ok"
+
+    assert await scheduler.submit(PRIORITY_USER, flaky) == "ok"
+    assert attempts[1] - attempts[0] >= 0.05
+    assert scheduler.stats()["rate_limited"] == 1
+    assert scheduler.stats()["retries"] == 1
+    scheduler.close()
+
+@pytest.mark.asyncio
+async def test_rate_limited_error_raised_when_retries_exhausted(executor):
+    scheduler = RequestScheduler(executor, rate=100, burst=5, max_retries=1)
+
+    def always_limited():
+        raise RateLimitedError(0.01)
+
+    with pytest.raises(RateLimitedError):
+        await scheduler.submit(PRIORITY_SEARCH, always_limited)
+    assert scheduler.stats()["rate_limited"] == 2
+    scheduler.close()
+
+@pytest.mark.asyncio
+async def test_close_cancels_waiting_calls(executor):
+    scheduler = RequestScheduler(executor, rate=100, burst=5)
+    scheduler.pause(10)
+    waiting = asyncio.create_task(scheduler.submit(PRIORITY_BACKGROUND, lambda: None))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["pending_background"] == 1
+
+    scheduler.close()
+    with pytest.raises(asyncio.CancelledError):
+        await waiting
+
+@pytest.mark.asyncio
+async def test_close_cancels_calls_in_flight(executor):
+    scheduler = RequestScheduler(executor, rate=100, burst=5)
+    running = asyncio.create_task(scheduler.submit(PRIORITY_USER, time.sleep, 0.2))
+    await asyncio.sleep(0.05)
+    assert scheduler.stats()["in_flight"] == 1
+
+    started = time.monotonic()
+    scheduler.close()
+    with pytest.raises(asyncio.CancelledError):
+        await running
+    assert time.monotonic() - started < 0.1
@@ -0,0 +1,219 @@
+import pytest
+import json
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from app.config import settings
+from app.services.room_manager import Room, RoomManager
+from app.services.currency_manager import CurrencyManager
+from app.handlers.client_handler import ClientHandler
+from app.services.spotify_manager import SpotifyConnectionManager
+
+class FakeClock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+class FakeWebsocket:
+    def __init__(self, messages=()):
+        self._messages = list(messages)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if not self._messages:
+            raise StopAsyncIteration
+        return json.dumps(self._messages.pop(0))
+
+def make_room(code="ROOM"):
+    currency = CurrencyManager()
+    return Room(code, ClientHandler(currency), currency)
+
+def test_only_the_default_room_is_created_on_demand():
+    rooms = RoomManager(default_code="MAIN")
+    assert rooms.stats()["rooms"] == 0
+
+    assert rooms.get_or_create(None).code == "MAIN"
+    assert rooms.get_or_create("").code == "MAIN"
+    # a guest naming a new code cannot conjure up a room of their own
+    assert rooms.get_or_create("ABCD") is None
+    assert rooms.get_or_create("a!") is None
+    assert rooms.get_or_create(1234) is None
+
+    room = rooms.open_room(" abcd ")
+    assert room.code == "ABCD"
+    assert rooms.get_or_create("abcd") is room
+    assert rooms.open_room("a!") is None
+    assert rooms.stats()["created"] == 2
+
+def test_only_a_host_opens_rooms(monkeypatch):
+    rooms = RoomManager(default_code="MAIN")
+    monkeypatch.setattr(settings, "ROOM_HOST_KEY", None)
+    assert rooms.admit({"roomCode": "ABCD", "hostKey": ""}) is None
+
+    monkeypatch.setattr(settings, "ROOM_HOST_KEY", "s3cret")
+    assert rooms.admit({"roomCode": "ABCD", "hostKey": "guess"}) is None
+    room = rooms.admit({"roomCode": "ABCD", "hostKey": "s3cret"})
+    assert room.code == "ABCD"
+    # guests join it once it is open
+    assert rooms.admit({"roomCode": "abcd"}) is room
+    assert rooms.admit({}).code == "MAIN"
+
+def test_rooms_have_separate_state_and_spotify_accounts():
+    rooms = RoomManager(default_code="MAIN")
+    main, a, b = rooms.get_or_create(None), rooms.open_room("AAAA"), rooms.open_room("BBBB")
+
+    a.client_handler._songQueue.add("t1", "x")
+    assert a.client_handler.get_queue_length() == 1
+    assert b.client_handler.get_queue_length() == 0
+    assert a.currency_manager is not b.currency_manager
+    assert a.identity_manager is not b.identity_manager
+    assert a.client_handler.search_cache is b.client_handler.search_cache
+    # a dislike skip or a queue add in one venue goes to that venue's player only
+    accounts = {id(room.playback_manager.spotify) for room in (main, a, b)}
+    assert len(accounts) == 3
+    assert a.playback_manager.spotify is SpotifyConnectionManager.get_room_instance("AAAA")
+    assert a.playback_manager.spotify.connection.tokens_file == settings.room_tokens_file("AAAA")
+    assert a.client_handler.now_playing is not b.client_handler.now_playing
+    assert main.client_handler.now_playing is rooms.now_playing
+    assert a.playback_manager.spotify.scheduler is not b.playback_manager.spotify.scheduler
+
+    rooms.close_all()
+    assert not SpotifyConnectionManager.has_room_instance("AAAA")
+    assert not SpotifyConnectionManager.has_room_instance("BBBB")
+
+def test_idle_rooms_are_evicted():
+    clock = FakeClock()
+    rooms = RoomManager(default_code="MAIN", idle_ttl=60, clock=clock)
+    idle = rooms.open_room("IDLE")
+    busy = rooms.open_room("BUSY")
+    busy.identity_manager.register(object(), "member")
+
+    clock.now = 30
+    assert rooms.evict_idle() == 0
+    clock.now = 61
+    assert rooms.evict_idle() == 1
+    assert rooms.get("IDLE") is None
+    assert rooms.get("BUSY") is busy
+    assert rooms.stats()["evicted"] == 1
+
+def test_default_room_is_never_evicted():
+    clock = FakeClock()
+    rooms = RoomManager(default_code="MAIN", idle_ttl=60, clock=clock)
+    main = rooms.get_or_create(None)
+    main.currency_manager.register_client("guest")
+    balance = main.currency_manager.get_balance("guest")
+
+    # every phone in the venue went to sleep
+    clock.now = 10 * 60 * 60
+    assert rooms.evict_idle() == 0
+    assert rooms.get_or_create(None) is main
+    assert main.currency_manager.get_balance("guest") == balance
+
+def test_room_cap_reclaims_idle_rooms_first():
+    clock = FakeClock()
+    rooms = RoomManager(default_code="MAIN", max_rooms=1, idle_ttl=10, clock=clock)
+    rooms.open_room("AAAA").identity_manager.register(object(), "member")
+    assert rooms.open_room("BBBB") is None
+
+    rooms.get("AAAA").identity_manager.unregister("member")
+    clock.now = 20
+    assert rooms.open_room("BBBB") is not None
+
+@pytest.mark.asyncio
+async def test_broadcasts_stay_within_room():
+    a, b = make_room("AAAA"), make_room("BBBB")
+    ws_a, ws_b = AsyncMock(), AsyncMock()
+    a.identity_manager.register(ws_a, "x")
+    b.identity_manager.register(ws_b, "y")
+
+    await a.state_publisher.publish_event({"event": "reward"})
+    await a.identity_manager.drain()
+
+    ws_a.send.assert_awaited_once()
+    ws_b.send.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_broadcast_queue_length_publishes_and_prunes():
+    room = make_room()
+    room.client_handler._songQueue.add("t1", "c2")
+
+    # Two websockets, one fails
+    ws1 = AsyncMock()
+    ws2 = AsyncMock()
+    ws1.send.side_effect = Exception("fail")
+    room.identity_manager.register(ws1, "c1")
+    room.identity_manager.register(ws2, "c2")
+
+    await room.broadcast_queue_length()
+    await room.state_publisher.flush()
+    await room.identity_manager.drain()
+
+    payload = json.loads(ws2.send.await_args.args[0])
+    assert payload["queue_length"] == 1
+    assert "c1" not in room.identity_manager.all_session_ids()
+    assert room.identity_manager.session_for(ws1) is None
+    assert "c2" in room.identity_manager.all_session_ids()
+
+@pytest.mark.asyncio
+async def test_handle_client_sends_delta_to_up_to_date_client(monkeypatch):
+    room = make_room()
+    sent = AsyncMock()
+    monkeypatch.setattr(room.identity_manager, "send_to", sent)
+    monkeypatch.setattr(room.client_handler, "clean_currently_playing", AsyncMock(return_value={"currently_playing": {"track_id": "t1"}}))
+    room_state = room.state_publisher.room_state
+
+    await room.handle_client(FakeWebsocket(), {"sessionId": "a"})
+    first = sent.await_args.args[1]
+    assert first["full"] is True
+    assert first["roomCode"] == "ROOM"
+    assert first["currently_playing"] == {"track_id": "t1"}
+    assert {"queue_length", "cost", "tokens", "client_vote"} <= first.keys()
+
+    await room.handle_client(FakeWebsocket(), {"sessionId": "a", "stateEpoch": room_state.epoch, "stateVersion": room_state.version})
+    second = sent.await_args.args[1]
+    assert second["full"] is False
+    assert "currently_playing" not in second and "queue_length" not in second
+    assert second["stateVersion"] == room_state.version
+    assert "tokens" in second
+
+@pytest.mark.asyncio
+async def test_handle_client_replies_and_unregisters(monkeypatch):
+    room = make_room()
+    sent = AsyncMock()
+    monkeypatch.setattr(room.identity_manager, "send_to", sent)
+    monkeypatch.setattr(room.client_handler, "clean_currently_playing", AsyncMock(return_value={}))
+    monkeypatch.setattr(room.client_handler, "message_handler", AsyncMock(return_value={"success": False}))
+
+    await room.handle_client(FakeWebsocket([{"action": "refresh"}]), {"sessionId": "a"})
+
+    assert sent.await_args.args == ("a", {"success": False})
+    assert len(room) == 0
+
+@pytest.mark.asyncio
+async def test_host_opened_room_polls_and_refreshes_its_own_account(monkeypatch):
+    venue = AsyncMock()
+    venue.connection.tokens_file = "tokens-ABCD.json"
+    venue.token_info = {"expires_at": 0}
+    venue.get_currently_playing.return_value = None
+    monkeypatch.setattr(SpotifyConnectionManager, "get_room_instance", staticmethod(lambda code: venue))
+    release = MagicMock()
+    monkeypatch.setattr(SpotifyConnectionManager, "release_room_instance", staticmethod(release))
+    shared = AsyncMock()
+    monkeypatch.setattr(SpotifyConnectionManager, "get_async_instance", staticmethod(lambda: shared))
+
+    rooms = RoomManager(default_code="MAIN")
+    room = rooms.open_room("ABCD")
+    # the server's account is not authorized; the venue's still polls
+    rooms.start_polling(default_room=False)
+    rooms.get_or_create(None)
+    await asyncio.sleep(0.05)
+
+    venue.get_currently_playing.assert_awaited()
+    shared.get_currently_playing.assert_not_awaited()
+    assert room._token_task is not None
+    await rooms.stop_polling()
+    rooms.close_all()
+    release.assert_called_once_with("ABCD")
@@ -0,0 +1,35 @@
+from app.services.room_state import RoomState
+
+def test_update_bumps_version_once_per_change():
+    state = RoomState(queue_length=0, cost=1)
+    assert state.version == 0
+    assert state.update(queue_length=1, cost=3) == {"queue_length", "cost"}
+    assert state.version == 1
+    assert state.update(queue_length=1) == set()
+    assert state.version == 1
+
+def test_delta_since_returns_only_changed_fields():
+    state = RoomState(queue_length=0, cost=1, now_playing=None)
+    state.update(now_playing="t1")
+    seen = state.version
+    state.update(queue_length=2, cost=5)
+    state.update(cost=6)
+
+    delta, full = state.delta_since(state.epoch, seen)
+    assert not full
+    assert delta == {"queue_length": 2, "cost": 6}
+
+    delta, full = state.delta_since(state.epoch, state.version)
+    assert delta == {} and not full
+
+def test_full_snapshot_for_unknown_or_stale_versions():
+    state = RoomState(max_delta_gap=2, queue_length=0)
+    for n in range(1, 5):
+        state.update(queue_length=n)
+
+    assert state.delta_since(None, None) == ({"queue_length": 4}, True)
+    assert state.delta_since("other-epoch", 3)[1]
+    assert state.delta_since(state.epoch, 99)[1]
+    assert state.delta_since(state.epoch, "3")[1]
+    assert state.delta_since(state.epoch, 1)[1]  # more than max_delta_gap behind
+    assert not state.delta_since(state.epoch, 2)[1]
@@ -0,0 +1,99 @@
+import pytest
+import asyncio
+from app.services.search_cache import SearchCache
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def test_normalize_ignores_case_and_whitespace():
+    assert SearchCache.normalize("  Daft   PUNK ") == "daft punk"
+
+def test_put_and_get_with_normalized_key():
+    cache = SearchCache(max_entries=10, max_bytes=10_000, ttl=60)
+    cache.put("Daft Punk", {"search_data": [1]})
+    assert cache.get("daft  punk") == {"search_data": [1]}
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = SearchCache(max_entries=10, max_bytes=10_000, ttl=5, clock=clock)
+    cache.put("song", {"search_data": []})
+
+    clock.now = 4.9
+    assert cache.get("song") is not None
+    clock.now = 5.0
+    assert cache.get("song") is None
+    assert cache.stats()["expirations"] == 1
+
+def test_lru_eviction_by_entry_count():
+    cache = SearchCache(max_entries=2, max_bytes=10_000, ttl=60)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")  # "b" is now least recently used
+    cache.put("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_eviction_by_memory_budget():
+    cache = SearchCache(max_entries=100, max_bytes=40, ttl=60)
+    cache.put("a", "x" * 15)
+    cache.put("b", "y" * 15)
+    cache.put("c", "z" * 15)
+
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] <= 40
+
+@pytest.mark.asyncio
+async def test_get_or_fetch_counts_hits_and_misses():
+    cache = SearchCache(max_entries=10, max_bytes=10_000, ttl=60)
+    calls = []
+
+    async def fetch(query):
+        calls.append(query)
+        return {"search_data": [query]}
+
+    first = await cache.get_or_fetch("Hello", fetch)
+    second = await cache.get_or_fetch("hello ", fetch)
+
+    assert first == second == {"search_data": ["hello"]}
+    assert calls == ["hello"]
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_searches_are_coalesced():
+    cache = SearchCache(max_entries=10, max_bytes=10_000, ttl=60)
+    release = asyncio.Event()
+    calls = 0
+
+    async def fetch(query):
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return {"search_data": [query]}
+
+    waiters = [asyncio.create_task(cache.get_or_fetch("same song", fetch)) for _ in range(5)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*waiters)
+
+    assert calls == 1
+    assert all(r == {"search_data": ["same song"]} for r in results)
+    assert cache.stats()["coalesced"] == 4
+
+@pytest.mark.asyncio
+async def test_failed_fetch_is_not_cached():
+    cache = SearchCache(max_entries=10, max_bytes=10_000, ttl=60)
+
+    async def failing(query):
+        raise RuntimeError("spotify down")
+
+    with pytest.raises(RuntimeError):
+        await cache.get_or_fetch("song", failing)
+    assert cache.get("song") is None
@@ -1,4 +1,4 @@
-import pytest, time, urllib.parse
+import pytest, time, urllib.parse, asyncio, json, threading
 from unittest.mock import patch, MagicMock
 import app.core.spotify_client as spotify_client
 from app.config.settings import HOST
@@ -35,7 +35,7 @@ def test_get_authorization_url_contains_client_id(monkeypatch):
 
 # --- Token exchange ---
 
-@patch("app.core.spotify_client.requests.post")
+@patch.object(spotify_client.requests.Session, "request")
 def test_exchange_code_for_token_sets_tokens(mock_post, monkeypatch):
     monkeypatch.setenv("spotify_client_id", "abc123")
     monkeypatch.setenv("spotify_client_secret", "secret456")
@@ -57,7 +57,7 @@ def test_exchange_code_for_token_sets_tokens(mock_post, monkeypatch):
 
 # --- Refresh token ---
 
-@patch("app.core.spotify_client.requests.post")
+@patch.object(spotify_client.requests.Session, "request")
 def test_refresh_access_token_updates_tokens(mock_post, monkeypatch):
     monkeypatch.setenv("spotify_client_id", "abc123")
     monkeypatch.setenv("spotify_client_secret", "secret456")
@@ -87,4 +87,144 @@ def test_ensure_token_valid_triggers_refresh(mock_refresh):
     conn._token_expiration = 0
 
     conn.ensure_token_valid()
-    mock_refresh.assert_called_once()
\ No newline at end of file
+    mock_refresh.assert_called_once()
+@patch.object(spotify_client.SpotifyConnection, "refresh_access_token")
+def test_ensure_token_valid_skips_refresh_when_valid(mock_refresh):
+    conn = spotify_client.SpotifyConnection()
+    conn._spotify_user_token = "abc"
+    conn._token_expiration = time.time() + 600
+
+    conn.ensure_token_valid()
+    mock_refresh.assert_not_called()
+
+def test_concurrent_ensure_token_valid_refreshes_once():
+    conn = spotify_client.SpotifyConnection()
+    calls = []
+
+    def slow_refresh():
+        calls.append(1)
+        time.sleep(0.05)
+        conn._spotify_user_token = "fresh"
+        conn._token_expiration = time.time() + 3600
+
+    conn.refresh_access_token = slow_refresh
+    threads = [threading.Thread(target=conn.ensure_token_valid) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(calls) == 1
+
+# --- Proactive refresh & persistence ---
+
+def test_refresh_if_expiring_refreshes_and_saves(tmp_path):
+    conn = spotify_client.SpotifyConnection()
+    conn._spotify_user_token = "old"
+    conn._token_expiration = time.time() + 100
+
+    def fake_refresh():
+        conn._spotify_user_token = "new"
+        conn._token_expiration = time.time() + 3600
+
+    conn.refresh_access_token = fake_refresh
+    path = tmp_path / "tokens.json"
+
+    assert conn.refresh_if_expiring(lead=300, path=str(path)) is True
+    assert json.loads(path.read_text())["access_token"] == "new"
+    # Outside the lead window now, so no second refresh
+    assert conn.refresh_if_expiring(lead=300, path=str(path)) is False
+
+def test_save_tokens_replaces_file_atomically(tmp_path):
+    path = tmp_path / "tokens.json"
+    path.write_text('{"access_token": "stale"}')
+    conn = spotify_client.SpotifyConnection()
+    conn._spotify_user_token = "abc"
+
+    conn.save_tokens(str(path))
+
+    assert json.loads(path.read_text())["access_token"] == "abc"
+    assert [p.name for p in tmp_path.iterdir()] == ["tokens.json"]
+
+def test_room_account_keeps_its_own_tokens_file(tmp_path):
+    path = tmp_path / "tokens-ABCD.json"
+    conn = spotify_client.SpotifyConnection(tokens_file=str(path))
+    conn._spotify_user_token = "room"
+
+    conn.save_tokens()
+    other = spotify_client.SpotifyConnection(tokens_file=str(path))
+    assert other.load_tokens() is True
+    assert other.token_info["access_token"] == "room"
+    assert "state=ABCD" in conn.get_authorization_url(state="ABCD")
+
+# --- Pooled transport ---
+
+def test_connection_uses_pooled_keep_alive_session():
+    conn = spotify_client.SpotifyConnection(pool_size=7)
+    adapter = conn._session.get_adapter("https://api.spotify.com")
+    assert adapter._pool_maxsize == 7
+    conn.close()
+
+@patch.object(spotify_client.requests.Session, "request")
+def test_request_applies_per_endpoint_timeout(mock_request, monkeypatch):
+    monkeypatch.setitem(spotify_client.api_timeouts, "track_search", (1, 2))
+    conn = spotify_client.SpotifyConnection()
+
+    conn._request("GET", "track_search", params={"q": "x"})
+
+    mock_request.assert_called_once_with(
+        "GET", spotify_client.api["track_search"], timeout=(1, 2), params={"q": "x"}
+    )
+
+@patch.object(spotify_client.requests.Session, "request")
+def test_request_falls_back_to_default_timeout(mock_request, monkeypatch):
+    monkeypatch.delitem(spotify_client.api_timeouts, "next_song")
+    conn = spotify_client.SpotifyConnection()
+
+    conn._request("POST", "next_song")
+
+    _, kwargs = mock_request.call_args
+    assert kwargs["timeout"] == (spotify_client.SPOTIFY_CONNECT_TIMEOUT, spotify_client.SPOTIFY_READ_TIMEOUT)
+
+@patch.object(spotify_client.requests.Session, "request")
+def test_request_raises_rate_limited_on_429(mock_request):
+    mock_request.return_value = MagicMock(status_code=429, headers={"Retry-After": "7"})
+    conn = spotify_client.SpotifyConnection()
+
+    with pytest.raises(spotify_client.RateLimitedError) as exc:
+        conn._request("GET", "track_search")
+    assert exc.value.retry_after == 7
+
+# --- Async facade ---
+
+@pytest.mark.asyncio
+async def test_async_connection_delegates_to_sync_client():
+    sync_conn = MagicMock()
+    sync_conn.search_songs.return_value = {"tracks": {"items": []}}
+    async_conn = spotify_client.AsyncSpotifyConnection(sync_conn, max_workers=2)
+
+    result = await async_conn.search_songs("song", limit=3)
+
+    assert result == {"tracks": {"items": []}}
+    sync_conn.search_songs.assert_called_once_with("song", type="track", limit=3)
+    async_conn.shutdown()
+
+@pytest.mark.asyncio
+async def test_async_connection_does_not_block_event_loop():
+    sync_conn = MagicMock()
+    sync_conn.get_currently_playing.side_effect = lambda: time.sleep(0.2)
+    async_conn = spotify_client.AsyncSpotifyConnection(sync_conn, max_workers=2)
+
+    ticks = 0
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.01)
+
+    ticker_task = asyncio.create_task(ticker())
+    await async_conn.get_currently_playing()
+    ticker_task.cancel()
+
+    assert ticks > 5
+    async_conn.shutdown()
@@ -0,0 +1,55 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock
+from app.services.state_publisher import StatePublisher
+
+@pytest.mark.asyncio
+async def test_burst_of_marks_flushes_once():
+    broadcast = AsyncMock()
+    publisher = StatePublisher(broadcast, tick=0.01)
+
+    for n in range(100):
+        publisher.mark(queue_length=n, cost=n * 2)
+    await asyncio.sleep(0.05)
+
+    broadcast.assert_awaited_once_with({"queue_length": 99, "cost": 198, "stateVersion": 100}, kind="queue_state")
+    stats = publisher.stats()
+    assert stats["flushes"] == 1
+    assert stats["coalesced"] == 99
+    assert stats["pending"] == []
+
+@pytest.mark.asyncio
+async def test_unchanged_state_is_not_rebroadcast():
+    broadcast = AsyncMock()
+    publisher = StatePublisher(broadcast, tick=0)
+
+    publisher.mark(queue_length=1, cost=2)
+    await asyncio.sleep(0.01)
+    publisher.mark(queue_length=1, cost=2)
+    await asyncio.sleep(0.01)
+
+    assert broadcast.await_count == 1
+
+@pytest.mark.asyncio
+async def test_flush_sends_full_snapshot():
+    broadcast = AsyncMock()
+    publisher = StatePublisher(broadcast, tick=10)
+    publisher.mark(queue_length=1, cost=2)
+    await publisher.flush()
+    publisher.mark(cost=4)
+    await publisher.flush()
+    publisher.close()
+
+    assert broadcast.await_args_list[-1].args[0] == {"queue_length": 1, "cost": 4, "stateVersion": 2}
+
+@pytest.mark.asyncio
+async def test_events_are_sent_immediately():
+    broadcast = AsyncMock()
+    publisher = StatePublisher(broadcast, tick=10)
+    publisher.mark(queue_length=3, cost=6)
+
+    await publisher.publish_event({"event": "track_skipped"})
+
+    broadcast.assert_awaited_once_with({"event": "track_skipped"})
+    assert publisher.stats()["pending"] == ["cost", "queue_length"]
+    publisher.close()
@@ -0,0 +1,51 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock, MagicMock
+from app.core.token_manager import TokenManager
+
+def make_connection(expires_at):
+    conn = MagicMock()
+    conn.token_info = {"access_token": "abc", "refresh_token": "def", "expires_at": expires_at}
+    conn.refresh_if_expiring = AsyncMock(return_value=True)
+    return conn
+
+def test_seconds_until_refresh_uses_lead():
+    conn = make_connection(expires_at=1000)
+    manager = TokenManager(conn, lead=300, clock=lambda: 500)
+    assert manager.seconds_until_refresh() == 200
+
+def test_seconds_until_refresh_never_negative():
+    conn = make_connection(expires_at=0)
+    manager = TokenManager(conn, lead=300, clock=lambda: 500)
+    assert manager.seconds_until_refresh() == 0
+
+@pytest.mark.asyncio
+async def test_concurrent_refreshes_coalesce():
+    conn = make_connection(expires_at=0)
+    release = asyncio.Event()
+
+    async def slow_refresh(lead, path):
+        await release.wait()
+        return True
+
+    conn.refresh_if_expiring = AsyncMock(side_effect=slow_refresh)
+    manager = TokenManager(conn, lead=300, tokens_file="tokens.json")
+
+    callers = [asyncio.create_task(manager.refresh()) for _ in range(10)]
+    await asyncio.sleep(0)
+    release.set()
+    results = await asyncio.gather(*callers)
+
+    assert all(results)
+    conn.refresh_if_expiring.assert_awaited_once_with(300, "tokens.json")
+    assert manager.refreshes == 1
+
+@pytest.mark.asyncio
+async def test_failed_refresh_is_counted_and_raised():
+    conn = make_connection(expires_at=0)
+    conn.refresh_if_expiring = AsyncMock(side_effect=RuntimeError("oauth down"))
+    manager = TokenManager(conn)
+
+    with pytest.raises(RuntimeError):
+        await manager.refresh()
+    assert manager.failures == 1
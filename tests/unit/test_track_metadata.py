@@ -0,0 +1,86 @@
+import pytest
+import asyncio
+from unittest.mock import AsyncMock
+from app.services.track_metadata import TrackMetadataStore
+
+def track(track_id):
+    return {
+        "id": track_id,
+        "name": f"Song {track_id}",
+        "artists": [{"name": "Artist"}],
+        "album": {"images": [{"url": f"img-{track_id}"}]},
+        "duration_ms": 1000,
+    }
+
+def lookup_response(ids):
+    return {"tracks": [track(t) for t in ids]}
+
+def test_seed_caches_search_items():
+    store = TrackMetadataStore(AsyncMock())
+    store.seed([track("a"), None, {"name": "no id"}])
+
+    assert store.get("a") == {
+        "track_id": "a",
+        "track_name": "Song a",
+        "artists": ["Artist"],
+        "album_art": "img-a",
+        "duration_ms": 1000,
+    }
+    assert store.stats()["entries"] == 1
+
+def test_lru_bound():
+    store = TrackMetadataStore(AsyncMock(), max_entries=2)
+    store.seed([track("a"), track("b")])
+    store.get("a")
+    store.seed([track("c")])
+    assert store.get("b") is None
+    assert store.get("a") is not None
+
+@pytest.mark.asyncio
+async def test_get_many_batches_unknown_ids_in_fifties():
+    fetch = AsyncMock(side_effect=lookup_response)
+    store = TrackMetadataStore(fetch)
+    store.seed([track("known")])
+    ids = ["known"] + [f"t{i}" for i in range(120)]
+
+    result = await store.get_many(ids)
+
+    assert len(result) == 121
+    assert fetch.await_count == 3  # 120 unknown -> 50 + 50 + 20
+    assert [len(call.args[0]) for call in fetch.await_args_list] == [50, 50, 20]
+
+@pytest.mark.asyncio
+async def test_get_many_uses_cache_on_second_call():
+    fetch = AsyncMock(side_effect=lookup_response)
+    store = TrackMetadataStore(fetch)
+
+    await store.get_many(["a", "b"])
+    await store.get_many(["b", "a", "a"])
+
+    assert fetch.await_count == 1
+
+@pytest.mark.asyncio
+async def test_concurrent_lookups_share_pending_batch():
+    release = asyncio.Event()
+
+    async def slow_fetch(ids):
+        await release.wait()
+        return lookup_response(ids)
+
+    fetch = AsyncMock(side_effect=slow_fetch)
+    store = TrackMetadataStore(fetch)
+    first = asyncio.create_task(store.get_many(["a", "b"]))
+    second = asyncio.create_task(store.get_many(["b"]))
+    await asyncio.sleep(0)
+    release.set()
+
+    assert set(await first) == {"a", "b"}
+    assert set(await second) == {"b"}
+    assert fetch.await_count == 1
+
+@pytest.mark.asyncio
+async def test_failed_lookup_returns_known_tracks_only():
+    store = TrackMetadataStore(AsyncMock(side_effect=RuntimeError("down")))
+    store.seed([track("a")])
+    result = await store.get_many(["a", "b"])
+    assert list(result) == ["a"]